@@ -1,10 +1,14 @@
+import time
 import pandas as pd
 import yfinance
 import numpy as np
+from typing import Tuple
 
-from models import ActionType, PositionType, Position, StrategySignal
+from models import ActionType, ExitReason, PositionType, Position, StrategySignal
 from strategies import BaseStrategy, BuyAndHoldStrategy
 from evaluation import evaluate_strategy         
+from profiling import BacktestProfiler, profile_phase
+from trade_ledger import TradeLedger, sl_tp_exit_reason
     
 def calc_realistic_price(row: pd.Series ,action_type: ActionType, slippage_factor=np.inf):
     slippage_rate = ((row['Close'] - row['Open']) / row['Open']) / slippage_factor
@@ -15,90 +19,483 @@ def calc_realistic_price(row: pd.Series ,action_type: ActionType, slippage_facto
     else:
         return min(slippage_price, row['Open'])   
 
-def backtest(data: pd.DataFrame, strategy: BaseStrategy, starting_balance: int, slippage_factor: float=5.0, commission: float=0.0) -> pd.DataFrame:       
-    
-    def enter_position(data: pd.DataFrame, index: int, row: pd.Series, curr_qty: float, curr_balance: float, position_type: PositionType) -> Position:
-        if position_type == PositionType.LONG:
-            buy_price = calc_realistic_price(row, ActionType.BUY, slippage_factor=slippage_factor)
-            qty_to_buy = strategy.calc_qty(buy_price, curr_balance, ActionType.BUY)
-            position = Position(qty_to_buy, buy_price, position_type)
-            data.loc[index, 'qty'] = curr_qty + qty_to_buy
-            data.loc[index, 'balance'] = curr_balance - qty_to_buy * buy_price - commission
+def backtest(data: pd.DataFrame, strategy: BaseStrategy, starting_balance: int, slippage_factor: float=5.0, commission: float=0.0,
+             profiler: BacktestProfiler=None, ledger: TradeLedger=None) -> pd.DataFrame:       
+    profiling = profiler is not None
+    if profiling:
+        profiler.start()
+
+    try:
+        def realistic_price(row: pd.Series, action_type: ActionType, slippage_factor: float) -> float:
+            with profile_phase(profiler, 'calc_realistic_price'):
+                return calc_realistic_price(row, action_type, slippage_factor)
+
+        def enter_position(data: pd.DataFrame, index: int, row: pd.Series, curr_qty: float, curr_balance: float, position_type: PositionType) -> Position:
+            if position_type == PositionType.LONG:
+                buy_price = realistic_price(row, ActionType.BUY, slippage_factor=slippage_factor)
+                qty_to_buy = strategy.calc_qty(buy_price, curr_balance, ActionType.BUY)
+                position = Position(qty_to_buy, buy_price, position_type, index, commission)
+                data.loc[index, 'qty'] = curr_qty + qty_to_buy
+                data.loc[index, 'balance'] = curr_balance - qty_to_buy * buy_price - commission
         
-        elif position_type == PositionType.SHORT:
-            sell_price = calc_realistic_price(row, ActionType.SELL, slippage_factor=slippage_factor)
-            qty_to_sell = strategy.calc_qty(sell_price, curr_balance, ActionType.SELL)
-            position = Position(qty_to_sell, sell_price, position_type)
-            data.loc[index, 'qty'] = curr_qty - qty_to_sell
-            data.loc[index, 'balance'] = curr_balance + qty_to_sell * sell_price - commission
+            elif position_type == PositionType.SHORT:
+                sell_price = realistic_price(row, ActionType.SELL, slippage_factor=slippage_factor)
+                qty_to_sell = strategy.calc_qty(sell_price, curr_balance, ActionType.SELL)
+                position = Position(qty_to_sell, sell_price, position_type, index, commission)
+                data.loc[index, 'qty'] = curr_qty - qty_to_sell
+                data.loc[index, 'balance'] = curr_balance + qty_to_sell * sell_price - commission
         
-        return position
+            return position
     
-    def close_position(data: pd.DataFrame, index: int, row: pd.Series, curr_qty: float, curr_balance: float, position: Position):
-        if position.type == PositionType.LONG:
-            sell_price = calc_realistic_price(row, ActionType.SELL, slippage_factor=slippage_factor)
-            data.loc[index, 'qty'] = curr_qty - position.qty
-            data.loc[index, 'balance'] = curr_balance + position.qty * sell_price - commission
-
-        elif position.type == PositionType.SHORT:
-            buy_price = calc_realistic_price(row, ActionType.BUY, slippage_factor=slippage_factor)
-            data.loc[index, 'qty'] = curr_qty + position.qty
-            data.loc[index, 'balance'] = curr_balance - position.qty * buy_price - commission
+        def close_position(data: pd.DataFrame, index: int, row: pd.Series, curr_qty: float, curr_balance: float, position: Position,
+                           exit_reason: ExitReason = ExitReason.SIGNAL):
+            if position.type == PositionType.LONG:
+                sell_price = realistic_price(row, ActionType.SELL, slippage_factor=slippage_factor)
+                data.loc[index, 'qty'] = curr_qty - position.qty
+                data.loc[index, 'balance'] = curr_balance + position.qty * sell_price - commission
+                exit_price = sell_price
+
+            elif position.type == PositionType.SHORT:
+                buy_price = realistic_price(row, ActionType.BUY, slippage_factor=slippage_factor)
+                data.loc[index, 'qty'] = curr_qty + position.qty
+                data.loc[index, 'balance'] = curr_balance - position.qty * buy_price - commission
+                exit_price = buy_price
+
+            if ledger is not None:
+                ledger.record_exit(position, index, position.qty, exit_price, commission, exit_reason)
         
     
-    # initialize df 
-    data['qty'] = 0.0
-    data['balance'] = 0.0
+        # initialize df 
+        data['qty'] = 0.0
+        data['balance'] = 0.0
 
-    # Calculate strategy signal
-    strategy.calc_signal(data)
+        # Calculate strategy signal
+        with profile_phase(profiler, 'calc_signal'):
+            data['strategy_signal'] = strategy.calc_signal_array(data)
     
-    # Loop through the data to calculate portfolio value
-    position: Position = None
-    data.reset_index(inplace=True)
-    num_trading_days = data.shape[0]
+        # Loop through the data to calculate portfolio value
+        position: Position = None
+        data.reset_index(inplace=True)
+        num_trading_days = data.shape[0]
+        signals = data['strategy_signal'].tolist()
+        loop_start = time.perf_counter() if profiling else None
     
-    for index, row in data.iterrows():
-        curr_qty = data.loc[index - 1, 'qty'] if index > 0 else 0
-        curr_balance = data.loc[index - 1, 'balance'] if index > 0 else starting_balance
+        for index, row in data.iterrows():
+            curr_qty = data.loc[index - 1, 'qty'] if index > 0 else 0
+            curr_balance = data.loc[index - 1, 'balance'] if index > 0 else starting_balance
         
+            # handle stop loss and take profit
+            if position is not None:
+                with profile_phase(profiler, 'check_sl_tp'):
+                    sl_tp_res = strategy.check_sl_tp(data.iloc[index - 1], position)
+                if sl_tp_res is not None:
+                    sl_tp_qty, sl_tp_price, sl_tp_action = sl_tp_res
+                    if profiling:
+                        profiler.count_sl_tp(position, sl_tp_price, sl_tp_action)
+                    if ledger is not None:
+                        ledger.record_exit(position, index, sl_tp_qty, sl_tp_price, commission,
+                                           sl_tp_exit_reason(position, sl_tp_price, sl_tp_action))
+                    if sl_tp_action == ActionType.BUY:
+                        curr_balance = curr_balance - sl_tp_qty * sl_tp_price - commission
+                        curr_qty = curr_qty + sl_tp_qty
+                    
+                    elif sl_tp_action == ActionType.SELL:
+                        curr_balance = curr_balance + sl_tp_qty * sl_tp_price - commission
+                        curr_qty = curr_qty - sl_tp_qty
+        
+            # Close position at end of trade
+            if index + 1 == num_trading_days and position is not None: 
+                close_position(data, index, row, curr_qty, curr_balance, position, ExitReason.END_OF_DATA)
+                if profiling:
+                    profiler.count('final_closes')
+                
+            # Handle enter long signal
+            elif signals[index] == StrategySignal.ENTER_LONG.value:
+                position = enter_position(data, index, row, curr_qty, curr_balance, PositionType.LONG)
+                if profiling:
+                    profiler.count('long_entries')
+        
+            # Handle enter short signal  
+            elif signals[index] == StrategySignal.ENTER_SHORT.value:
+                position = enter_position(data, index, row, curr_qty, curr_balance, PositionType.SHORT)
+                if profiling:
+                    profiler.count('short_entries')
+        
+            # Handle close long or short signal 
+            elif signals[index] in (StrategySignal.CLOSE_LONG.value, StrategySignal.CLOSE_SHORT.value) and position is not None:
+                close_position(data, index, row, curr_qty, curr_balance, position)
+                if profiling:
+                    profiler.count('signal_closes')
+        
+            else:
+                data.loc[index, 'qty'] = curr_qty
+                data.loc[index, 'balance'] = curr_balance
+        
+    
+        if profiling:
+            profiler.add_time('bar_loop', time.perf_counter() - loop_start)
+            profiler.count('bars', num_trading_days)
+
+        # Calculate portfolio value
+        with profile_phase(profiler, 'portfolio_value'):
+            data['portfolio_value'] = data['Close'] * data['qty'] + data['balance']
+        return data
+    finally:
+        if profiling:
+            profiler.finish()
+
+def calc_realistic_prices(open_prices: np.ndarray, close_prices: np.ndarray, slippage_factor=np.inf) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Array version of calc_realistic_price, computed once for every bar.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the realistic buy prices and the realistic sell prices.
+    """
+    slippage_rate = ((close_prices - open_prices) / open_prices) / slippage_factor
+    slippage_prices = open_prices + open_prices * slippage_rate
+    return np.maximum(slippage_prices, open_prices), np.minimum(slippage_prices, open_prices)
+
+SL_TP_MODES = ('legacy', 'first_passage')
+
+class BacktestState:
+    """
+    What the legacy bar loop carries from one bar to the next: the open position, qty, balance, the
+    number of bars done so far and the OHLC of the last of them, which the stop loss and take profit
+    check of the next bar looks at.
+    """
+    __slots__ = ('position', 'qty', 'balance', 'bars', 'prev_bar')
+
+    def __init__(self, starting_balance: float) -> None:
+        self.position: Position = None
+        self.qty = 0
+        self.balance = starting_balance
+        self.bars = 0
+        self.prev_bar = None
+
+def find_first_passage(open_prices: np.ndarray, high_prices: np.ndarray, low_prices: np.ndarray, position_type: PositionType,
+                       sl_price: float=None, tp_price: float=None) -> Tuple[int, float, ExitReason]:
+    """
+    Finds the first bar whose High/Low range reaches the stop-loss or the take-profit level of a position.
+
+    A bar that reaches both levels is resolved as a stop loss, since the bar alone does not tell which
+    level came first. A bar that opens beyond a level fills at its open.
+
+    Parameters:
+    - open_prices, high_prices, low_prices (np.ndarray): the bars to search, in order.
+    - position_type (PositionType): side of the position.
+    - sl_price, tp_price (float): the levels, None for a level that is not set.
+
+    Returns:
+        Tuple[int, float, ExitReason] or None: offset of the exit bar, the fill price and the exit reason, or None if no bar hits.
+    """
+    no_hit = np.zeros(open_prices.shape[0], dtype=bool)
+    if position_type == PositionType.LONG:
+        sl_hit = low_prices <= sl_price if sl_price is not None else no_hit
+        tp_hit = high_prices >= tp_price if tp_price is not None else no_hit
+    else:
+        sl_hit = high_prices >= sl_price if sl_price is not None else no_hit
+        tp_hit = low_prices <= tp_price if tp_price is not None else no_hit
+
+    hit = sl_hit | tp_hit
+    offset = int(np.argmax(hit)) if hit.size else 0
+    if not hit.size or not hit[offset]:
+        return None
+
+    bar_open = open_prices[offset]
+    worse, better = (min, max) if position_type == PositionType.LONG else (max, min)
+    if sl_hit[offset]:
+        return offset, worse(bar_open, sl_price), ExitReason.STOP_LOSS
+    return offset, better(bar_open, tp_price), ExitReason.TAKE_PROFIT
+
+def backtest_arrays(data: pd.DataFrame, strategy: BaseStrategy, starting_balance: int, slippage_factor: float=5.0, commission: float=0.0,
+                    profiler: BacktestProfiler=None, ledger: TradeLedger=None, sl_tp_mode: str='legacy') -> pd.DataFrame:
+    """
+    Same position state machine as backtest, run over NumPy arrays instead of DataFrame rows.
+
+    Open/High/Low/Close and the strategy signal are pulled out of the DataFrame once, the realistic
+    buy and sell prices are computed for all bars up front, and qty/balance/portfolio_value are
+    written back in one step at the end. The results are identical to backtest.
+
+    When a ledger is given every exit fill is recorded in it, see backtest_trades.
+
+    sl_tp_mode selects how stop-loss and take-profit exits work:
+    - legacy: strategy.check_sl_tp on the previous bar, exactly as backtest does.
+    - first_passage: from the bar after the entry, the first bar whose range reaches the strategy's
+      sl_tp_prices levels is found with array operations and the position exits there at the level price.
+      Same-bar hits count as a stop loss, and positions are cleared on every exit. Custom check_sl_tp
+      overrides are not used in this mode.
+    """
+    if sl_tp_mode not in SL_TP_MODES:
+        raise ValueError(f'sl_tp_mode must be one of {SL_TP_MODES}, got {sl_tp_mode}')
+    if profiler is not None:
+        profiler.start()
+
+    try:
+        # initialize df
+        data['qty'] = 0.0
+        data['balance'] = 0.0
+
+        # Calculate strategy signal
+        with profile_phase(profiler, 'calc_signal'):
+            data['strategy_signal'] = strategy.calc_signal_array(data)
+        data.reset_index(inplace=True)
+
+        open_prices = data['Open'].to_numpy(dtype=np.float64)
+        high_prices = data['High'].to_numpy(dtype=np.float64)
+        low_prices = data['Low'].to_numpy(dtype=np.float64)
+        close_prices = data['Close'].to_numpy(dtype=np.float64)
+        with profile_phase(profiler, 'calc_realistic_price'):
+            buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, slippage_factor)
+        signals = data['strategy_signal'].to_numpy()
+
+        state_machine = run_position_state_machine if sl_tp_mode == 'legacy' else _run_first_passage_state_machine
+        with profile_phase(profiler, 'bar_loop'):
+            qty, balance = state_machine(strategy, signals, buy_prices, sell_prices, open_prices, high_prices,
+                                         low_prices, close_prices, starting_balance, commission, profiler, ledger)
+
+        with profile_phase(profiler, 'portfolio_value'):
+            data['qty'] = qty
+            data['balance'] = balance
+            data['portfolio_value'] = data['Close'] * data['qty'] + data['balance']
+        return data
+    finally:
+        if profiler is not None:
+            profiler.finish()
+
+def backtest_trades(data: pd.DataFrame, strategy: BaseStrategy, starting_balance: int, slippage_factor: float=5.0, commission: float=0.0,
+                    ledger: TradeLedger=None) -> Tuple[pd.DataFrame, TradeLedger]:
+    """
+    backtest_arrays that also returns the trades it made.
+
+    Parameters:
+    - ledger (TradeLedger): ledger to fill, cleared first. Reusing one ledger across the runs of a sweep keeps memory flat.
+
+    Returns:
+        Tuple[pd.DataFrame, TradeLedger]: the backtest DataFrame with the portfolio value and the filled ledger.
+    """
+    ledger = TradeLedger() if ledger is None else ledger
+    ledger.clear()
+    b_df = backtest_arrays(data, strategy, starting_balance, slippage_factor, commission, ledger=ledger)
+    return b_df, ledger
+
+def run_position_state_machine(strategy: BaseStrategy, signals: np.ndarray, buy_prices: np.ndarray, sell_prices: np.ndarray,
+                               open_prices: np.ndarray, high_prices: np.ndarray, low_prices: np.ndarray, close_prices: np.ndarray,
+                               starting_balance: float, commission: float, profiler: BacktestProfiler=None,
+                               ledger: TradeLedger=None, state: BacktestState=None, final: bool=True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The legacy bar loop, the engine shared by backtest_arrays, the walk forward, streaming and paper trading runs.
+    With a state it continues a run from where the previous call on the preceding bars stopped and updates
+    the state in place; final=False leaves the last bar open for a later call.
+    """
+    profiling = profiler is not None
+    enter_long = StrategySignal.ENTER_LONG.value
+    enter_short = StrategySignal.ENTER_SHORT.value
+    close_long = StrategySignal.CLOSE_LONG.value
+    close_short = StrategySignal.CLOSE_SHORT.value
+
+    num_trading_days = signals.shape[0]
+    qty = np.empty(num_trading_days, dtype=np.float64)
+    balance = np.empty(num_trading_days, dtype=np.float64)
+
+    # plain python floats are much cheaper to index one by one than numpy scalars
+    signals_list = signals.tolist()
+    buy_list = buy_prices.tolist()
+    sell_list = sell_prices.tolist()
+
+    state = BacktestState(starting_balance) if state is None else state
+    # bar numbers of the ledger and positions count from the start of the whole run
+    first_bar = state.bars
+    last_index = num_trading_days - 1 if final else -1
+
+    def close_position(index: int, curr_qty: float, curr_balance: float, position: Position,
+                       exit_reason: ExitReason = ExitReason.SIGNAL) -> Tuple[float, float]:
+        if position.type == PositionType.LONG:
+            if ledger is not None:
+                ledger.record_exit(position, first_bar + index, position.qty, sell_list[index], commission, exit_reason)
+            return curr_qty - position.qty, curr_balance + position.qty * sell_list[index] - commission
+        if ledger is not None:
+            ledger.record_exit(position, first_bar + index, position.qty, buy_list[index], commission, exit_reason)
+        return curr_qty + position.qty, curr_balance - position.qty * buy_list[index] - commission
+
+    position = state.position
+    curr_qty = state.qty
+    curr_balance = state.balance
+
+    for index in range(num_trading_days):
         # handle stop loss and take profit
         if position is not None:
-            sl_tp_res = strategy.check_sl_tp(data.iloc[index - 1], position)
+            if index == 0:
+                prev_row = state.prev_bar
+            else:
+                prev_row = {'Open': open_prices[index - 1], 'High': high_prices[index - 1],
+                            'Low': low_prices[index - 1], 'Close': close_prices[index - 1]}
+            if profiling:
+                sl_tp_start = time.perf_counter()
+            sl_tp_res = strategy.check_sl_tp(prev_row, position)
+            if profiling:
+                profiler.add_time('check_sl_tp', time.perf_counter() - sl_tp_start)
             if sl_tp_res is not None:
                 sl_tp_qty, sl_tp_price, sl_tp_action = sl_tp_res
+                if profiling:
+                    profiler.count_sl_tp(position, sl_tp_price, sl_tp_action)
+                if ledger is not None:
+                    ledger.record_exit(position, first_bar + index, sl_tp_qty, sl_tp_price, commission,
+                                       sl_tp_exit_reason(position, sl_tp_price, sl_tp_action))
                 if sl_tp_action == ActionType.BUY:
                     curr_balance = curr_balance - sl_tp_qty * sl_tp_price - commission
                     curr_qty = curr_qty + sl_tp_qty
-                    
+
                 elif sl_tp_action == ActionType.SELL:
                     curr_balance = curr_balance + sl_tp_qty * sl_tp_price - commission
                     curr_qty = curr_qty - sl_tp_qty
-        
+
+        signal = signals_list[index]
+
         # Close position at end of trade
-        if index + 1 == num_trading_days and position is not None: 
-            close_position(data, index, row, curr_qty, curr_balance, position)
-                
+        if index == last_index and position is not None:
+            curr_qty, curr_balance = close_position(index, curr_qty, curr_balance, position, ExitReason.END_OF_DATA)
+            if profiling:
+                profiler.count('final_closes')
+
         # Handle enter long signal
-        elif row['strategy_signal'] == StrategySignal.ENTER_LONG:
-            position = enter_position(data, index, row, curr_qty, curr_balance, PositionType.LONG)
-        
-        # Handle enter short signal  
-        elif row['strategy_signal'] == StrategySignal.ENTER_SHORT: 
-            position = enter_position(data, index, row, curr_qty, curr_balance, PositionType.SHORT)
-        
-        # Handle close long or short signal 
-        elif row['strategy_signal'] in [StrategySignal.CLOSE_LONG, StrategySignal.CLOSE_SHORT] and position is not None:
-            close_position(data, index, row, curr_qty, curr_balance, position)
-        
-        else:
-            data.loc[index, 'qty'] = curr_qty
-            data.loc[index, 'balance'] = curr_balance
-        
-    
-    # Calculate portfolio value
-    data['portfolio_value'] = data['Close'] * data['qty'] + data['balance']
-    return data
+        elif signal == enter_long:
+            buy_price = buy_list[index]
+            qty_to_buy = strategy.calc_qty(buy_price, curr_balance, ActionType.BUY)
+            position = Position(qty_to_buy, buy_price, PositionType.LONG, first_bar + index, commission)
+            curr_qty = curr_qty + qty_to_buy
+            curr_balance = curr_balance - qty_to_buy * buy_price - commission
+            if profiling:
+                profiler.count('long_entries')
+
+        # Handle enter short signal
+        elif signal == enter_short:
+            sell_price = sell_list[index]
+            qty_to_sell = strategy.calc_qty(sell_price, curr_balance, ActionType.SELL)
+            position = Position(qty_to_sell, sell_price, PositionType.SHORT, first_bar + index, commission)
+            curr_qty = curr_qty - qty_to_sell
+            curr_balance = curr_balance + qty_to_sell * sell_price - commission
+            if profiling:
+                profiler.count('short_entries')
+
+        # Handle close long or short signal
+        elif (signal == close_long or signal == close_short) and position is not None:
+            curr_qty, curr_balance = close_position(index, curr_qty, curr_balance, position)
+            if profiling:
+                profiler.count('signal_closes')
+
+        qty[index] = curr_qty
+        balance[index] = curr_balance
+
+    if profiling:
+        profiler.count('bars', num_trading_days)
+    state.position = position
+    state.qty = curr_qty
+    state.balance = curr_balance
+    state.bars += num_trading_days
+    if num_trading_days:
+        state.prev_bar = {'Open': open_prices[-1], 'High': high_prices[-1], 'Low': low_prices[-1], 'Close': close_prices[-1]}
+    return qty, balance
+
+def _run_first_passage_state_machine(strategy: BaseStrategy, signals: np.ndarray, buy_prices: np.ndarray, sell_prices: np.ndarray,
+                                     open_prices: np.ndarray, high_prices: np.ndarray, low_prices: np.ndarray, close_prices: np.ndarray,
+                                     starting_balance: float, commission: float, profiler: BacktestProfiler=None,
+                                     ledger: TradeLedger=None) -> Tuple[np.ndarray, np.ndarray]:
+    num_trading_days = signals.shape[0]
+    last_bar = num_trading_days - 1
+    uses_sl_tp = strategy.sl_rate is not None or strategy.tp_rate is not None
+
+    # the state only changes on signal bars and exit bars, so only those are visited
+    event_bars = np.flatnonzero(signals != StrategySignal.DO_NOTHING.value).tolist()
+    if not event_bars or event_bars[-1] != last_bar:
+        event_bars.append(last_bar)
+
+    change_bars = []
+    change_qty = []
+    change_balance = []
+
+    def change(index: int, qty: float, balance: float) -> None:
+        change_bars.append(index)
+        change_qty.append(qty)
+        change_balance.append(balance)
+
+    def close_position(index: int, curr_qty: float, curr_balance: float, position: Position, exit_price: float,
+                       exit_reason: ExitReason) -> Tuple[float, float]:
+        if ledger is not None:
+            ledger.record_exit(position, index, position.qty, exit_price, commission, exit_reason)
+        if position.type == PositionType.LONG:
+            return curr_qty - position.qty, curr_balance + position.qty * exit_price - commission
+        return curr_qty + position.qty, curr_balance - position.qty * exit_price - commission
+
+    position: Position = None
+    levels = (None, None)
+    scan_from = 0
+    curr_qty = 0
+    curr_balance = starting_balance
+
+    for index in event_bars:
+        # jump to the first bar between the last visited one and this one that hits a level
+        if position is not None and uses_sl_tp and scan_from < index:
+            bars = slice(scan_from, index)
+            passage = find_first_passage(open_prices[bars], high_prices[bars], low_prices[bars], position.type, *levels)
+            if passage is not None:
+                offset, exit_price, exit_reason = passage
+                curr_qty, curr_balance = close_position(scan_from + offset, curr_qty, curr_balance, position, exit_price, exit_reason)
+                change(scan_from + offset, curr_qty, curr_balance)
+                if profiler is not None:
+                    profiler.count('stop_losses' if exit_reason == ExitReason.STOP_LOSS else 'take_profits')
+                position = None
+
+        signal = signals[index]
+
+        # Close position at end of trade
+        if index == last_bar and position is not None:
+            exit_price = sell_prices[index] if position.type == PositionType.LONG else buy_prices[index]
+            curr_qty, curr_balance = close_position(index, curr_qty, curr_balance, position, exit_price, ExitReason.END_OF_DATA)
+            position = None
+            if profiler is not None:
+                profiler.count('final_closes')
+
+        # Handle enter long signal
+        elif signal == StrategySignal.ENTER_LONG.value:
+            buy_price = buy_prices[index]
+            qty_to_buy = strategy.calc_qty(buy_price, curr_balance, ActionType.BUY)
+            position = Position(qty_to_buy, buy_price, PositionType.LONG, index, commission)
+            curr_qty = curr_qty + qty_to_buy
+            curr_balance = curr_balance - qty_to_buy * buy_price - commission
+            if profiler is not None:
+                profiler.count('long_entries')
+
+        # Handle enter short signal
+        elif signal == StrategySignal.ENTER_SHORT.value:
+            sell_price = sell_prices[index]
+            qty_to_sell = strategy.calc_qty(sell_price, curr_balance, ActionType.SELL)
+            position = Position(qty_to_sell, sell_price, PositionType.SHORT, index, commission)
+            curr_qty = curr_qty - qty_to_sell
+            curr_balance = curr_balance + qty_to_sell * sell_price - commission
+            if profiler is not None:
+                profiler.count('short_entries')
+
+        # Handle close long or short signal
+        elif signal in (StrategySignal.CLOSE_LONG.value, StrategySignal.CLOSE_SHORT.value) and position is not None:
+            exit_price = sell_prices[index] if position.type == PositionType.LONG else buy_prices[index]
+            curr_qty, curr_balance = close_position(index, curr_qty, curr_balance, position, exit_price, ExitReason.SIGNAL)
+            position = None
+            if profiler is not None:
+                profiler.count('signal_closes')
+
+        if position is not None and position.entry_bar == index:
+            levels = strategy.sl_tp_prices(position)
+        scan_from = index + 1
+        change(index, curr_qty, curr_balance)
+
+    if profiler is not None:
+        profiler.count('bars', num_trading_days)
+
+    # every bar holds the state of the last change at or before it
+    latest = np.searchsorted(np.asarray(change_bars), np.arange(num_trading_days), side='right') - 1
+    qty = np.where(latest >= 0, np.asarray(change_qty)[latest], 0.0)
+    balance = np.where(latest >= 0, np.asarray(change_balance)[latest], float(starting_balance))
+    return qty, balance
 
 if __name__ == '__main__':
     balance = 10000
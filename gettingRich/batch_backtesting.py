@@ -0,0 +1,123 @@
+import pandas as pd
+import numpy as np
+from typing import List, Tuple
+
+from models import StrategySignal
+from strategies import BaseStrategy, signal_codes
+from backtesting import calc_realistic_prices
+from evaluation import calc_metrics_table
+
+
+def build_signal_matrix(data: pd.DataFrame, strategies: List[BaseStrategy]) -> np.ndarray:
+    """
+    Runs calc_signal_array of every strategy on the same data and stacks the results.
+
+    Returns:
+        np.ndarray: int8 matrix of shape (len(strategies), len(data)) holding StrategySignal values.
+    """
+    signals = np.empty((len(strategies), data.shape[0]), dtype=np.int8)
+    for i, strategy in enumerate(strategies):
+        signals[i] = strategy.calc_signal_array(data.copy(deep=False))
+    return signals
+
+
+def batch_backtest(data: pd.DataFrame, signals: np.ndarray, starting_balance: float, slippage_factor: float=5.0,
+                   commission: float=0.0, param_sets: pd.DataFrame=None) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Backtests many parameter sets over the same OHLC data in one pass.
+
+    Every row of signals is one parameter set, every column one bar. The realistic buy and sell prices are
+    computed once for all sets, and the position state machine of backtest (with the default calc_qty and no
+    stop-loss/take-profit) is stepped for all sets together, only on bars where at least one set has a signal.
+
+    Parameters:
+    - data (pd.DataFrame): candles with Open and Close columns.
+    - signals (np.ndarray): (parameter sets x bars) matrix of StrategySignal values or members.
+    - param_sets (pd.DataFrame): optional parameters of every set, joined to the left of the metrics table.
+
+    Returns:
+        Tuple[np.ndarray, pd.DataFrame]: (parameter sets x bars) portfolio values and the metrics of every set.
+    """
+    signals = signal_codes(signals)
+    if signals.ndim != 2 or signals.shape[1] != data.shape[0]:
+        raise ValueError(f'signals must have shape (parameter sets, {data.shape[0]}), got {signals.shape}')
+
+    open_prices = data['Open'].to_numpy(dtype=np.float64)
+    close_prices = data['Close'].to_numpy(dtype=np.float64)
+    buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, slippage_factor)
+
+    qty, balance = _run_batch_state_machine(signals, buy_prices, sell_prices, float(starting_balance), commission)
+    portfolio_values = close_prices * qty + balance
+
+    metrics = calc_metrics_table(portfolio_values)
+    if param_sets is not None:
+        metrics = pd.concat([pd.DataFrame(param_sets).reset_index(drop=True), metrics], axis=1)
+    return portfolio_values, metrics
+
+
+def _run_batch_state_machine(signals: np.ndarray, buy_prices: np.ndarray, sell_prices: np.ndarray,
+                             starting_balance: float, commission: float) -> Tuple[np.ndarray, np.ndarray]:
+    num_sets, num_trading_days = signals.shape
+    last_bar = num_trading_days - 1
+
+    # state of every parameter set, position_type 0 means no position was ever opened
+    curr_qty = np.zeros(num_sets)
+    curr_balance = np.full(num_sets, starting_balance)
+    position_qty = np.zeros(num_sets)
+    position_type = np.zeros(num_sets, dtype=np.int8)
+
+    # the state only changes on bars where some set has a signal, plus the final bar
+    event_bars = np.flatnonzero((signals != StrategySignal.DO_NOTHING.value).any(axis=0))
+    if event_bars.size == 0 or event_bars[-1] != last_bar:
+        event_bars = np.append(event_bars, last_bar)
+
+    event_qty = np.empty((num_sets, event_bars.size))
+    event_balance = np.empty((num_sets, event_bars.size))
+
+    for event, index in enumerate(event_bars):
+        signal = signals[:, index]
+        has_position = position_type != 0
+        is_last_bar = index == last_bar
+        buy_price = buy_prices[index]
+        sell_price = sell_prices[index]
+
+        # same precedence as backtest: final bar close, enter long, enter short, close signal
+        if is_last_bar:
+            close = has_position
+            enter_long = ~has_position & (signal == StrategySignal.ENTER_LONG.value)
+            enter_short = ~has_position & (signal == StrategySignal.ENTER_SHORT.value)
+        else:
+            enter_long = signal == StrategySignal.ENTER_LONG.value
+            enter_short = signal == StrategySignal.ENTER_SHORT.value
+            close = has_position & ((signal == StrategySignal.CLOSE_LONG.value) | (signal == StrategySignal.CLOSE_SHORT.value))
+
+        close_long = close & (position_type == 1)
+        close_short = close & (position_type == -1)
+        curr_qty = np.where(close_long, curr_qty - position_qty, curr_qty)
+        curr_balance = np.where(close_long, curr_balance + position_qty * sell_price - commission, curr_balance)
+        curr_qty = np.where(close_short, curr_qty + position_qty, curr_qty)
+        curr_balance = np.where(close_short, curr_balance - position_qty * buy_price - commission, curr_balance)
+
+        qty_to_buy = curr_balance / buy_price
+        qty_to_sell = curr_balance / sell_price
+        curr_qty = np.where(enter_long, curr_qty + qty_to_buy, curr_qty)
+        curr_balance = np.where(enter_long, curr_balance - qty_to_buy * buy_price - commission, curr_balance)
+        curr_qty = np.where(enter_short, curr_qty - qty_to_sell, curr_qty)
+        curr_balance = np.where(enter_short, curr_balance + qty_to_sell * sell_price - commission, curr_balance)
+
+        position_qty = np.where(enter_long, qty_to_buy, np.where(enter_short, qty_to_sell, position_qty))
+        position_type[enter_long] = 1
+        position_type[enter_short] = -1
+
+        event_qty[:, event] = curr_qty
+        event_balance[:, event] = curr_balance
+
+    # carry the state of the latest event forward to every bar, bars before the first event hold the start state
+    latest_event = np.searchsorted(event_bars, np.arange(num_trading_days), side='right') - 1
+    before_first_event = latest_event < 0
+    latest_event[before_first_event] = 0
+    qty = event_qty[:, latest_event]
+    balance = event_balance[:, latest_event]
+    qty[:, before_first_event] = 0.0
+    balance[:, before_first_event] = starting_balance
+    return qty, balance
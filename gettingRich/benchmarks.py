@@ -0,0 +1,241 @@
+"""
+Benchmarks for the backtesting, indicator, evaluation and kline parsing code on synthetic data.
+
+    python benchmarks.py --sizes 1000 100000 --output bench.json --baseline baseline.json
+
+Every component is timed at every size it supports and the wall time, throughput and tracemalloc peak
+memory are written to JSON. When a baseline JSON is given, components that got slower or use more
+memory than the threshold allows are reported and the exit code is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from backtesting import backtest, backtest_arrays
+from binanceData import KlineColumnsBuilder, STCosi, calc_UTBot, columns_to_dataframe, decode_klines_page
+from evaluation import evaluate_strategy
+from indicators import average_true_range
+from strategies import BuyAndHoldStrategy
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+PAGE_LIMIT = 1500
+
+
+def synthetic_ohlcv(num_bars: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Random walk minute candles with consistent Open/High/Low/Close and a Volume column.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, num_bars)))
+    open_ = np.r_[100, close[:-1]]
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + rng.uniform(0, 0.001, num_bars)),
+        'Low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.001, num_bars)),
+        'Close': close,
+        'Volume': rng.uniform(1, 100, num_bars),
+    }, index=pd.date_range('2020-01-01', periods=num_bars, freq='min', name='Date'))
+
+
+def synthetic_kline_pages(num_bars: int, seed: int = 0) -> List[bytes]:
+    """
+    The raw /fapi/v1/klines response bodies that would return num_bars synthetic candles.
+    """
+    df = synthetic_ohlcv(num_bars, seed)
+    open_time = df.index.asi8 // 1_000_000
+    pages = []
+    for start in range(0, num_bars, PAGE_LIMIT):
+        rows = [[int(t), f'{o:.2f}', f'{h:.2f}', f'{l:.2f}', f'{c:.2f}', f'{v:.3f}', int(t) + 59_999, f'{v * c:.4f}', 100,
+                 f'{v / 2:.3f}', f'{v * c / 2:.4f}', '0']
+                for t, o, h, l, c, v in zip(open_time[start:start + PAGE_LIMIT], *(df[col].to_numpy()[start:start + PAGE_LIMIT]
+                                                                                   for col in ['Open', 'High', 'Low', 'Close', 'Volume']))]
+        pages.append(json.dumps(rows, separators=(',', ':')).encode())
+    return pages
+
+
+class Component(NamedTuple):
+    # builds the inputs outside of the timed region and returns the function to time
+    setup: Callable[[int], Callable[[], object]]
+    max_bars: int
+
+
+def _setup_backtest(num_bars):
+    data = synthetic_ohlcv(num_bars)
+    return lambda: backtest(data.copy(), BuyAndHoldStrategy(), 10000)
+
+
+def _setup_backtest_arrays(num_bars):
+    data = synthetic_ohlcv(num_bars)
+    return lambda: backtest_arrays(data.copy(), BuyAndHoldStrategy(), 10000)
+
+
+def _setup_utbot(num_bars):
+    data = synthetic_ohlcv(num_bars)
+    df = pd.DataFrame({'close': data['Close'].to_numpy(),
+                       'ATR': average_true_range(data['Close'].to_numpy(), data['High'].to_numpy(), data['Low'].to_numpy(), 300)})
+    return lambda: calc_UTBot(df.copy(), 2, 300)
+
+
+def _setup_stc(num_bars):
+    close = synthetic_ohlcv(num_bars)['Close']
+    return lambda: STCosi(close, 27, 50, 80)
+
+
+def _setup_evaluation(num_bars):
+    b_df = pd.DataFrame({'portfolio_value': 10000 * synthetic_ohlcv(num_bars)['Close'].to_numpy() / 100})
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return evaluate_strategy(b_df, 'benchmark')
+    return run
+
+
+def _setup_kline_parsing(num_bars):
+    pages = synthetic_kline_pages(num_bars)
+
+    def run():
+        builder = KlineColumnsBuilder(num_bars)
+        for raw in pages:
+            builder.append_page(decode_klines_page(raw))
+        return columns_to_dataframe(builder.to_columns())
+    return run
+
+
+COMPONENTS: Dict[str, Component] = {
+    # the row by row backtest needs about half a minute per 100k bars
+    'backtest': Component(_setup_backtest, 100_000),
+    'backtest_arrays': Component(_setup_backtest_arrays, 10_000_000),
+    'calc_UTBot': Component(_setup_utbot, 10_000_000),
+    'STCosi': Component(_setup_stc, 10_000_000),
+    'evaluate_strategy': Component(_setup_evaluation, 10_000_000),
+    # synthetic response bodies for more bars take longer to build than to parse
+    'kline_parsing': Component(_setup_kline_parsing, 1_000_000),
+}
+
+
+def measure(run: Callable[[], object], repeats: int = 3) -> dict:
+    """
+    Runs run once under tracemalloc for the peak memory, then times it repeats times and keeps the best
+    wall time. The traced run doubles as warm-up, so JIT compilation is not timed.
+
+    Returns:
+        dict: seconds and peak_memory_mb.
+    """
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    return {'seconds': best, 'peak_memory_mb': peak / 2**20}
+
+
+def run_benchmarks(sizes: List[int] = None, components: List[str] = None, repeats: int = 3) -> dict:
+    """
+    Runs every requested component at every requested size it supports.
+
+    Returns:
+        dict: Run metadata and one result per component and size, ready to be saved as JSON.
+    """
+    sizes = DEFAULT_SIZES if sizes is None else sizes
+    components = list(COMPONENTS) if components is None else components
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        raise ValueError(f'Unknown components {sorted(unknown)}, expected some of {list(COMPONENTS)}')
+
+    results = []
+    for name in components:
+        component = COMPONENTS[name]
+        for num_bars in sizes:
+            if num_bars > component.max_bars:
+                continue
+            # the biggest sizes take long enough that one timed run is representative
+            timing = measure(component.setup(num_bars), repeats if num_bars <= 100_000 else 1)
+            results.append({'component': name, 'bars': num_bars, **timing, 'bars_per_sec': num_bars / timing['seconds']})
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def compare_results(current: dict, baseline: dict, time_threshold: float = 0.2, memory_threshold: float = 0.2) -> List[dict]:
+    """
+    Finds the components that regressed against a baseline run.
+
+    Parameters:
+    - current (dict): Output of run_benchmarks.
+    - baseline (dict): Output of an earlier run_benchmarks.
+    - time_threshold (float): Allowed relative increase of the wall time.
+    - memory_threshold (float): Allowed relative increase of the peak memory.
+
+    Returns:
+        List[dict]: One entry per regressed metric with the baseline and current values and their ratio.
+    """
+    baseline_results = {(r['component'], r['bars']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get((result['component'], result['bars']))
+        if previous is None:
+            continue
+        for metric, threshold in (('seconds', time_threshold), ('peak_memory_mb', memory_threshold)):
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append({'component': result['component'], 'bars': result['bars'], 'metric': metric,
+                                    'baseline': previous[metric], 'current': result[metric],
+                                    'ratio': result[metric] / previous[metric]})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--components', nargs='+', choices=list(COMPONENTS), default=list(COMPONENTS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='where to save the results JSON')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown or memory growth')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.components, args.repeats)
+    for r in report['results']:
+        print(f"{r['component']:<18} {r['bars']:>10,} bars  {r['seconds']:>9.4f}s  {r['bars_per_sec']:>14,.0f} bars/s  {r['peak_memory_mb']:>9.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(report, json.load(f), args.threshold, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['component']} at {r['bars']:,} bars: {r['metric']} {r['baseline']:.4f} -> {r['current']:.4f} ({r['ratio']:.2f}x)")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
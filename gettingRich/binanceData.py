@@ -3,6 +3,96 @@ import numpy as np
 import pandas as pd
 import requests
 
+from indicators import normalize_smooth, smooth_series, stc, utbot_trailing_stop
+
+# columns and dtypes of the candles returned by /fapi/v1/klines
+KLINE_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume',
+                 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore']
+KLINE_DTYPE = {
+    'open_time': 'datetime64[ms, Asia/Jerusalem]',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'float64',
+    'close_time': 'datetime64[ms, Asia/Jerusalem]',
+    'quote_asset_volume': 'float64',
+    'number_of_trades': 'int64',
+    'taker_buy_base_asset_volume': 'float64',
+    'taker_buy_quote_asset_volume': 'float64',
+    'ignore': 'float64'
+}
+
+# numpy dtype of every kline column when stored as plain arrays, times as epoch ms
+KLINE_ARRAY_DTYPE = {column: np.int64 if column in ('open_time', 'close_time', 'number_of_trades') else np.float64
+                     for column in KLINE_COLUMNS}
+
+# length of every fixed length kline interval in ms
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000, '12h': 43_200_000,
+    '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+}
+
+def klines_to_dataframe(candles_data) -> pd.DataFrame:
+    df = pd.DataFrame(candles_data, columns=KLINE_COLUMNS)
+    return df.astype(KLINE_DTYPE)
+
+def klines_to_columns(candles_data) -> dict:
+    # raw klines rows -> one typed numpy array per column
+    if len(candles_data) == 0:
+        return {column: np.empty(0, dtype=KLINE_ARRAY_DTYPE[column]) for column in KLINE_COLUMNS}
+    fields = list(zip(*candles_data))
+    return {column: np.array(fields[i], dtype=KLINE_ARRAY_DTYPE[column]) for i, column in enumerate(KLINE_COLUMNS)}
+
+def columns_to_dataframe(columns: dict, tz: str = 'Asia/Jerusalem') -> pd.DataFrame:
+    # typed kline columns -> the DataFrame get_binance_historical_data returns, the price columns are not copied
+    data = {}
+    for column in KLINE_COLUMNS:
+        values = columns[column]
+        if column in ('open_time', 'close_time'):
+            # the epoch ms are only reinterpreted as datetimes, the time zone is applied on top of them
+            values = pd.DatetimeIndex(np.asarray(values, dtype=np.int64).view('datetime64[ms]'), copy=False).tz_localize('UTC').tz_convert(tz)
+        data[column] = values
+    return pd.DataFrame(data, copy=False)
+
+def decode_klines_page(raw: bytes) -> np.ndarray:
+    """
+    Decodes a /fapi/v1/klines response body straight into a (candles x 12) float64 matrix.
+
+    The brackets and quotes are dropped and the remaining comma separated numbers parsed in one call, without
+    building a python list per candle. Times and trade counts are integers far below 2**53, so float64 holds them exactly.
+    """
+    numbers = raw.translate(None, b'[]"')
+    if not numbers.strip():
+        return np.empty((0, len(KLINE_COLUMNS)))
+    return np.fromstring(numbers, sep=',').reshape(-1, len(KLINE_COLUMNS))
+
+class KlineColumnsBuilder:
+    """Preallocated typed kline columns that decoded pages are copied into, growing by doubling when full."""
+    def __init__(self, capacity: int = 1500):
+        self.size = 0
+        self.columns = {column: np.empty(max(capacity, 1), dtype=KLINE_ARRAY_DTYPE[column]) for column in KLINE_COLUMNS}
+
+    def append_page(self, page: np.ndarray) -> None:
+        num_candles = page.shape[0]
+        capacity = self.columns['open_time'].shape[0]
+        if self.size + num_candles > capacity:
+            new_capacity = max(2 * capacity, self.size + num_candles)
+            for column, values in self.columns.items():
+                grown = np.empty(new_capacity, dtype=values.dtype)
+                grown[:self.size] = values[:self.size]
+                self.columns[column] = grown
+        for i, column in enumerate(KLINE_COLUMNS):
+            self.columns[column][self.size:self.size + num_candles] = page[:, i]
+        self.size += num_candles
+
+    def last_open_time(self) -> int:
+        return int(self.columns['open_time'][self.size - 1])
+
+    def to_columns(self) -> dict:
+        return {column: values[:self.size] for column, values in self.columns.items()}
+
 # Function to make an API call to Binance
 def make_api_call(base_url, endpoint="", method="GET", **kwargs):
     # Construct the full URL
@@ -18,9 +108,16 @@ def make_api_call(base_url, endpoint="", method="GET", **kwargs):
         # If the request was not successful, raise an exception with the error message
         raise Exception(f'API request failed with status code {response.status_code}: {response.text}')
 
-def get_binance_historical_data(symbol, interval, start_date, end_date=None):
+def get_binance_historical_data(symbol, interval, start_date, end_date=None, cache_dir=None, base_url='https://fapi.binance.com'):
+    # with a cache directory, serve the candles from the local cache and download only what it is missing
+    if cache_dir is not None:
+        from functools import partial
+        from binance_downloader import download_klines
+        from candle_cache import CandleCache
+        # missing candles come from the same endpoint as without a cache
+        return CandleCache(cache_dir, fetch=partial(download_klines, base_url=base_url)).get(symbol, interval, start_date, end_date)
+
     # define basic parameters for call
-    base_url = 'https://fapi.binance.com'
     endpoint = '/fapi/v1/klines'
     method = 'GET'
 
@@ -36,47 +133,33 @@ def get_binance_historical_data(symbol, interval, start_date, end_date=None):
     if end_date:
         params['endTime'] = end_date
 
+    # Preallocate the columns for the whole range when its length is known
+    capacity = 1500
+    if end_date and interval in INTERVAL_MS:
+        capacity = (end_date - start_date) // INTERVAL_MS[interval] + 1
+    candles_data = KlineColumnsBuilder(capacity)
+
     # Make initial API call to get candles
     response = make_api_call(base_url, endpoint=endpoint, method=method, params=params)
+    page = decode_klines_page(response.content)
 
-    candles_data = []
-
-    while len(response.json()) > 0:
-        # Append the received candles to the list
-        candles_data.extend(response.json())
+    while page.shape[0] > 0:
+        # Append the received candles to the typed columns
+        candles_data.append_page(page)
 
         # Update the start time for the next API call
-        params['startTime'] = candles_data[-1][0] + 1  # last candle open_time + 1ms
+        params['startTime'] = candles_data.last_open_time() + 1  # last candle open_time + 1ms
 
         # If end_date is provided and the last candle's open_time is greater than or equal to end_date, stop fetching data
-        if end_date and candles_data[-1][0] >= end_date:
+        if end_date and candles_data.last_open_time() >= end_date:
             break
 
         # Make the next API call
         response = make_api_call(base_url, endpoint=endpoint, method=method, params=params)
+        page = decode_klines_page(response.content)
 
     # Wrap the candles data as a pandas DataFrame
-    columns = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume',
-               'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore']
-    dtype = {
-        'open_time': 'datetime64[ms, Asia/Jerusalem]',
-        'open': 'float64',
-        'high': 'float64',
-        'low': 'float64',
-        'close': 'float64',
-        'volume': 'float64',
-        'close_time': 'datetime64[ms, Asia/Jerusalem]',
-        'quote_asset_volume': 'float64',
-        'number_of_trades': 'int64',
-        'taker_buy_base_asset_volume': 'float64',
-        'taker_buy_quote_asset_volume': 'float64',
-        'ignore': 'float64'
-    }
-
-    df = pd.DataFrame(candles_data, columns=columns)
-    df = df.astype(dtype)
-
-    return df
+    return columns_to_dataframe(candles_data.to_columns())
 
 # as you mentioned in the phone call, this could be problamatic to send the dataframe over and over again between the functions
 # so instead i made 1 function that excepts the dataframe and calculates apon the dataframe all of the values needed that are applied in the pseudo code below
@@ -94,22 +177,9 @@ def CO(a: pd.Series, b: pd.Series) -> pd.Series:
 
 def UTBot(close, high, low, key_value, atr_length) -> pd.Series:
     lossThreshold = key_value * ATR(TR(close, high, low), atr_length)
-    trailingStop = 0 * lossThreshold
-
-    for i in range(1, len(trailingStop)):
-
-        # the previous trailing stop is lower than the current and previous close
-        if (close[i] > trailingStop[i - 1]) & (close[i - 1] > trailingStop[i - 1]):
-            trailingStop[i] = max(trailingStop[i - 1], close[i] - lossThreshold[i])
-        # the previous trailing stop is higher than the current and previous close
-        elif (close[i] < trailingStop[i - 1]) & (close[i - 1] < trailingStop[i - 1]):
-            trailingStop[i] = min(trailingStop[i - 1], close[i] - lossThreshold[i])
-        # the previous trailing stop is lower than the current close and higher than the previous close
-        elif (close[i] > trailingStop[i - 1]):
-            trailingStop[i] = close[i] - lossThreshold[i]
-        # the previous trailing stop is higher than the current close and lower than the previous close
-        else:
-            trailingStop[i] = close[i] + lossThreshold[i]
+    # trailing stop recursion over the raw arrays, starting from 0 * lossThreshold
+    trailingStop = pd.Series(utbot_trailing_stop(close.to_numpy(), lossThreshold.to_numpy(), initial_stop=0 * lossThreshold.iloc[0]),
+                             index=close.index)
 
     above = CO(close, trailingStop)
     below = CO(trailingStop, close)
@@ -123,43 +193,15 @@ def UTBot(close, high, low, key_value, atr_length) -> pd.Series:
 
 # smoothing function
 def SmoothSrs(srs, smoothing_f):
-    smoothed_srs = srs.copy()
-    for i in range(1, len(smoothed_srs)):
-        if np.isnan(smoothed_srs[i-1]):
-            smoothed_srs[i] = srs[i]
-        else:
-            smoothed_srs[i] = smoothed_srs[i-1] + smoothing_f * (srs[i] - smoothed_srs[i-1])
-    return smoothed_srs
+    return pd.Series(smooth_series(srs.to_numpy(), smoothing_f), index=srs.index, name=srs.name)
 
 # normalization function with smoothing
 def normNsmooth(srs, stc_length, smoothing_factor):
-    # finding the lowest and highest range
-    lowest = srs.rolling(stc_length).min()
-    highestRange = srs.rolling(stc_length).max() - lowest
-    
-    # normalizing srs
-    normalizedsrs = srs.copy()
-    normalizedsrs[highestRange > 0] = ((srs - lowest) / highestRange * 100)*(highestRange > 0)
-    normalizedsrs[highestRange <= 0] = np.nan
-    normalizedsrs.fillna(method = 'ffill', inplace = True)
-
-    # smoothing the srs
-    return SmoothSrs(normalizedsrs, smoothing_factor)
+    return pd.Series(normalize_smooth(srs.to_numpy(), stc_length, smoothing_factor), index=srs.index, name=srs.name)
 
 # complete function for calculating osciallatior
 def STCosi(srs, fast_length, slow_length, stc_length, smoothing_factor = 0.5):
-    
-    # ema calculation for fast and slow length's
-    fast_ema = srs.ewm(span = fast_length).mean()
-    slow_ema = srs.ewm(span = slow_length).mean()
-
-    # MacdDiff calculation
-    MacdDiff = fast_ema - slow_ema
-
-    smoothedMacd = normNsmooth(MacdDiff, stc_length, smoothing_factor)
-    FinalSTC = normNsmooth(smoothedMacd, stc_length, smoothing_factor)
-    
-    return FinalSTC
+    return pd.Series(stc(srs.to_numpy(), fast_length, slow_length, stc_length, smoothing_factor), index=srs.index, name=srs.name)
 
 def calc_TR(df) -> pd.DataFrame:
     df['prev_close'] = df['close'].shift(1)
@@ -177,25 +219,7 @@ def calc_crossover(df, a, b, target_col_name):
 
 def calc_UTBot(df, key_value, atr_length):
     df['loss_threshold'] = key_value * df['ATR']
-    df['trailing_stop'] = np.nan
-
-    for i in range(1, len(df)):
-
-        # upward trend
-        if (df['close'][i] > df['trailing_stop'][i - 1]) & (df['close'][i - 1] > df['trailing_stop'][i - 1]):
-            df['trailing_stop'][i] = max(df['trailing_stop'][i - 1], df['close'][i] - df['loss_threshold'][i])
-
-        # downward trend
-        elif (df['close'][i] < df['trailing_stop'][i - 1]) & (df['close'][i - 1] < df['trailing_stop'][i - 1]):
-            df['trailing_stop'][i] = min(df['trailing_stop'][i - 1], df['close'][i] - df['loss_threshold'][i])
-
-        elif (df['close'][i] > df['trailing_stop'][i - 1]):
-            df['trailing_stop'][i] = df['close'][i] - df['loss_threshold'][i]
-
-        else:
-            df['trailing_stop'][i] = df['close'][i] + df['loss_threshold'][i]
-
-        # stop loss
+    df['trailing_stop'] = utbot_trailing_stop(df['close'].to_numpy(), df['loss_threshold'].to_numpy())
 
     df = calc_crossover(df, 'close', 'trailing_stop', 'crossover_above')
     df = calc_crossover(df, 'trailing_stop', 'close', 'crossover_below')
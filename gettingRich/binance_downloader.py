@@ -0,0 +1,146 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from binanceData import INTERVAL_MS, KlineColumnsBuilder, columns_to_dataframe, decode_klines_page
+
+BASE_URL = 'https://fapi.binance.com'
+KLINES_ENDPOINT = '/fapi/v1/klines'
+PAGE_LIMIT = 1500
+# request weight of /fapi/v1/klines with limit above 1000, and the futures limit per minute
+KLINES_PAGE_WEIGHT = 10
+WEIGHT_LIMIT_PER_MINUTE = 2400
+
+
+def page_ranges(interval: str, start_date: int, end_date: int) -> List[Tuple[int, int]]:
+    """
+    Splits [start_date, end_date] (ms) into (startTime, endTime) chunks of at most one 1500 candle page each.
+    """
+    if interval not in INTERVAL_MS:
+        raise ValueError(f'interval {interval} has no fixed length, supported intervals: {list(INTERVAL_MS)}')
+    page_ms = INTERVAL_MS[interval] * PAGE_LIMIT
+    return [(page_start, min(page_start + page_ms - 1, end_date)) for page_start in range(start_date, end_date + 1, page_ms)]
+
+
+class WeightLimiter:
+    """
+    Keeps the requests of all download threads under the Binance request weight limit.
+
+    The used weight reported by the X-MBX-USED-WEIGHT-1M header is tracked, and a request that would go over
+    the limit waits for the next minute window.
+    """
+    def __init__(self, limit_per_minute: int = WEIGHT_LIMIT_PER_MINUTE, clock=time.time, sleep=time.sleep):
+        self.limit_per_minute = limit_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.window = None
+        self.used_weight = 0
+        self.blocked_until = 0.0
+
+    def acquire(self, weight: int) -> None:
+        while True:
+            with self.lock:
+                now = self.clock()
+                window = int(now // 60)
+                if window != self.window:
+                    self.window = window
+                    self.used_weight = 0
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.used_weight + weight > self.limit_per_minute:
+                    wait = (window + 1) * 60 - now
+                else:
+                    self.used_weight += weight
+                    return
+            self.sleep(wait)
+
+    def report(self, used_weight: int) -> None:
+        with self.lock:
+            self.used_weight = max(self.used_weight, used_weight)
+
+    def block_for(self, seconds: float) -> None:
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+def create_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_page(session: requests.Session, limiter: WeightLimiter, base_url: str, params: dict,
+               max_retries: int = 5, backoff: float = 1.0) -> np.ndarray:
+    """One klines page decoded with decode_klines_page, retried with backoff on rate limiting (429/418) and server errors."""
+    for attempt in range(max_retries + 1):
+        limiter.acquire(KLINES_PAGE_WEIGHT)
+        response = session.get(f'{base_url}{KLINES_ENDPOINT}', params=params)
+
+        used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        if used_weight is not None:
+            limiter.report(int(used_weight))
+
+        if response.status_code == 200:
+            return decode_klines_page(response.content)
+
+        retryable = response.status_code in (418, 429) or response.status_code >= 500
+        if not retryable or attempt == max_retries:
+            raise Exception(f'API request failed with status code {response.status_code}: {response.text}')
+
+        retry_after = response.headers.get('Retry-After')
+        wait = float(retry_after) if retry_after is not None else backoff * 2 ** attempt
+        if response.status_code in (418, 429):
+            # every thread has to back off, not only the one that got rate limited
+            limiter.block_for(wait)
+        else:
+            limiter.sleep(wait)
+
+
+def download_klines(symbol: str, interval: str, start_date: int, end_date: int = None, base_url: str = BASE_URL,
+                    max_workers: int = 8, session: requests.Session = None, limiter: WeightLimiter = None) -> dict:
+    """
+    Downloads the klines of [start_date, end_date] (ms) as page-aligned chunks fetched concurrently.
+
+    Returns:
+        dict: one typed array per kline column, sorted by open_time, with overlapping candles de-duplicated.
+    """
+    if end_date is None:
+        end_date = int(time.time() * 1000)
+    # a session created here is closed here, a caller's session stays open for its next call
+    owns_session = session is None
+    session = create_session(max_workers) if owns_session else session
+    limiter = WeightLimiter() if limiter is None else limiter
+    ranges = page_ranges(interval, start_date, end_date)
+
+    def fetch(page_range):
+        page_start, page_end = page_range
+        params = {'symbol': symbol, 'interval': interval, 'limit': PAGE_LIMIT, 'startTime': page_start, 'endTime': page_end}
+        return fetch_page(session, limiter, base_url, params)
+
+    candles_data = KlineColumnsBuilder(len(ranges) * PAGE_LIMIT)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page in executor.map(fetch, ranges):
+                candles_data.append_page(page)
+    finally:
+        if owns_session:
+            session.close()
+
+    columns = candles_data.to_columns()
+    _, first_of_each = np.unique(columns['open_time'], return_index=True)
+    return {column: values[first_of_each] for column, values in columns.items()}
+
+
+def get_binance_historical_data_concurrent(symbol: str, interval: str, start_date: int, end_date: int = None,
+                                           base_url: str = BASE_URL, max_workers: int = 8) -> pd.DataFrame:
+    """Same DataFrame as binanceData.get_binance_historical_data, downloaded with download_klines."""
+    return columns_to_dataframe(download_klines(symbol, interval, start_date, end_date, base_url=base_url, max_workers=max_workers))
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from binanceData import KLINE_COLUMNS, columns_to_dataframe
+
+COVERAGE_FILE = 'coverage.json'
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merges overlapping or touching [start, end] ms ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(covered: List[Tuple[int, int]], start: int, end: int) -> List[Tuple[int, int]]:
+    """The parts of [start, end] that no covered range contains, leading, interior and trailing."""
+    missing = []
+    cursor = start
+    for covered_start, covered_end in merge_ranges(covered):
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start - 1))
+        cursor = max(cursor, covered_end + 1)
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+class CandleCache:
+    """
+    On-disk candle cache keyed by (symbol, interval).
+
+    Every kline column is stored as its own .npy file (open_time and close_time as int64 epoch ms), so a cached
+    range is memory-mapped back without parsing. coverage.json records which open_time ranges were already
+    downloaded and which version directory holds their columns, and a request only fetches the leading,
+    interior or trailing gaps it does not cover.
+    """
+    def __init__(self, root: str, fetch: Callable[[str, str, int, int], dict] = None, clock: Callable[[], float] = time.time):
+        self.root = root
+        if fetch is None:
+            from binance_downloader import download_klines
+            fetch = download_klines
+        self.fetch = fetch
+        self.clock = clock
+
+    def _directory(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol, interval)
+
+    def _manifest(self, symbol: str, interval: str) -> Tuple[str, List[Tuple[int, int]]]:
+        # the column directory of the current version and its coverage, None before the first save
+        path = os.path.join(self._directory(symbol, interval), COVERAGE_FILE)
+        if not os.path.exists(path):
+            return None, []
+        with open(path) as f:
+            manifest = json.load(f)
+        if isinstance(manifest, list):
+            # caches written before versioning keep their columns next to coverage.json
+            return self._directory(symbol, interval), [tuple(r) for r in manifest]
+        return os.path.join(self._directory(symbol, interval), manifest['version']), [tuple(r) for r in manifest['ranges']]
+
+    def coverage(self, symbol: str, interval: str) -> List[Tuple[int, int]]:
+        return self._manifest(symbol, interval)[1]
+
+    def _load_columns(self, symbol: str, interval: str) -> Dict[str, np.ndarray]:
+        for _ in range(3):
+            version_dir = self._manifest(symbol, interval)[0]
+            if version_dir is None:
+                return None
+            try:
+                return {column: np.load(os.path.join(version_dir, f'{column}.npy'), mmap_mode='r') for column in KLINE_COLUMNS}
+            except FileNotFoundError:
+                # a writer replaced the version between reading coverage.json and opening the columns
+                continue
+        raise RuntimeError(f'{symbol} {interval} cache kept changing while it was read')
+
+    def _save(self, symbol: str, interval: str, columns: Dict[str, np.ndarray], coverage: List[Tuple[int, int]]) -> None:
+        directory = self._directory(symbol, interval)
+        os.makedirs(directory, exist_ok=True)
+        old_version_dir, _ = self._manifest(symbol, interval)
+
+        # every save writes a complete new version directory, and coverage.json pointing at it is swapped in
+        # last, so a reader sees either all the old columns and coverage or all the new ones
+        version_dir = tempfile.mkdtemp(prefix='v', dir=directory)
+        for column in KLINE_COLUMNS:
+            np.save(os.path.join(version_dir, f'{column}.npy'), columns[column])
+        tmp_path = os.path.join(version_dir, COVERAGE_FILE)
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': os.path.basename(version_dir), 'ranges': coverage}, f)
+        os.replace(tmp_path, os.path.join(directory, COVERAGE_FILE))
+
+        if old_version_dir == directory:
+            for column in KLINE_COLUMNS:
+                try:
+                    os.remove(os.path.join(directory, f'{column}.npy'))
+                except OSError:
+                    pass
+        elif old_version_dir is not None:
+            # readers that still map the old files keep them until they let go, where the OS allows that
+            shutil.rmtree(old_version_dir, ignore_errors=True)
+
+    def update(self, symbol: str, interval: str, start_date: int, end_date: int = None) -> None:
+        """Downloads whatever part of [start_date, end_date] (ms) is not cached yet."""
+        now = int(self.clock() * 1000)
+        end_date = now if end_date is None else end_date
+        coverage = self.coverage(symbol, interval)
+        gaps = missing_ranges(coverage, start_date, end_date)
+        if not gaps:
+            return
+
+        parts = []
+        cached = self._load_columns(symbol, interval)
+        if cached is not None:
+            # copied out of the memory maps, which are closed before _save removes their files
+            parts.append({column: np.array(values) for column, values in cached.items()})
+            del cached
+
+        for gap_start, gap_end in gaps:
+            fetched = self.fetch(symbol, interval, gap_start, gap_end)
+            # a candle that is still open can change, it is neither stored nor counted as covered
+            still_open = fetched['close_time'] >= now
+            if still_open.any():
+                gap_end = min(gap_end, int(fetched['open_time'][still_open].min()) - 1)
+                fetched = {column: values[~still_open] for column, values in fetched.items()}
+            parts.append(fetched)
+            if gap_end >= gap_start:
+                coverage.append((gap_start, gap_end))
+
+        open_times = np.concatenate([part['open_time'] for part in parts])
+        _, first_of_each = np.unique(open_times, return_index=True)
+        columns = {column: np.concatenate([part[column] for part in parts])[first_of_each] for column in KLINE_COLUMNS}
+        self._save(symbol, interval, columns, merge_ranges(coverage))
+
+    def view(self, symbol: str, interval: str, start_date: int, end_date: int) -> Dict[str, np.ndarray]:
+        """
+        Zero-copy read-only view of the cached candles with start_date <= open_time <= end_date.
+
+        Returns:
+            Dict[str, np.ndarray]: one memory-mapped array per kline column.
+        """
+        columns = self._load_columns(symbol, interval)
+        if columns is None:
+            return {column: np.empty(0) for column in KLINE_COLUMNS}
+        first = np.searchsorted(columns['open_time'], start_date, side='left')
+        last = np.searchsorted(columns['open_time'], end_date, side='right')
+        return {column: values[first:last] for column, values in columns.items()}
+
+    def get(self, symbol: str, interval: str, start_date: int, end_date: int = None) -> pd.DataFrame:
+        """Same DataFrame as get_binance_historical_data, downloading only the missing gaps."""
+        end_date = int(self.clock() * 1000) if end_date is None else end_date
+        self.update(symbol, interval, start_date, end_date)
+        # the DataFrame gets its own writable copy, view() is the zero-copy way in
+        columns = {column: np.array(values) for column, values in self.view(symbol, interval, start_date, end_date).items()}
+        return columns_to_dataframe(columns)
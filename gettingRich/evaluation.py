@@ -1,60 +1,128 @@
 import pandas as pd
 import numpy as np
 
+METRIC_NAMES = ['total_return', 'annualized_return', 'annualized_sharpe', 'sortino_ratio', 'max_drawdown', 'calmar_ratio']
+METRICS_DTYPE = np.dtype([(name, np.float64) for name in METRIC_NAMES])
+
+YEARLY_TRADING_DAYS = 252
+
+# every wrapper computes only what its own metric needs, use calc_metrics for several metrics at once
 def calc_total_return(portfolio_values):
-    return (portfolio_values.iloc[-1] / portfolio_values.iloc[0]) - 1.0
+    curves = _as_curves(portfolio_values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return curves[0, -1] / curves[0, 0] - 1.0
 
 def calc_annualized_return(portfolio_values):
-    yearly_trading_days = 252
-    portfolio_trading_days = portfolio_values.shape[0]
-    portfolio_trading_years = portfolio_trading_days / yearly_trading_days 
-    return (portfolio_values.iloc[-1] / portfolio_values.iloc[0])**(1/portfolio_trading_years) - 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _annualized_return(_as_curves(portfolio_values))[0]
 
 def calc_annualized_sharpe(portfolio_values: pd.Series, rf: float=0.0):
-    yearly_trading_days = 252
-    annualized_return = calc_annualized_return(portfolio_values)
-    annualized_std = portfolio_values.pct_change().std() * np.sqrt(yearly_trading_days)
-    if annualized_std is None or annualized_std == 0:
-        return 0
-    sharpe = (annualized_return - rf) / annualized_std
-    return sharpe
+    curves = _as_curves(portfolio_values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _ratio(_annualized_return(curves) - rf, _annualized_std(_calc_returns(curves)))[0]
 
 def calc_downside_deviation(portfolio_values):
-    porfolio_returns = portfolio_values.pct_change().dropna()
-    return porfolio_returns[porfolio_returns < 0].std()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _downside_deviation(_calc_returns(_as_curves(portfolio_values)))[0]
 
 def calc_sortino(portfolio_values, rf=0.0):
-    yearly_trading_days = 252
-    down_deviation = calc_downside_deviation(portfolio_values) * np.sqrt(yearly_trading_days)
-    annualized_return = calc_annualized_return(portfolio_values)
-    if down_deviation is None or down_deviation == 0:
-        return 0
-    sortino = (annualized_return - rf) / down_deviation
-    return sortino
+    curves = _as_curves(portfolio_values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        down_deviation = _downside_deviation(_calc_returns(curves)) * np.sqrt(YEARLY_TRADING_DAYS)
+        return _ratio(_annualized_return(curves) - rf, down_deviation)[0]
 
 def calc_max_drawdown(portfolio_values):
-    cumulative_max = portfolio_values.cummax()
-    drawdown = (cumulative_max - portfolio_values) / cumulative_max
-    return drawdown.max()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _max_drawdown(_as_curves(portfolio_values))[0]
 
 def calc_calmar(portfolio_values):
-    max_drawdown = calc_max_drawdown(portfolio_values)
-    annualized_return = calc_annualized_return(portfolio_values)
-    return annualized_return / max_drawdown
-   
+    curves = _as_curves(portfolio_values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (_annualized_return(curves) / _max_drawdown(curves))[0]
+
+
+def calc_metrics(portfolio_values: np.ndarray, rf: float=0.0) -> np.ndarray:
+    """
+    Computes all strategy metrics for many portfolio value curves at once.
+
+    Returns, the running maximum and the annualized return are computed once per curve and shared
+    by every metric that needs them.
+
+    Parameters:
+    - portfolio_values (np.ndarray): (curves x bars) matrix, one portfolio value curve per row. A single curve may be 1-D.
+    - rf (float): Annualized risk free rate for the Sharpe and Sortino ratios.
+
+    Returns:
+        np.ndarray: Structured array of METRICS_DTYPE with one record per curve.
+    """
+    portfolio_values = _as_curves(portfolio_values)
+    metrics = np.empty(portfolio_values.shape[0], dtype=METRICS_DTYPE)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annualized_return = _annualized_return(portfolio_values)
+        metrics['total_return'] = portfolio_values[:, -1] / portfolio_values[:, 0] - 1.0
+        metrics['annualized_return'] = annualized_return
+
+        returns = _calc_returns(portfolio_values)
+        metrics['annualized_sharpe'] = _ratio(annualized_return - rf, _annualized_std(returns))
+        down_deviation = _downside_deviation(returns) * np.sqrt(YEARLY_TRADING_DAYS)
+        metrics['sortino_ratio'] = _ratio(annualized_return - rf, down_deviation)
+
+        max_drawdown = _max_drawdown(portfolio_values)
+        metrics['max_drawdown'] = max_drawdown
+        metrics['calmar_ratio'] = annualized_return / max_drawdown
+
+    return metrics
+
+def calc_metrics_table(portfolio_values: np.ndarray, rf: float=0.0) -> pd.DataFrame:
+    """
+    Same as calc_metrics, as a DataFrame with one row per curve and one column per metric.
+    """
+    return pd.DataFrame(calc_metrics(portfolio_values, rf))
+
+def _as_curves(portfolio_values) -> np.ndarray:
+    return np.atleast_2d(np.asarray(portfolio_values, dtype=np.float64))
+
+def _calc_returns(portfolio_values: np.ndarray) -> np.ndarray:
+    # same as pct_change without the leading NaN
+    return portfolio_values[:, 1:] / portfolio_values[:, :-1] - 1.0
+
+def _calc_single(portfolio_values, rf: float=0.0):
+    return calc_metrics(portfolio_values, rf)[0]
+
+def _annualized_return(portfolio_values: np.ndarray) -> np.ndarray:
+    portfolio_trading_years = portfolio_values.shape[1] / YEARLY_TRADING_DAYS
+    return (portfolio_values[:, -1] / portfolio_values[:, 0])**(1 / portfolio_trading_years) - 1.0
+
+def _annualized_std(returns: np.ndarray) -> np.ndarray:
+    return _nanstd(returns) * np.sqrt(YEARLY_TRADING_DAYS)
+
+def _downside_deviation(returns: np.ndarray) -> np.ndarray:
+    return _nanstd(np.where(returns < 0, returns, np.nan))
+
+def _max_drawdown(portfolio_values: np.ndarray) -> np.ndarray:
+    cumulative_max = np.maximum.accumulate(portfolio_values, axis=1)
+    return ((cumulative_max - portfolio_values) / cumulative_max).max(axis=1)
+
+def _ratio(excess_return: np.ndarray, deviation: np.ndarray) -> np.ndarray:
+    # Sharpe and Sortino are 0 for curves without any deviation
+    return np.where(deviation == 0, 0.0, excess_return / deviation)
+
+def _nanstd(values: np.ndarray) -> np.ndarray:
+    # row-wise sample std skipping NaNs, like pd.Series.std
+    count = np.sum(~np.isnan(values), axis=1)
+    mean = np.nansum(values, axis=1) / count
+    squared_deviations = np.nansum((values - mean[:, None])**2, axis=1)
+    return np.where(count > 1, np.sqrt(squared_deviations / (count - 1)), np.nan)
 
 def evaluate_strategy(b_df, strat_name):
-    total_return = calc_total_return(b_df['portfolio_value'])
-    annualized_return = calc_annualized_return(b_df['portfolio_value'])
-    annualized_sharpe = calc_annualized_sharpe(b_df['portfolio_value'])
-    sortino_ratio = calc_sortino(b_df['portfolio_value'])
-    max_drawdown = calc_max_drawdown(b_df['portfolio_value'])
-    calmar_ratio = calc_calmar(b_df['portfolio_value'])
-    
+    metrics = _calc_single(b_df['portfolio_value'])
+
     print(f"Results for {strat_name}:")
-    print(f"Total Return: {total_return:.2%}")
-    print(f"Annualized Return: {annualized_return:.2%}")
-    print(f"Annualized Sharpe Ratio: {annualized_sharpe:.2f}")
-    print(f"Sortino Ratio: {sortino_ratio:.2f}")
-    print(f"Max Drawdown: {max_drawdown:.2%}")
-    print(f"Calmar Ratio: {calmar_ratio:.2f}")
\ No newline at end of file
+    print(f"Total Return: {metrics['total_return']:.2%}")
+    print(f"Annualized Return: {metrics['annualized_return']:.2%}")
+    print(f"Annualized Sharpe Ratio: {metrics['annualized_sharpe']:.2f}")
+    print(f"Sortino Ratio: {metrics['sortino_ratio']:.2f}")
+    print(f"Max Drawdown: {metrics['max_drawdown']:.2%}")
+    print(f"Calmar Ratio: {metrics['calmar_ratio']:.2f}")
+    return metrics
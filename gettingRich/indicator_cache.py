@@ -0,0 +1,165 @@
+import hashlib
+import os
+from collections import Counter, OrderedDict
+from typing import Callable, Hashable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import normalize_smooth, true_range, utbot_trailing_stop
+
+
+def fingerprint(*arrays: np.ndarray) -> str:
+    """
+    Content hash of one or more arrays, equal arrays give the same fingerprint wherever they live in memory.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for values in arrays:
+        values = np.ascontiguousarray(values)
+        digest.update(f'{values.dtype.str}{values.shape}'.encode())
+        digest.update(values.view(np.uint8).ravel())
+    return digest.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Indicator results keyed by (fingerprint of the inputs, indicator name, parameters).
+
+    Results are kept in memory in least recently used order while their total size fits in max_bytes.
+    With a cache_dir every result is also written there as a .npy file, results evicted from memory are
+    read back from disk, and processes pointing at the same directory share their results. Cached arrays
+    are read-only, since every caller asking for the same key gets the same array.
+
+    A pickled cache carries its settings but not its in-memory results, so worker processes of a sweep
+    start with an empty memory tier and share through the disk tier.
+    """
+    def __init__(self, max_bytes: int = 256 * 2**20, cache_dir: str = None) -> None:
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        # computations per indicator name
+        self.computed = Counter()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_entries'] = OrderedDict()
+        state['nbytes'] = 0
+        return state
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self.cache_dir, hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest() + '.npy')
+
+    def _remember(self, key: tuple, values: np.ndarray) -> None:
+        if values.nbytes > self.max_bytes:
+            return
+        self._entries[key] = values
+        self.nbytes += values.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, key: tuple) -> np.ndarray:
+        """
+        The cached result of key from memory or disk, None if it was never stored.
+        """
+        values = self._entries.get(key)
+        if values is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values
+
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            values = np.load(self._path(key))
+            values.flags.writeable = False
+            self._remember(key, values)
+            self.disk_hits += 1
+            return values
+        return None
+
+    def put(self, key: tuple, values: np.ndarray) -> np.ndarray:
+        values = np.array(values, copy=True)
+        values.flags.writeable = False
+        if self.cache_dir is not None:
+            # write then rename, so a reading process never sees half a file
+            path = self._path(key)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, values)
+            os.replace(tmp_path, path)
+        self._remember(key, values)
+        return values
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        The cached result of key, computing and storing it first if needed. key[1] names the indicator.
+        """
+        values = self.get(key)
+        if values is None:
+            self.computed[key[1]] += 1
+            values = self.put(key, compute())
+        return values
+
+    def clear(self) -> None:
+        # only the memory tier, files in cache_dir stay
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class CachedIndicators:
+    """
+    The indicators of indicators.py and binanceData.py for one set of candles, memoized in an IndicatorCache.
+
+    The candles are fingerprinted once. Related indicators share their intermediates through the cache:
+    every ATR length starts from the same true range, UTBot stops of the same ATR length share the ATR,
+    MACD differences share their EMAs and STCs share the MACD difference and the first normalize and
+    smooth pass, so a parameter grid computes each distinct series once.
+    """
+    def __init__(self, close: np.ndarray, high: np.ndarray = None, low: np.ndarray = None, cache: IndicatorCache = None) -> None:
+        self.close = np.asarray(close, dtype=np.float64)
+        self.high = None if high is None else np.asarray(high, dtype=np.float64)
+        self.low = None if low is None else np.asarray(low, dtype=np.float64)
+        self.cache = IndicatorCache() if cache is None else cache
+        self.close_key = fingerprint(self.close)
+        self.candles_key = None if high is None or low is None else fingerprint(self.close, self.high, self.low)
+
+    def _get(self, input_key: str, name: str, params: Tuple[Hashable, ...], compute: Callable[[], np.ndarray]) -> np.ndarray:
+        if input_key is None:
+            raise ValueError(f'{name} needs high and low prices')
+        return self.cache.get_or_compute((input_key, name, params), compute)
+
+    def true_range(self) -> np.ndarray:
+        return self._get(self.candles_key, 'true_range', (), lambda: true_range(self.close, self.high, self.low))
+
+    def atr(self, atr_length: int) -> np.ndarray:
+        return self._get(self.candles_key, 'atr', (int(atr_length),),
+                         lambda: pd.Series(self.true_range()).rolling(window=atr_length).mean().to_numpy())
+
+    def utbot_trailing_stop(self, key_value: float, atr_length: int, pine_downtrend: bool = False) -> np.ndarray:
+        return self._get(self.candles_key, 'utbot_trailing_stop', (float(key_value), int(atr_length), bool(pine_downtrend)),
+                         lambda: utbot_trailing_stop(self.close, key_value * self.atr(atr_length), pine_downtrend=pine_downtrend))
+
+    def ema(self, span: int) -> np.ndarray:
+        # the adjusted EMA of STCosi
+        return self._get(self.close_key, 'ema', (int(span),), lambda: pd.Series(self.close).ewm(span=span).mean().to_numpy())
+
+    def macd_diff(self, fast_length: int, slow_length: int) -> np.ndarray:
+        return self._get(self.close_key, 'macd_diff', (int(fast_length), int(slow_length)),
+                         lambda: self.ema(fast_length) - self.ema(slow_length))
+
+    def stc(self, fast_length: int, slow_length: int, stc_length: int, smoothing_factor: float = 0.5) -> np.ndarray:
+        def first_pass():
+            return normalize_smooth(self.macd_diff(fast_length, slow_length), stc_length, smoothing_factor)
+
+        params = (int(fast_length), int(slow_length), int(stc_length), float(smoothing_factor))
+        smoothed_macd = self._get(self.close_key, 'stc_first_pass', params, first_pass)
+        return self._get(self.close_key, 'stc', params, lambda: normalize_smooth(smoothed_macd, stc_length, smoothing_factor))
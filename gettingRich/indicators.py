@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+from typing import Sequence
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # numba is optional, without it the kernels run as plain python loops
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+def true_range(close: np.ndarray, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """Array version of binanceData.TR, the first bar has no previous close and is NaN."""
+    prev_close = np.empty_like(close, dtype=np.float64)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    return np.where(high > prev_close, high, prev_close) - np.where(low < prev_close, low, prev_close)
+
+
+def average_true_range(close: np.ndarray, high: np.ndarray, low: np.ndarray, atr_length: int) -> np.ndarray:
+    """Array version of binanceData.ATR(TR(close, high, low), atr_length)."""
+    return pd.Series(true_range(close, high, low)).rolling(window=atr_length).mean().to_numpy()
+
+
+@njit(cache=True)
+def _utbot_loop(close, loss_threshold, trailing_stop, pine_downtrend):
+    for i in range(1, len(close)):
+        prev_stop = trailing_stop[i - 1]
+        curr_close = close[i]
+
+        # upward trend, the stop only moves up
+        if curr_close > prev_stop and close[i - 1] > prev_stop:
+            new_stop = curr_close - loss_threshold[i]
+            trailing_stop[i] = new_stop if new_stop > prev_stop else prev_stop
+
+        # downward trend, the stop only moves down
+        elif curr_close < prev_stop and close[i - 1] < prev_stop:
+            new_stop = curr_close + loss_threshold[i] if pine_downtrend else curr_close - loss_threshold[i]
+            trailing_stop[i] = new_stop if new_stop < prev_stop else prev_stop
+
+        elif curr_close > prev_stop:
+            trailing_stop[i] = curr_close - loss_threshold[i]
+
+        else:
+            trailing_stop[i] = curr_close + loss_threshold[i]
+    return trailing_stop
+
+
+@njit(cache=True)
+def _utbot_batch_loop(close, loss_thresholds, trailing_stops, pine_downtrend):
+    for k in range(loss_thresholds.shape[0]):
+        _utbot_loop(close, loss_thresholds[k], trailing_stops[k], pine_downtrend)
+    return trailing_stops
+
+
+def utbot_trailing_stop(close: np.ndarray, loss_threshold: np.ndarray, initial_stop: float=np.nan,
+                        pine_downtrend: bool=False) -> np.ndarray:
+    """
+    The UTBot trailing-stop recursion of calc_UTBot over raw float arrays.
+
+    Parameters:
+    - close (np.ndarray): close prices.
+    - loss_threshold (np.ndarray): key_value * ATR for every bar.
+    - initial_stop (float): trailing stop of the first bar, NaN in calc_UTBot.
+    - pine_downtrend (bool): use close + loss_threshold while trending down, like the Pine script and the buy
+      leg of the notebook UTBot, instead of close - loss_threshold like calc_UTBot.
+
+    Returns:
+        np.ndarray: the trailing stop of every bar.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    loss_threshold = np.ascontiguousarray(loss_threshold, dtype=np.float64)
+    trailing_stop = np.empty_like(close)
+    if close.shape[0] == 0:
+        return trailing_stop
+    trailing_stop[0] = initial_stop
+
+    if NUMBA_AVAILABLE:
+        return _utbot_loop(close, loss_threshold, trailing_stop, pine_downtrend)
+
+    # plain python floats are much cheaper to index one by one than numpy scalars
+    stops = trailing_stop.tolist()
+    _utbot_loop(close.tolist(), loss_threshold.tolist(), stops, pine_downtrend)
+    return np.array(stops, dtype=np.float64)
+
+
+def utbot_trailing_stops(close: np.ndarray, high: np.ndarray, low: np.ndarray, key_values: Sequence[float],
+                         atr_lengths: Sequence[int], initial_stop: float=np.nan, pine_downtrend: bool=False) -> np.ndarray:
+    """
+    Trailing stops for many (key_value, atr_length) pairs at once.
+
+    The ATR is computed once per distinct atr_length, and the recursion runs for all pairs together.
+
+    Returns:
+        np.ndarray: (pairs x bars) matrix, row k is utbot_trailing_stop for key_values[k] and atr_lengths[k].
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    key_values = np.asarray(key_values, dtype=np.float64)
+    atr_lengths = np.asarray(atr_lengths, dtype=np.int64)
+    if key_values.shape != atr_lengths.shape:
+        raise ValueError('key_values and atr_lengths must have the same length')
+
+    distinct_lengths, length_index = np.unique(atr_lengths, return_inverse=True)
+    atrs = np.stack([average_true_range(close, high, low, int(length)) for length in distinct_lengths]) \
+        if distinct_lengths.size else np.empty((0, close.shape[0]))
+    loss_thresholds = np.ascontiguousarray(key_values[:, None] * atrs[length_index])
+
+    trailing_stops = np.empty_like(loss_thresholds)
+    if close.shape[0] == 0:
+        return trailing_stops
+    trailing_stops[:, 0] = initial_stop
+
+    if NUMBA_AVAILABLE:
+        return _utbot_batch_loop(close, loss_thresholds, trailing_stops, pine_downtrend)
+
+    # without numba step all pairs together, one bar at a time
+    for i in range(1, close.shape[0]):
+        prev_stop = trailing_stops[:, i - 1]
+        curr_close = close[i]
+        loss_threshold = loss_thresholds[:, i]
+        up = (curr_close > prev_stop) & (close[i - 1] > prev_stop)
+        down = (curr_close < prev_stop) & (close[i - 1] < prev_stop)
+        above = curr_close > prev_stop
+
+        long_stop = curr_close - loss_threshold
+        short_stop = curr_close + loss_threshold
+        down_stop = short_stop if pine_downtrend else long_stop
+        trailing_stops[:, i] = np.where(up, np.where(long_stop > prev_stop, long_stop, prev_stop),
+                                        np.where(down, np.where(down_stop < prev_stop, down_stop, prev_stop),
+                                                 np.where(above, long_stop, short_stop)))
+    return trailing_stops
+
+
+def smooth_series(values: np.ndarray, smoothing_factor: float) -> np.ndarray:
+    """
+    Array version of binanceData.SmoothSrs.
+
+    Every run of non-NaN values is exponentially smoothed in a single ewm pass starting from its first value,
+    NaN values stay NaN, exactly like the SmoothSrs recursion restarts after a NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    smoothed = np.full(values.shape[0], np.nan)
+    valid = ~np.isnan(values)
+    run_starts = np.flatnonzero(valid & ~np.r_[False, valid[:-1]])
+    run_ends = np.flatnonzero(valid & ~np.r_[valid[1:], False]) + 1
+    for start, end in zip(run_starts, run_ends):
+        smoothed[start:end] = pd.Series(values[start:end]).ewm(alpha=smoothing_factor, adjust=False).mean().to_numpy()
+    return smoothed
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    O(n) rolling max for any window (van Herk/Gil-Werman), same output as pd.Series.rolling(window).max().
+
+    The values are cut into blocks of window length, and the max of every window is the max of a suffix
+    of one block and a prefix of the next, both computed with a single accumulate pass.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[0]
+    result = np.full(n, np.nan)
+    if window < 1 or window > n:
+        return result
+
+    is_nan = np.isnan(values)
+    padded = np.full(n + (-n) % window, -np.inf)
+    padded[:n] = np.where(is_nan, -np.inf, values)
+    blocks = padded.reshape(-1, window)
+    prefix_max = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix_max = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    result[window - 1:] = np.maximum(suffix_max[:n - window + 1], prefix_max[window - 1:n])
+
+    # like pandas, a window holding any NaN has no value
+    nan_count = np.cumsum(is_nan)
+    window_nans = nan_count[window - 1:] - np.r_[0, nan_count[:n - window]]
+    result[window - 1:][window_nans > 0] = np.nan
+    return result
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """O(n) rolling min, same output as pd.Series.rolling(window).min()."""
+    return -rolling_max(-np.asarray(values, dtype=np.float64), window)
+
+
+def normalize_smooth(values: np.ndarray, stc_length: int, smoothing_factor: float) -> np.ndarray:
+    """Array version of binanceData.normNsmooth."""
+    values = np.asarray(values, dtype=np.float64)
+    lowest = rolling_min(values, stc_length)
+    highest_range = rolling_max(values, stc_length) - lowest
+
+    # bars without a full window keep their raw value, a flat window has no value and is forward filled
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = np.where(highest_range > 0, (values - lowest) / highest_range * 100,
+                              np.where(highest_range <= 0, np.nan, values))
+    last_valid = np.maximum.accumulate(np.where(np.isnan(normalized), 0, np.arange(normalized.shape[0])))
+    normalized = normalized[last_valid] if normalized.shape[0] else normalized
+
+    return smooth_series(normalized, smoothing_factor)
+
+
+def macd_diff(close: np.ndarray, fast_length: int, slow_length: int) -> np.ndarray:
+    """The fast minus slow EMA difference STCosi starts from."""
+    close = pd.Series(np.asarray(close, dtype=np.float64))
+    return (close.ewm(span=fast_length).mean() - close.ewm(span=slow_length).mean()).to_numpy()
+
+
+def stc_from_macd(macd: np.ndarray, stc_length: int, smoothing_factor: float=0.5) -> np.ndarray:
+    """The two normalize and smooth passes of STCosi over an already computed MACD difference."""
+    return normalize_smooth(normalize_smooth(macd, stc_length, smoothing_factor), stc_length, smoothing_factor)
+
+
+def stc(close: np.ndarray, fast_length: int, slow_length: int, stc_length: int, smoothing_factor: float=0.5) -> np.ndarray:
+    """Array version of binanceData.STCosi."""
+    return stc_from_macd(macd_diff(close, fast_length, slow_length), stc_length, smoothing_factor)
+
+
+def stc_grid(close: np.ndarray, fast_lengths: Sequence[int], slow_lengths: Sequence[int], stc_lengths: Sequence[int],
+             smoothing_factors: Sequence[float]=(0.5,)) -> dict:
+    """
+    STC for every combination of the given lengths and smoothing factors.
+
+    Each EMA is computed once per span and each MACD difference once per (fast_length, slow_length) pair,
+    so combinations that only differ in stc_length or smoothing_factor reuse them.
+
+    Returns:
+        dict: {(fast_length, slow_length, stc_length, smoothing_factor): np.ndarray}
+    """
+    close = pd.Series(np.asarray(close, dtype=np.float64))
+    emas = {span: close.ewm(span=span).mean().to_numpy() for span in set(fast_lengths) | set(slow_lengths)}
+
+    results = {}
+    for fast_length in fast_lengths:
+        for slow_length in slow_lengths:
+            macd = emas[fast_length] - emas[slow_length]
+            for stc_length in stc_lengths:
+                for smoothing_factor in smoothing_factors:
+                    results[(fast_length, slow_length, stc_length, smoothing_factor)] = stc_from_macd(macd, stc_length, smoothing_factor)
+    return results
@@ -12,12 +12,22 @@ class PositionType(Enum):
     SHORT = -1
 
 class Position():
-    def __init__(self, qty: float, price: float, type: PositionType):
+    __slots__ = ('qty', 'price', 'type', 'entry_bar', 'fees')
+
+    def __init__(self, qty: float, price: float, type: PositionType, entry_bar: int = -1, fees: float = 0.0):
         self.qty = qty
         self.price = price
         self.type = type
+        # bar the position was opened on and the entry commission not yet booked on a trade
+        self.entry_bar = entry_bar
+        self.fees = fees
 
 class ActionType(Enum):
     BUY = 1
     SELL = -1
-    
+
+class ExitReason(Enum):
+    SIGNAL = 0
+    STOP_LOSS = 1
+    TAKE_PROFIT = 2
+    END_OF_DATA = 3
@@ -0,0 +1,157 @@
+import warnings
+from contextlib import nullcontext
+from multiprocessing import Pool
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from evaluation import METRIC_NAMES, METRICS_DTYPE, calc_metrics
+from trade_ledger import TradeLedger
+
+RESAMPLING_METHODS = ('block_bootstrap', 'trade_reshuffle', 'trade_bootstrap')
+
+
+def trade_returns(ledger: TradeLedger) -> np.ndarray:
+    """
+    Return of every trade on the capital it tied up, after fees.
+    """
+    trades = ledger.trades
+    return ledger.pnl() / (trades['qty'] * trades['entry_price'])
+
+
+def block_bootstrap_indices(num_returns: int, num_paths: int, block_size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Circular moving block bootstrap: every path is built from blocks of block_size consecutive returns
+    starting at random bars, wrapping around the end, cut to num_returns.
+
+    Returns:
+        np.ndarray: (num_paths x num_returns) matrix of indices into the returns.
+    """
+    if block_size < 1:
+        raise ValueError(f'block_size must be positive, got {block_size}')
+    num_blocks = -(-num_returns // block_size)
+    starts = rng.integers(0, num_returns, size=(num_paths, num_blocks))
+    indices = (starts[:, :, None] + np.arange(block_size)) % num_returns
+    return indices.reshape(num_paths, -1)[:, :num_returns]
+
+
+def equity_paths(path_returns: np.ndarray, starting_value: float=1.0) -> np.ndarray:
+    """
+    Compounds every row of path_returns into a value curve starting at starting_value.
+
+    Returns:
+        np.ndarray: (paths x returns + 1) matrix of values.
+    """
+    paths = np.empty((path_returns.shape[0], path_returns.shape[1] + 1))
+    paths[:, 0] = starting_value
+    np.add(path_returns, 1.0, out=paths[:, 1:])
+    np.cumprod(paths, axis=1, out=paths)
+    return paths
+
+
+def resample_paths(returns: np.ndarray, method: str, num_paths: int, rng: np.random.Generator, block_size: int=20,
+                   starting_value: float=1.0) -> np.ndarray:
+    """
+    Simulated value curves of one resampling method, all in one matrix.
+
+    Methods:
+    - block_bootstrap: blocks of consecutive bar returns, keeping their short term autocorrelation.
+    - trade_reshuffle: the same trades in a random order. The final value stays the same, the drawdowns change.
+    - trade_bootstrap: trades drawn with replacement.
+
+    Parameters:
+    - returns (np.ndarray): bar returns for block_bootstrap, trade returns for the trade methods.
+    - block_size (int): returns per block of block_bootstrap.
+
+    Returns:
+        np.ndarray: (num_paths x len(returns) + 1) matrix of values.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if method == 'block_bootstrap':
+        path_returns = returns[block_bootstrap_indices(returns.shape[0], num_paths, block_size, rng)]
+    elif method == 'trade_reshuffle':
+        path_returns = rng.permuted(np.broadcast_to(returns, (num_paths, returns.shape[0])), axis=1)
+    elif method == 'trade_bootstrap':
+        path_returns = returns[rng.integers(0, returns.shape[0], size=(num_paths, returns.shape[0]))]
+    else:
+        raise ValueError(f'method must be one of {RESAMPLING_METHODS}, got {method}')
+    return equity_paths(path_returns, starting_value)
+
+
+def _simulate_batch(args: tuple) -> np.ndarray:
+    returns, method, num_paths, seed, block_size, rf = args
+    paths = resample_paths(returns, method, num_paths, np.random.default_rng(seed), block_size)
+    return calc_metrics(paths, rf)
+
+
+def monte_carlo(returns: Union[np.ndarray, pd.Series, TradeLedger], method: str='block_bootstrap', num_paths: int=10_000,
+                block_size: int=20, batch_size: int=1000, seed: int=None, workers: int=1, rf: float=0.0) -> np.ndarray:
+    """
+    Metric distributions of many resampled paths of a backtest.
+
+    The paths are generated and evaluated batch_size at a time, so memory stays at one batch of
+    (batch_size x bars) values however many paths are simulated. Every batch has its own seed spawned
+    from seed, so the result does not depend on the number of workers.
+
+    Parameters:
+    - returns: bar returns of a backtest (e.g. b_df['portfolio_value'].pct_change().dropna()) for block_bootstrap,
+      trade returns or a TradeLedger for the trade methods.
+    - method (str): one of RESAMPLING_METHODS, see resample_paths.
+    - batch_size (int): paths generated at once.
+    - workers (int): worker processes evaluating batches, 1 runs in this process.
+    - rf (float): annualized risk free rate for the Sharpe and Sortino ratios.
+
+    Returns:
+        np.ndarray: Structured array of METRICS_DTYPE with one record per path, see evaluation.calc_metrics.
+        The trade methods treat every trade as one bar when annualizing.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f'method must be one of {RESAMPLING_METHODS}, got {method}')
+    if batch_size < 1:
+        raise ValueError(f'batch_size must be positive, got {batch_size}')
+    if isinstance(returns, TradeLedger):
+        returns = trade_returns(returns)
+    returns = np.asarray(returns, dtype=np.float64)
+    if returns.shape[0] == 0:
+        raise ValueError('returns must not be empty')
+
+    batch_sizes = [min(batch_size, num_paths - start) for start in range(0, num_paths, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    batches = [(returns, method, size, batch_seed, block_size, rf) for size, batch_seed in zip(batch_sizes, seeds)]
+
+    metrics = np.empty(num_paths, dtype=METRICS_DTYPE)
+    start = 0
+    with (nullcontext() if workers == 1 else Pool(workers)) as pool:
+        results = map(_simulate_batch, batches) if pool is None else pool.imap(_simulate_batch, batches)
+        for batch_metrics in results:
+            metrics[start:start + batch_metrics.shape[0]] = batch_metrics
+            start += batch_metrics.shape[0]
+    return metrics
+
+
+def metric_intervals(metrics: np.ndarray, confidence: float=0.95) -> pd.DataFrame:
+    """
+    Summary of monte_carlo metric distributions, paths with a NaN metric are skipped.
+
+    Returns:
+        pd.DataFrame: one row per metric with mean, std, the lower and upper percentiles of the central
+        confidence interval and the median.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f'confidence must be between 0 and 1, got {confidence}')
+    values = np.stack([metrics[name] for name in METRIC_NAMES])
+    # infinite ratios (a flat path has no drawdown) are kept out of the moments
+    finite = np.where(np.isfinite(values), values, np.nan)
+    tail = (1 - confidence) / 2 * 100
+    with warnings.catch_warnings():
+        # a metric with no finite value on any path is NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, median, upper = np.nanpercentile(finite, [tail, 50, 100 - tail], axis=1)
+        return pd.DataFrame({
+            'mean': np.nanmean(finite, axis=1),
+            'std': np.nanstd(finite, axis=1, ddof=1),
+            'lower': lower,
+            'median': median,
+            'upper': upper,
+        }, index=pd.Index(METRIC_NAMES, name='metric'))
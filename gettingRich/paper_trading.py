@@ -0,0 +1,353 @@
+import json
+import math
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+from backtesting import BacktestState, run_position_state_machine, calc_realistic_prices
+from binanceData import KLINE_COLUMNS, decode_klines_page
+from candle_cache import CandleCache
+from strategies import BaseStrategy
+from trade_ledger import TradeLedger
+
+KLINES_ENDPOINT = '/fapi/v1/klines'
+TIME_ENDPOINT = '/fapi/v1/time'
+# default and largest limit of /fapi/v1/klines
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1500
+OPEN_TIME, CLOSE_TIME = KLINE_COLUMNS.index('open_time'), KLINE_COLUMNS.index('close_time')
+
+
+class LatencyHistogram:
+    """
+    Latencies in log spaced buckets, buckets_per_decade per factor of 10 between min_seconds and max_seconds,
+    plus one bucket below and one above. Recording is O(log buckets) and memory does not grow with the run.
+    Percentiles are the upper edge of the bucket they fall in, accurate to one bucket width.
+    """
+    def __init__(self, min_seconds: float = 1e-6, max_seconds: float = 100.0, buckets_per_decade: int = 20) -> None:
+        decades = math.log10(max_seconds / min_seconds)
+        self.edges = np.logspace(math.log10(min_seconds), math.log10(max_seconds), int(round(decades * buckets_per_decade)) + 1).tolist()
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect_right(self.edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return self.max if bucket >= len(self.edges) else min(self.edges[bucket], self.max)
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'mean': self.total / self.count if self.count else math.nan,
+                'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99), 'max': self.max}
+
+    def to_frame(self) -> pd.DataFrame:
+        """The non empty buckets with their lower and upper edges in seconds."""
+        lower = [0.0] + self.edges
+        upper = self.edges + [math.inf]
+        rows = [(lower[i], upper[i], count) for i, count in enumerate(self.counts) if count]
+        return pd.DataFrame(rows, columns=['lower', 'upper', 'count'])
+
+
+class MarketClock:
+    """
+    The exchange's clock. Live candles close on the wall clock, KlineReplayServer has the same two methods
+    for its accelerated clock.
+    """
+    def now_ms(self) -> int:
+        return int(time.time() * 1000)
+
+    def wall_time(self, market_ms: int) -> float:
+        return market_ms / 1000
+
+
+def poll_klines(base_url: str, symbol: str, interval: str, start_time: int, end_time: int = None, clock: MarketClock = None,
+                poll_interval: float = 1.0, session: requests.Session = None, sleep=time.sleep) -> Iterator[Tuple[np.ndarray, float]]:
+    """
+    Closed klines of one symbol from a /fapi/v1/klines endpoint, polled until the candle end_time falls in closed,
+    or until the endpoint has no candles left before end_time.
+
+    The endpoint also returns the candle that is still forming, it is held back until its close_time has passed
+    on the clock. A full page is followed by the next one at once, otherwise the next poll waits poll_interval.
+
+    Parameters:
+    - start_time, end_time (int): times in ms of the first and last candle, end_time None for no end.
+    - clock (MarketClock): the clock of the feed, the replay server itself for a replay.
+
+    Returns:
+        Iterator[Tuple[np.ndarray, float]]: every closed kline as a row of the 12 kline fields, and the wall
+        clock time in seconds at which it closed.
+    """
+    clock = MarketClock() if clock is None else clock
+    # a session created here is closed when the feed ends or is abandoned, a caller's session stays open
+    owns_session = session is None
+    session = requests.Session() if owns_session else session
+    params = {'symbol': symbol, 'interval': interval, 'startTime': start_time, 'limit': MAX_LIMIT}
+    if end_time is not None:
+        params['endTime'] = end_time
+
+    try:
+        while True:
+            response = session.get(f'{base_url}{KLINES_ENDPOINT}', params=params)
+            if response.status_code != 200:
+                raise Exception(f'API request failed with status code {response.status_code}: {response.text}')
+            page = decode_klines_page(response.content)
+            now = clock.now_ms()
+            forming = page[:, CLOSE_TIME] >= now
+            closed = page[~forming]
+            for kline in closed:
+                yield kline, clock.wall_time(int(kline[CLOSE_TIME]) + 1)
+
+            if closed.shape[0]:
+                # the candle end_time falls in has closed, end_time need not be an open time
+                if end_time is not None and closed[-1, CLOSE_TIME] >= end_time:
+                    return
+                params['startTime'] = int(closed[-1, OPEN_TIME]) + 1
+            # the next candle should have opened by now, none forming means the feed has no more up to end_time
+            if end_time is not None and not forming.any() and page.shape[0] < MAX_LIMIT and now >= params['startTime']:
+                return
+            if closed.shape[0] < MAX_LIMIT:
+                sleep(poll_interval)
+    finally:
+        if owns_session:
+            session.close()
+
+
+class PaperTrader:
+    """
+    Trades a strategy on closed klines as they arrive, with a simulated position.
+
+    Strategies with a registered SignalStream (see strategies.register_signal_stream) update their signal
+    incrementally from every kline, at a cost per bar that does not grow with the history, and their signals
+    are the ones backtest_arrays computes over the same candles. Other strategies fall back to a rolling
+    window of the last lookback candles that their signal is recomputed on for every kline; with a lookback at
+    least as long as their longest indicator window the signals match too, indicators with unbounded memory
+    (EMAs, trailing stops) are only approximated over the window.
+
+    Every signal goes through one bar of the legacy backtest state machine, so calc_qty, check_sl_tp, the
+    realistic fill prices and the commission work exactly as in backtest_arrays, except that the last
+    position stays open.
+
+    Two latency histograms are kept per bar: latency from the candle's close to the order decision, which
+    includes the wait for the feed, and decision_time from receiving the kline to the decision.
+    """
+    def __init__(self, strategy: BaseStrategy, starting_balance: float, lookback: int = 500, slippage_factor: float = 5.0,
+                 commission: float = 0.0, ledger: TradeLedger = None, clock=time.time) -> None:
+        if lookback < 1:
+            raise ValueError(f'lookback must be positive, got {lookback}')
+        self.strategy = strategy
+        self.signal_stream = strategy.signal_stream()
+        self.starting_balance = starting_balance
+        self.slippage_factor = slippage_factor
+        self.commission = commission
+        self.ledger = ledger
+        self.clock = clock
+        self.state = BacktestState(starting_balance)
+        self.window = deque(maxlen=lookback)
+        self.latency = LatencyHistogram()
+        self.decision_time = LatencyHistogram()
+        self.records = []
+
+    def _window_signal(self, candle: tuple) -> int:
+        # fallback for strategies without a signal stream, the whole window is recomputed
+        self.window.append(candle)
+        candles = np.array(self.window)
+        index = pd.DatetimeIndex(candles[:, 0].astype(np.int64).view('datetime64[ms]'), name='Date').tz_localize('UTC')
+        frame = pd.DataFrame(candles[:, 1:], index=index, columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        return int(self.strategy.calc_signal_array(frame)[-1])
+
+    def on_kline(self, kline: Sequence, closed_at: float = None) -> int:
+        """
+        Decides on one closed kline in the /fapi/v1/klines layout, strings or numbers.
+
+        Parameters:
+        - closed_at (float): wall clock time in seconds the candle closed, close_time + 1ms if not given.
+
+        Returns:
+            int: the strategy signal code of the candle.
+        """
+        received = self.clock()
+        open_time = int(kline[OPEN_TIME])
+        open_price, high, low, close = float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4])
+        if self.signal_stream is not None:
+            signal = self.signal_stream.update(open_price, high, low, close)
+        else:
+            signal = self._window_signal((open_time, open_price, high, low, close, float(kline[5])))
+
+        open_prices, high_prices, low_prices, close_prices = (np.array([price]) for price in (open_price, high, low, close))
+        buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, self.slippage_factor)
+        qty, balance = run_position_state_machine(self.strategy, np.array([signal], dtype=np.int8), buy_prices, sell_prices,
+                                                  open_prices, high_prices, low_prices, close_prices, self.starting_balance,
+                                                  self.commission, ledger=self.ledger, state=self.state, final=False)
+        decided = self.clock()
+
+        closed_at = (int(kline[CLOSE_TIME]) + 1) / 1000 if closed_at is None else closed_at
+        self.latency.record(max(decided - closed_at, 0.0))
+        self.decision_time.record(decided - received)
+        self.records.append((open_time, signal, qty[0], balance[0], close * qty[0] + balance[0]))
+        return signal
+
+    def run(self, feed: Iterable[Tuple[Sequence, float]], max_bars: int = None) -> dict:
+        """
+        Consumes (kline, closed_at) pairs from a feed such as poll_klines until it ends or max_bars were traded.
+        """
+        for bars, (kline, closed_at) in enumerate(feed, 1):
+            self.on_kline(kline, closed_at)
+            if max_bars is not None and bars >= max_bars:
+                break
+        return self.report()
+
+    def equity_curve(self) -> pd.DataFrame:
+        """Signal, qty, balance and portfolio_value of every bar, indexed by the candle open time."""
+        curve = pd.DataFrame(self.records, columns=['open_time', 'strategy_signal', 'qty', 'balance', 'portfolio_value'])
+        curve.index = pd.DatetimeIndex(curve.pop('open_time').to_numpy(dtype=np.int64).view('datetime64[ms]'), name='Date').tz_localize('UTC')
+        return curve
+
+    def report(self) -> dict:
+        position = self.state.position
+        last = self.records[-1] if self.records else (None, 0, 0.0, self.starting_balance, self.starting_balance)
+        return {
+            'bars': self.state.bars,
+            'position': None if position is None else position.type.name,
+            'qty': last[2],
+            'balance': last[3],
+            'portfolio_value': last[4],
+            'latency': self.latency.summary(),
+            'decision_time': self.decision_time.summary(),
+        }
+
+
+class _KlineReplayHandler(BaseHTTPRequestHandler):
+    # answers /fapi/v1/klines and /fapi/v1/time like Binance, from the replay's candles
+    def do_GET(self):
+        replay = self.server.replay
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path == TIME_ENDPOINT:
+            self._send(200, {'serverTime': replay.now_ms()})
+        elif url.path != KLINES_ENDPOINT:
+            self._send(404, {'code': -1, 'msg': 'Not found.'})
+        elif (query.get('symbol'), query.get('interval')) not in replay.candles:
+            self._send(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+        else:
+            limit = min(int(query.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            start_time = int(query['startTime']) if 'startTime' in query else None
+            end_time = int(query['endTime']) if 'endTime' in query else None
+            self._send(200, replay.klines(query['symbol'], query['interval'], start_time, end_time, limit))
+
+    def _send(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class KlineReplayServer:
+    """
+    A local /fapi/v1/klines server that plays cached candles as if they were happening now, speed times
+    faster than real time (math.inf releases everything at once).
+
+    The replay clock starts at the first open time when start is called. Like Binance, a klines request
+    returns the candles that opened up to the replay clock, the last one still forming. The server also
+    works as the MarketClock of poll_klines, mapping candle times to the wall clock for the latency.
+
+    Parameters:
+    - candles (Dict[Tuple[str, str], dict]): kline columns (see binanceData.KLINE_COLUMNS) per (symbol, interval).
+    """
+    def __init__(self, candles: Dict[Tuple[str, str], dict], speed: float = 1.0, host: str = '127.0.0.1', port: int = 0,
+                 clock=time.time) -> None:
+        if not speed > 0:
+            raise ValueError(f'speed must be positive, got {speed}')
+        self.candles = {key: {column: np.asarray(columns[column]) for column in KLINE_COLUMNS}
+                        for key, columns in candles.items() if len(columns['open_time'])}
+        if not self.candles:
+            raise ValueError('no candles to replay')
+        self.speed = speed
+        self.address = (host, port)
+        self.clock = clock
+        self.first_open = min(int(columns['open_time'][0]) for columns in self.candles.values())
+        self.last_close = max(int(columns['close_time'][-1]) for columns in self.candles.values())
+        self.started_at = None
+        self.server = None
+
+    @classmethod
+    def from_cache(cls, cache: CandleCache, symbols: List[str], interval: str, start_date: int, end_date: int,
+                   speed: float = 1.0, **kwargs) -> 'KlineReplayServer':
+        """Replays already cached candles of several symbols, nothing is downloaded."""
+        return cls({(symbol, interval): cache.view(symbol, interval, start_date, end_date) for symbol in symbols}, speed, **kwargs)
+
+    def start(self) -> 'KlineReplayServer':
+        self.server = ThreadingHTTPServer(self.address, _KlineReplayHandler)
+        self.server.replay = self
+        self.started_at = self.clock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self) -> 'KlineReplayServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+
+    def now_ms(self) -> int:
+        if self.started_at is None:
+            return self.first_open
+        if math.isinf(self.speed):
+            return self.last_close + 1
+        return self.first_open + int((self.clock() - self.started_at) * 1000 * self.speed)
+
+    def wall_time(self, market_ms: int) -> float:
+        if math.isinf(self.speed):
+            return self.started_at
+        return self.started_at + (market_ms - self.first_open) / 1000 / self.speed
+
+    def klines(self, symbol: str, interval: str, start_time: int = None, end_time: int = None, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        The klines of a request as Binance sends them, prices and volumes as strings. Without a start_time
+        the latest limit candles.
+        """
+        columns = self.candles[(symbol, interval)]
+        open_times = columns['open_time']
+        now = self.now_ms()
+        stop = np.searchsorted(open_times, now if end_time is None else min(now, end_time), side='right')
+        if start_time is None:
+            first = max(stop - limit, 0)
+        else:
+            first = np.searchsorted(open_times, start_time, side='left')
+            stop = min(stop, first + limit)
+
+        rows = zip(*(columns[column][first:stop].tolist() for column in KLINE_COLUMNS))
+        return [[int(open_time), str(open_price), str(high), str(low), str(close), str(volume), int(close_time),
+                 str(quote_volume), int(trades), str(taker_base), str(taker_quote), '0']
+                for (open_time, open_price, high, low, close, volume, close_time, quote_volume, trades, taker_base,
+                     taker_quote, _) in rows]
@@ -0,0 +1,173 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List, NamedTuple, Tuple
+
+from models import StrategySignal
+from strategies import BaseStrategy, signal_codes
+from backtesting import calc_realistic_prices
+from batch_backtesting import build_signal_matrix
+
+
+class PortfolioResult(NamedTuple):
+    # marked to market value of every asset's open position, (bars x assets)
+    holdings: pd.DataFrame
+    # realized plus unrealized profit of every asset after fees, (bars x assets)
+    pnl: pd.DataFrame
+    # cash not allocated to any position
+    cash: pd.Series
+    # cash plus all holdings
+    portfolio_value: pd.Series
+
+
+def align_assets(frames: Dict[str, pd.DataFrame], columns: Tuple[str, ...] = ('Open', 'Close')) -> Tuple[pd.Index, Dict[str, np.ndarray]]:
+    """
+    Aligns the candles of several assets on the bars they all have.
+
+    Parameters:
+    - frames (Dict[str, pd.DataFrame]): Candles of every asset, indexed by date.
+    - columns (Tuple[str, ...]): Columns to stack.
+
+    Returns:
+        Tuple[pd.Index, Dict[str, np.ndarray]]: The common index and one (assets x bars) matrix per column.
+    """
+    index = None
+    for df in frames.values():
+        index = df.index if index is None else index.intersection(df.index)
+
+    matrices = {column: np.stack([df[column].reindex(index).to_numpy(dtype=np.float64) for df in frames.values()])
+                for column in columns}
+    return index, matrices
+
+
+def build_portfolio_signals(frames: Dict[str, pd.DataFrame], strategies: Dict[str, BaseStrategy], index: pd.Index) -> np.ndarray:
+    """
+    Runs every asset's strategy on its own aligned candles.
+
+    Returns:
+        np.ndarray: int8 (assets x bars) matrix of StrategySignal values.
+    """
+    return np.concatenate([build_signal_matrix(frames[asset].reindex(index), [strategies[asset]]) for asset in frames])
+
+
+def portfolio_backtest(open_prices: np.ndarray, close_prices: np.ndarray, signals: np.ndarray, starting_balance: float,
+                       slippage_factor: float=5.0, commission: float=0.0, assets: List[str]=None, index: pd.Index=None) -> PortfolioResult:
+    """
+    Backtests several assets that share one cash balance.
+
+    Every row of the matrices is one asset, every column one bar. All assets are stepped together, only on
+    bars where some asset has a signal. Within a bar, positions are closed first and the freed cash is
+    then split between the entries: every entering asset gets the cash divided by the number of assets
+    without a position, and the position is sized on that share less the commission. A short sets its allocation aside and returns it plus the profit of the short when
+    closed. Unlike backtest, positions are cleared when closed and an enter signal on an asset that
+    already has a position is ignored. The final bar closes every open position and ignores enter signals.
+
+    Parameters:
+    - open_prices, close_prices (np.ndarray): (assets x bars) price matrices, see align_assets.
+    - signals (np.ndarray): (assets x bars) matrix of StrategySignal values or members.
+    - starting_balance (float): Cash shared by all assets.
+    - assets (List[str]): Asset names for the result columns.
+    - index (pd.Index): Bars for the result index.
+
+    Returns:
+        PortfolioResult: Per asset holdings and pnl, the free cash and the aggregate portfolio value.
+    """
+    signals = signal_codes(signals)
+    open_prices = np.asarray(open_prices, dtype=np.float64)
+    close_prices = np.asarray(close_prices, dtype=np.float64)
+    if open_prices.ndim != 2 or open_prices.shape != close_prices.shape or open_prices.shape != signals.shape:
+        raise ValueError(f'open_prices, close_prices and signals must have the same (assets, bars) shape, '
+                         f'got {open_prices.shape}, {close_prices.shape} and {signals.shape}')
+
+    num_assets, num_trading_days = signals.shape
+    last_bar = num_trading_days - 1
+    buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, slippage_factor)
+
+    # state of every asset, side 0 means no position
+    side = np.zeros(num_assets, dtype=np.int8)
+    position_qty = np.zeros(num_assets)
+    allocation = np.zeros(num_assets)
+    entry_price = np.zeros(num_assets)
+    realized = np.zeros(num_assets)
+    cash = float(starting_balance)
+
+    event_bars = np.flatnonzero((signals != StrategySignal.DO_NOTHING.value).any(axis=0))
+    if event_bars.size == 0 or event_bars[-1] != last_bar:
+        event_bars = np.append(event_bars, last_bar)
+
+    event_side = np.empty((num_assets, event_bars.size), dtype=np.int8)
+    event_qty = np.empty((num_assets, event_bars.size))
+    event_allocation = np.empty((num_assets, event_bars.size))
+    event_entry = np.empty((num_assets, event_bars.size))
+    event_realized = np.empty((num_assets, event_bars.size))
+    event_cash = np.empty(event_bars.size)
+
+    for event, index_ in enumerate(event_bars):
+        signal = signals[:, index_]
+        buy_price = buy_prices[:, index_]
+        sell_price = sell_prices[:, index_]
+        flat = side == 0
+
+        if index_ == last_bar:
+            # everything is closed and nothing new is opened
+            close = ~flat
+            flat = np.zeros(num_assets, dtype=bool)
+        else:
+            close = ~flat & ((signal == StrategySignal.CLOSE_LONG.value) | (signal == StrategySignal.CLOSE_SHORT.value))
+        enter_long = flat & (signal == StrategySignal.ENTER_LONG.value)
+        enter_short = flat & (signal == StrategySignal.ENTER_SHORT.value)
+
+        if close.any():
+            # a long sells its qty, a short gets its allocation back plus qty * (entry - buy back price)
+            proceeds = np.where(side == 1, position_qty * sell_price, allocation + position_qty * (entry_price - buy_price))
+            proceeds = np.where(close, proceeds - commission, 0.0)
+            cash += proceeds.sum()
+            realized += np.where(close, proceeds - allocation, 0.0)
+            side[close] = 0
+            position_qty[close] = 0.0
+            allocation[close] = 0.0
+            entry_price[close] = 0.0
+
+        enter = enter_long | enter_short
+        if enter.any():
+            per_asset = cash / np.count_nonzero(side == 0)
+            # the commission is paid out of the asset's share, so cash never goes below zero
+            stake = max(per_asset - commission, 0.0)
+            price = np.where(enter_long, buy_price, sell_price)
+            position_qty = np.where(enter, stake / price, position_qty)
+            entry_price = np.where(enter, price, entry_price)
+            allocation = np.where(enter, stake, allocation)
+            realized -= np.where(enter, per_asset - stake, 0.0)
+            side[enter_long] = 1
+            side[enter_short] = -1
+            cash -= np.count_nonzero(enter) * per_asset
+
+        event_side[:, event] = side
+        event_qty[:, event] = position_qty
+        event_allocation[:, event] = allocation
+        event_entry[:, event] = entry_price
+        event_realized[:, event] = realized
+        event_cash[event] = cash
+
+    # carry the state of the latest event forward to every bar, bars before the first event hold the start state
+    latest_event = np.searchsorted(event_bars, np.arange(num_trading_days), side='right') - 1
+    started = latest_event >= 0
+    latest_event[~started] = 0
+    side_t = np.where(started, event_side[:, latest_event], 0)
+    qty_t = np.where(started, event_qty[:, latest_event], 0.0)
+    allocation_t = np.where(started, event_allocation[:, latest_event], 0.0)
+    entry_t = np.where(started, event_entry[:, latest_event], 0.0)
+    realized_t = np.where(started, event_realized[:, latest_event], 0.0)
+    cash_t = np.where(started, event_cash[latest_event], float(starting_balance))
+
+    holdings = np.where(side_t == 1, qty_t * close_prices, np.where(side_t == -1, allocation_t + qty_t * (entry_t - close_prices), 0.0))
+    pnl = realized_t + holdings - allocation_t
+    portfolio_value = cash_t + holdings.sum(axis=0)
+
+    index = pd.RangeIndex(num_trading_days) if index is None else index
+    assets = list(range(num_assets)) if assets is None else assets
+    return PortfolioResult(
+        holdings=pd.DataFrame(holdings.T, index=index, columns=assets),
+        pnl=pd.DataFrame(pnl.T, index=index, columns=assets),
+        cash=pd.Series(cash_t, index=index, name='cash'),
+        portfolio_value=pd.Series(portfolio_value, index=index, name='portfolio_value'),
+    )
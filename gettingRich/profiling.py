@@ -0,0 +1,113 @@
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+from models import ActionType, ExitReason, Position
+from trade_ledger import sl_tp_exit_reason
+
+
+_NO_PHASE = nullcontext()
+
+
+class BacktestProfiler:
+    """
+    Collects where a backtest spends its time, how many bars and trades it processed and, optionally,
+    its peak traced memory. Pass one to backtest/backtest_arrays; one profiler can be reused across
+    many runs and then holds the totals of all of them.
+
+    Phases:
+    - calc_signal: strategy.calc_signal_array
+    - bar_loop: the whole loop over the bars, including the two phases below
+    - check_sl_tp: strategy.check_sl_tp calls inside the loop
+    - calc_realistic_price: realistic price calculations
+    - portfolio_value: the final portfolio value column
+    """
+    def __init__(self, trace_memory: bool = False, callback: Callable[[dict], None] = None) -> None:
+        """
+        Parameters:
+        - trace_memory (bool): Record the peak memory with tracemalloc, which slows the run down.
+        - callback (Callable[[dict], None]): Called with the report at the end of every run.
+        """
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.peak_memory = None
+        self._started_tracing = False
+        self._run_start = None
+
+    def start(self) -> None:
+        self.counters['runs'] += 1
+        if self.trace_memory:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._run_start = time.perf_counter()
+
+    def finish(self) -> None:
+        self.add_time('total', time.perf_counter() - self._run_start)
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak_memory = peak if self.peak_memory is None else max(self.peak_memory, peak)
+            if self._started_tracing:
+                tracemalloc.stop()
+        if self.callback is not None:
+            self.callback(self.report())
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timings[name] += seconds
+        self.calls[name] += 1
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def count_sl_tp(self, position: Position, sl_tp_price: float, sl_tp_action: ActionType) -> None:
+        reason = sl_tp_exit_reason(position, sl_tp_price, sl_tp_action)
+        self.count('stop_losses' if reason == ExitReason.STOP_LOSS else 'take_profits')
+
+    def report(self) -> dict:
+        """
+        Returns:
+            dict: timings (seconds per phase), calls (times every phase ran), counters and peak_memory_mb.
+        """
+        return {
+            'timings': dict(self.timings),
+            'calls': dict(self.calls),
+            'counters': dict(self.counters),
+            'peak_memory_mb': None if self.peak_memory is None else self.peak_memory / 2**20,
+        }
+
+    def to_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def __str__(self) -> str:
+        total = self.timings.get('total', 0.0)
+        lines = [f"{'phase':<22}{'seconds':>12}{'share':>9}{'calls':>10}"]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            share = seconds / total if total else 0.0
+            lines.append(f'{name:<22}{seconds:>12.4f}{share:>9.1%}{self.calls[name]:>10}')
+        lines.extend(f'{name:<22}{value:>12}' for name, value in sorted(self.counters.items()))
+        if self.peak_memory is not None:
+            lines.append(f"{'peak_memory_mb':<22}{self.peak_memory / 2**20:>12.1f}")
+        return '\n'.join(lines)
+
+
+def profile_phase(profiler: BacktestProfiler, name: str):
+    """
+    profiler.phase(name), or a shared do-nothing context when profiling is disabled.
+    """
+    return _NO_PHASE if profiler is None else profiler.phase(name)
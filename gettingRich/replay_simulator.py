@@ -0,0 +1,170 @@
+"""
+Accelerated replay of cached candles for many symbols, to measure how many symbols and bars per second
+one process keeps up with.
+
+The candles of every symbol are merged into one stream ordered by close time with a k-way heap merge.
+A feeder thread releases each candle into a queue when it would have closed, speed times faster than
+real time, and the calling thread hands them to the strategy. When the handler falls behind, the queue
+backlog and the lag from release to decision grow.
+"""
+import heapq
+import math
+import queue
+import threading
+import time
+from itertools import repeat
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from binanceData import KLINE_COLUMNS
+from candle_cache import CandleCache
+from paper_trading import CLOSE_TIME, LatencyHistogram, PaperTrader
+from strategies import BaseStrategy
+
+# events read from the memory-mapped columns of a symbol at once
+CHUNK_SIZE = 10_000
+
+
+def load_replay_candles(cache: CandleCache, symbols: List[str], interval: str, start_date: int, end_date: int) -> Dict[str, dict]:
+    """
+    The cached kline columns of every symbol, memory-mapped so only the rows being replayed are read.
+    Nothing is downloaded, call cache.update first.
+    """
+    return {symbol: cache.view(symbol, interval, start_date, end_date) for symbol in symbols}
+
+
+def _symbol_events(symbol: str, columns: dict, chunk_size: int) -> Iterator[Tuple[int, str, tuple]]:
+    close_times = columns['close_time']
+    for start in range(0, close_times.shape[0], chunk_size):
+        rows = slice(start, start + chunk_size)
+        klines = zip(*(np.asarray(columns[column][rows]).tolist() for column in KLINE_COLUMNS))
+        yield from zip(np.asarray(close_times[rows]).tolist(), repeat(symbol), klines)
+
+
+def merge_events(candles: Dict[str, dict], chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, str, tuple]]:
+    """
+    The candles of all symbols as one stream ordered by close time, symbols closing together by name.
+
+    Parameters:
+    - candles (Dict[str, dict]): kline columns per symbol, see load_replay_candles.
+
+    Returns:
+        Iterator[Tuple[int, str, tuple]]: (close_time, symbol, kline) events, the kline a tuple in the
+        binanceData.KLINE_COLUMNS order.
+    """
+    return heapq.merge(*(_symbol_events(symbol, columns, chunk_size) for symbol, columns in sorted(candles.items())))
+
+
+class TraderHandler:
+    """
+    Replay handler trading every symbol with its own PaperTrader, created on the symbol's first candle.
+    """
+    def __init__(self, make_strategy: Callable[[str], BaseStrategy], starting_balance: float, **trader_kwargs) -> None:
+        self.make_strategy = make_strategy
+        self.starting_balance = starting_balance
+        self.trader_kwargs = trader_kwargs
+        self.traders: Dict[str, PaperTrader] = {}
+
+    def __call__(self, symbol: str, kline: tuple, released_at: float) -> None:
+        trader = self.traders.get(symbol)
+        if trader is None:
+            trader = self.traders[symbol] = PaperTrader(self.make_strategy(symbol), self.starting_balance, **self.trader_kwargs)
+        trader.on_kline(kline, released_at)
+
+
+def _feed(events: Iterator[Tuple[int, str, tuple]], events_queue: queue.Queue, speed: float, started_at: float,
+          first_close: int, clock, stop: threading.Event) -> None:
+    # releases every event when its candle closes on the accelerated clock, None marks the end
+    try:
+        for close_time, symbol, kline in events:
+            if stop.is_set():
+                break
+            if math.isinf(speed):
+                released_at = clock()
+            else:
+                released_at = started_at + (close_time - first_close) / 1000 / speed
+                wait = released_at - clock()
+                # woken early when the replay stops
+                if wait > 0 and stop.wait(wait):
+                    break
+            events_queue.put((symbol, kline, released_at))
+    finally:
+        events_queue.put(None)
+
+
+def replay_simulation(candles: Dict[str, dict], handler: Callable[[str, tuple, float], None], speed: float = math.inf,
+                      max_queue: int = 0, max_events: int = None, chunk_size: int = CHUNK_SIZE, clock=time.time) -> dict:
+    """
+    Replays the candles of many symbols through a handler at speed times real time.
+
+    Parameters:
+    - candles (Dict[str, dict]): kline columns per symbol, see load_replay_candles.
+    - handler (Callable[[str, tuple, float], None]): called with the symbol, the kline in the KLINE_COLUMNS
+      order and the wall clock time it was released, e.g. a TraderHandler.
+    - speed (float): multiple of real time, 1 for real time, 100 for 100x, math.inf releases candles as fast as the queue takes them.
+    - max_queue (int): queue capacity, 0 for unbounded. A full queue holds the feeder back.
+    - max_events (int): stop after this many events, None to replay everything.
+
+    Returns:
+        dict: events, symbols, seconds of wall time, events_per_sec, market_seconds replayed, achieved_speed,
+        backlog_max and backlog_mean (events waiting in the queue when each one was taken) and lag, the
+        latency summary from release to the handler returning.
+    """
+    if not speed > 0:
+        raise ValueError(f'speed must be positive, got {speed}')
+    candles = {symbol: columns for symbol, columns in candles.items() if len(columns['close_time'])}
+    if not candles:
+        raise ValueError('no candles to replay')
+    first_close = min(int(columns['close_time'][0]) for columns in candles.values())
+
+    events_queue = queue.Queue(maxsize=max_queue)
+    stop = threading.Event()
+    lag = LatencyHistogram()
+    events = 0
+    backlog_total = 0
+    backlog_max = 0
+    last_close = first_close
+
+    started_at = clock()
+    feeder = threading.Thread(target=_feed, args=(merge_events(candles, chunk_size), events_queue, speed, started_at,
+                                                  first_close, clock, stop), daemon=True)
+    feeder.start()
+    try:
+        while True:
+            item = events_queue.get()
+            if item is None:
+                break
+            backlog = events_queue.qsize()
+            backlog_total += backlog
+            backlog_max = max(backlog_max, backlog)
+
+            symbol, kline, released_at = item
+            handler(symbol, kline, released_at)
+            lag.record(max(clock() - released_at, 0.0))
+            events += 1
+            last_close = max(last_close, kline[CLOSE_TIME])
+            if max_events is not None and events >= max_events:
+                break
+    finally:
+        stop.set()
+        # unblock a feeder waiting on a full queue
+        while feeder.is_alive():
+            try:
+                events_queue.get(timeout=0.01)
+            except queue.Empty:
+                pass
+    seconds = clock() - started_at
+
+    market_seconds = (last_close - first_close) / 1000
+    return {
+        'events': events,
+        'symbols': len(candles),
+        'seconds': seconds,
+        'events_per_sec': events / seconds if seconds > 0 else math.inf,
+        'market_seconds': market_seconds,
+        'achieved_speed': market_seconds / seconds if seconds > 0 else math.inf,
+        'backlog_max': backlog_max,
+        'backlog_mean': backlog_total / events if events else 0.0,
+        'lag': lag.summary(),
+    }
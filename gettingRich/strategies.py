@@ -1,7 +1,44 @@
 import pandas as pd
+import numpy as np
 from models import ActionType, Position, PositionType, StrategySignal
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import Callable, Dict, Tuple
+
+from indicator_cache import CachedIndicators, IndicatorCache
+from streaming_indicators import STC, UTBot
+
+# strategy class -> vectorized calc_signal_array of that exact class, see register_signal_array
+SIGNAL_ARRAY_REGISTRY: Dict[type, Callable[['BaseStrategy', pd.DataFrame], np.ndarray]] = {}
+
+def register_signal_array(strategy_class: type):
+    """
+    Decorator registering a function (strategy, data) -> int8 signal array as the calc_signal_array of strategy_class.
+    Subclasses of strategy_class are not affected, they keep going through their own calc_signal.
+    """
+    def register(func):
+        SIGNAL_ARRAY_REGISTRY[strategy_class] = func
+        return func
+    return register
+
+# strategy class -> SignalStream class updating the signal of that exact class one candle at a time, see register_signal_stream
+SIGNAL_STREAM_REGISTRY: Dict[type, Callable[['BaseStrategy'], 'SignalStream']] = {}
+
+def register_signal_stream(strategy_class: type):
+    """
+    Decorator registering a SignalStream class, constructed from a strategy, as the signal_stream of strategy_class.
+    Subclasses of strategy_class are not affected, like register_signal_array.
+    """
+    def register(stream_class):
+        SIGNAL_STREAM_REGISTRY[strategy_class] = stream_class
+        return stream_class
+    return register
+
+def signal_codes(signals) -> np.ndarray:
+    # StrategySignal members or values, in an array of any shape -> int8 array of their values, so the engines compare plain ints
+    signals = np.asarray(signals)
+    if signals.dtype == object:
+        return np.fromiter((signal.value for signal in signals.flat), dtype=np.int8, count=signals.size).reshape(signals.shape)
+    return signals.astype(np.int8, copy=False)
 
 
 class BaseStrategy(ABC):
@@ -14,6 +51,30 @@ class BaseStrategy(ABC):
     def calc_signal(self, data: pd.DataFrame):
         pass
 
+    def calc_signal_array(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        The strategy signal of every bar as an int8 array of StrategySignal values.
+
+        Uses the vectorized implementation registered for the strategy's class if there is one, otherwise
+        calc_signal fills data['strategy_signal'] with StrategySignal members as before and the column is converted.
+
+        Returns:
+            np.ndarray: int8 signal array, one value per row of data.
+        """
+        vectorized = SIGNAL_ARRAY_REGISTRY.get(type(self))
+        if vectorized is not None:
+            return vectorized(self, data)
+        self.calc_signal(data)
+        return signal_codes(data['strategy_signal'])
+
+    def signal_stream(self) -> 'SignalStream':
+        """
+        A new incremental signal of the strategy, fed one closed candle at a time, or None if the strategy
+        has none registered and its signal has to be recomputed over a window of candles.
+        """
+        stream_class = SIGNAL_STREAM_REGISTRY.get(type(self))
+        return None if stream_class is None else stream_class(self)
+
     def calc_qty(self, real_price: float, balance: float, action: ActionType, **kwargs) -> float:
         if action == ActionType.BUY:
             qty = balance / real_price
@@ -32,6 +93,18 @@ class BaseStrategy(ABC):
         if tp_res is not None:
             return tp_res
 
+    def sl_tp_prices(self, position: Position) -> Tuple[float, float]:
+        """
+        Stop-loss and take-profit price levels of a position, computed once when it is opened.
+
+        Returns:
+            Tuple[float, float]: The stop-loss and take-profit prices, None for a rate that is not set.
+        """
+        direction = 1 if position.type == PositionType.LONG else -1
+        sl_price = position.price * (1 - direction * self.sl_rate) if self.sl_rate is not None else None
+        tp_price = position.price * (1 + direction * self.tp_rate) if self.tp_rate is not None else None
+        return sl_price, tp_price
+
     def is_stop_loss(self, row: pd.Series, position: Position) -> Tuple[float, float, ActionType]:
         """
         Checks if the price has hit the stop-loss level.
@@ -65,9 +138,64 @@ class BaseStrategy(ABC):
                 return position.qty, short_take_profit_price, ActionType.BUY
 
 
+class SignalStream(ABC):
+    """
+    A strategy's signal kept up to date one closed candle at a time, at a cost that does not depend on how many
+    candles came before. Its signals are the ones calc_signal_array gives for the same candles on every bar but
+    the last, since a stream does not know which candle is the last one.
+    """
+    @abstractmethod
+    def update(self, open_price: float, high: float, low: float, close: float) -> int:
+        """The StrategySignal value of the new candle."""
+        pass
+
+
+class BuyAndHoldStrategy(BaseStrategy):
+    def __init__(self, sl_rate: float = None, tp_rate: float = None) -> pd.Series:
+        super().__init__(sl_rate, tp_rate)
+
+    def calc_signal(self, data: pd.DataFrame) -> pd.Series:
+        data['strategy_signal'] = StrategySignal.DO_NOTHING
+        data.iloc[0, data.columns.get_loc('strategy_signal')] = StrategySignal.ENTER_LONG
+        data.iloc[-1, data.columns.get_loc('strategy_signal')] = StrategySignal.CLOSE_LONG
+
+
+class SellAndHoldStrategy(BaseStrategy):
+    def __init__(self, sl_rate: float = None, tp_rate: float = None) -> pd.Series:
+        super().__init__(sl_rate, tp_rate)
+
+    def calc_signal(self, data: pd.DataFrame) -> pd.Series:
+        data['strategy_signal'] = StrategySignal.DO_NOTHING
+        data.iloc[0, data.columns.get_loc('strategy_signal')] = StrategySignal.ENTER_SHORT
+        data.iloc[-1, data.columns.get_loc('strategy_signal')] = StrategySignal.CLOSE_SHORT
+
+
 class best_crypto_strat(BaseStrategy):
-    def __init__(self, sl_rate: float = None, tp_rate: float = None) -> None:
+    """
+    The UTBot + STC strategy of the notebook: goes long when both indicators say buy and closes when both
+    say sell, with the notebook's parameters as defaults. With an indicator_cache, strategies of a
+    parameter grid share every ATR, UTBot stop, EMA and STC they have in common.
+    """
+    def __init__(self, sl_rate: float = None, tp_rate: float = None, buy_key_value: float = 2, buy_atr_length: int = 300,
+                 sell_key_value: float = 2, sell_atr_length: int = 1, fast_length: int = 27, slow_length: int = 50,
+                 stc_length: int = 80, smoothing_factor: float = 0.5, sell_threshold: float = 75,
+                 buy_threshold: float = 25, indicator_cache: IndicatorCache = None) -> None:
         super().__init__(sl_rate, tp_rate)
+        self.buy_key_value = buy_key_value
+        self.buy_atr_length = buy_atr_length
+        self.sell_key_value = sell_key_value
+        self.sell_atr_length = sell_atr_length
+        self.fast_length = fast_length
+        self.slow_length = slow_length
+        self.stc_length = stc_length
+        self.smoothing_factor = smoothing_factor
+        self.sell_threshold = sell_threshold
+        self.buy_threshold = buy_threshold
+        self.indicator_cache = indicator_cache
+
+    def calc_signal(self, data: pd.DataFrame):
+        # not calc_signal_array, subclasses are not registered and would come back here
+        data['strategy_signal'] = [StrategySignal(code) for code in best_crypto_signal_array(self, data).tolist()]
 
     @staticmethod
     def calc_TR(df):
@@ -132,3 +260,127 @@ class best_crypto_strat(BaseStrategy):
     def NormalizeSmoothSrs(series, window_length, smoothing_f):
         # implementation of NormalizeSmoothSrs function here
         pass
+
+
+def _price_column(data: pd.DataFrame, name: str) -> np.ndarray:
+    # backtest candles use Open/High/Low/Close, raw binance klines open/high/low/close
+    column = name.capitalize() if name.capitalize() in data.columns else name
+    return data[column].to_numpy(dtype=np.float64)
+
+def _crossover(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # a crosses above b, NaN never crosses
+    crossed = a > b
+    crossed[1:] &= a[:-1] < b[:-1]
+    crossed[:1] = False
+    return crossed
+
+@register_signal_array(BuyAndHoldStrategy)
+def buy_and_hold_signal_array(strategy: BuyAndHoldStrategy, data: pd.DataFrame) -> np.ndarray:
+    signals = np.zeros(data.shape[0], dtype=np.int8)
+    if signals.shape[0]:
+        signals[0] = StrategySignal.ENTER_LONG.value
+        signals[-1] = StrategySignal.CLOSE_LONG.value
+    return signals
+
+@register_signal_array(SellAndHoldStrategy)
+def sell_and_hold_signal_array(strategy: SellAndHoldStrategy, data: pd.DataFrame) -> np.ndarray:
+    signals = np.zeros(data.shape[0], dtype=np.int8)
+    if signals.shape[0]:
+        signals[0] = StrategySignal.ENTER_SHORT.value
+        signals[-1] = StrategySignal.CLOSE_SHORT.value
+    return signals
+
+@register_signal_array(best_crypto_strat)
+def best_crypto_signal_array(strategy: best_crypto_strat, data: pd.DataFrame) -> np.ndarray:
+    """
+    The notebook's UTBot + STC signal over arrays.
+
+    UTBot buys when the close crosses above the buy trailing stop and sells when the sell trailing stop crosses
+    above the close; STC sells above sell_threshold while falling and buys below buy_threshold while rising. A
+    bar counts only when both agree. From the first agreed buy on, the latest agreed buy or sell is the state,
+    and the strategy enters long when the state turns to buy and closes when it turns to sell. A position still
+    open on the last bar is closed there and an entry on the last bar is dropped.
+    """
+    close = _price_column(data, 'close')
+    high = _price_column(data, 'high')
+    low = _price_column(data, 'low')
+    num_bars = close.shape[0]
+    signals = np.zeros(num_bars, dtype=np.int8)
+    if num_bars == 0:
+        return signals
+
+    indicators = CachedIndicators(close, high, low, strategy.indicator_cache)
+    buy_stop = indicators.utbot_trailing_stop(strategy.buy_key_value, strategy.buy_atr_length, pine_downtrend=True)
+    sell_stop = indicators.utbot_trailing_stop(strategy.sell_key_value, strategy.sell_atr_length)
+    utbot_buy = _crossover(close, buy_stop)
+    utbot_sell = _crossover(sell_stop, close) & ~utbot_buy
+
+    stc_values = indicators.stc(strategy.fast_length, strategy.slow_length, strategy.stc_length, strategy.smoothing_factor)
+    prev_stc = np.r_[np.nan, stc_values[:-1]]
+    stc_sell = (stc_values > strategy.sell_threshold) & (stc_values < prev_stc)
+    stc_buy = (stc_values < strategy.buy_threshold) & (stc_values > prev_stc) & ~stc_sell
+
+    # the first bar never changes the state, and a sell only counts once there was a buy
+    buy = utbot_buy & stc_buy
+    buy[0] = False
+    first_buy = np.argmax(buy) if buy.any() else num_bars
+    sell = utbot_sell & stc_sell
+    sell[:first_buy + 1] = False
+
+    # state of every bar: 1 long, -1 flat after a sell, 0 before the first buy
+    marks = np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+    last_mark = np.maximum.accumulate(np.where(marks != 0, np.arange(num_bars), 0))
+    state = marks[last_mark]
+    changed = state != np.r_[0, state[:-1]]
+
+    signals[changed & (state == 1)] = StrategySignal.ENTER_LONG.value
+    signals[changed & (state == -1)] = StrategySignal.CLOSE_LONG.value
+    if signals[-1] == StrategySignal.ENTER_LONG.value:
+        signals[-1] = StrategySignal.DO_NOTHING.value
+    elif state[-1] == 1:
+        signals[-1] = StrategySignal.CLOSE_LONG.value
+    return signals
+
+
+@register_signal_stream(best_crypto_strat)
+class BestCryptoSignalStream(SignalStream):
+    """
+    best_crypto_signal_array one candle at a time, with the UTBot stops and the STC of streaming_indicators.
+    """
+    def __init__(self, strategy: best_crypto_strat) -> None:
+        self.strategy = strategy
+        self.buy_bot = UTBot(strategy.buy_key_value, strategy.buy_atr_length, pine_downtrend=True)
+        self.sell_bot = UTBot(strategy.sell_key_value, strategy.sell_atr_length)
+        self.stc = STC(strategy.fast_length, strategy.slow_length, strategy.stc_length, strategy.smoothing_factor)
+        self.prev_stc = np.nan
+        self.bars = 0
+        self.bought = False
+        # 1 long, -1 flat after a sell, 0 before the first buy
+        self.state = 0
+
+    def update(self, open_price: float, high: float, low: float, close: float) -> int:
+        strategy = self.strategy
+        self.buy_bot.update(high, low, close)
+        self.sell_bot.update(high, low, close)
+        utbot_buy = self.buy_bot.buy
+        utbot_sell = self.sell_bot.sell and not utbot_buy
+
+        stc_value = self.stc.update(high, low, close)
+        stc_sell = stc_value > strategy.sell_threshold and stc_value < self.prev_stc
+        stc_buy = stc_value < strategy.buy_threshold and stc_value > self.prev_stc and not stc_sell
+        self.prev_stc = stc_value
+
+        # the first bar never changes the state, and a sell only counts after the bar of the first buy
+        buy = utbot_buy and stc_buy and self.bars > 0
+        sell = utbot_sell and stc_sell and self.bought
+        self.bars += 1
+        self.bought = self.bought or buy
+
+        prev_state = self.state
+        if buy:
+            self.state = 1
+        elif sell:
+            self.state = -1
+        if self.state == prev_state:
+            return StrategySignal.DO_NOTHING.value
+        return StrategySignal.ENTER_LONG.value if self.state == 1 else StrategySignal.CLOSE_LONG.value
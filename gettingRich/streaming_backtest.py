@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable, Iterator
+
+from strategies import BaseStrategy
+from backtesting import BacktestState, run_position_state_machine, calc_realistic_prices
+from candle_cache import CandleCache
+from profiling import BacktestProfiler, profile_phase
+from trade_ledger import TradeLedger
+
+# kline column -> backtest column
+CANDLE_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+
+def frame_chunks(data: pd.DataFrame, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Splits a DataFrame that is already in memory into consecutive row slices, without copying.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+def csv_chunks(path: str, chunk_size: int, index_col: str = 'Date') -> Iterator[pd.DataFrame]:
+    """
+    Reads a candles CSV chunk_size rows at a time.
+
+    Parameters:
+    - path (str): CSV with Open/High/Low/Close columns.
+    - chunk_size (int): Rows per chunk.
+    - index_col (str): Column parsed as the dates index, None to keep a running integer index.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+    with pd.read_csv(path, chunksize=chunk_size, index_col=index_col, parse_dates=index_col is not None) as reader:
+        yield from reader
+
+
+def candle_cache_chunks(cache: CandleCache, symbol: str, interval: str, start_date: int, end_date: int,
+                        chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Reads already cached candles chunk_size rows at a time from the memory-mapped columns of a CandleCache.
+    Only the rows of the current chunk are read into memory. Nothing is downloaded, call cache.update first.
+
+    Returns:
+        Iterator[pd.DataFrame]: Open/High/Low/Close/Volume chunks indexed by the candle open time.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+    columns = cache.view(symbol, interval, start_date, end_date)
+    open_time = columns['open_time']
+    for start in range(0, open_time.shape[0], chunk_size):
+        rows = slice(start, start + chunk_size)
+        index = pd.DatetimeIndex(np.asarray(open_time[rows], dtype=np.int64).view('datetime64[ms]'), name='Date').tz_localize('UTC')
+        yield pd.DataFrame({name: np.array(columns[column][rows], dtype=np.float64) for column, name in CANDLE_COLUMNS.items()},
+                           index=index)
+
+
+def streaming_backtest(chunks: Iterable[pd.DataFrame], strategy: BaseStrategy, starting_balance: float, output_path: str,
+                       warmup: int = 0, slippage_factor: float=5.0, commission: float=0.0,
+                       profiler: BacktestProfiler=None, ledger: TradeLedger=None) -> dict:
+    """
+    Runs the backtest_arrays position state machine over candles that arrive in chunks, so the whole
+    history never has to be in memory at once.
+
+    The position, qty, balance and last bar are carried from one chunk to the next. Before the signal
+    of a chunk is computed, the last warmup bars of the previous chunk are put in front of it so rolling
+    indicators start warmed up; their signals are dropped. With a warmup at least as long as the longest
+    lookback of the strategy the results are identical to backtest_arrays over the whole history.
+    Indicators with unbounded memory (EMAs, Wilder smoothing) are only approximated, more closely the
+    longer the warmup. The legacy stop loss and take profit rules apply.
+
+    The qty, balance and portfolio_value of every bar are appended to output_path as CSV after every
+    chunk, with the index of the chunks as the first column.
+
+    Parameters:
+    - chunks (Iterable[pd.DataFrame]): Consecutive candle chunks, see frame_chunks, csv_chunks and candle_cache_chunks.
+    - warmup (int): Bars of history every chunk's signal calculation gets.
+    - output_path (str): CSV the equity curve is written to, overwritten if it exists.
+    - ledger (TradeLedger): Records every exit fill, with bar numbers counted from the start of the stream.
+
+    Returns:
+        dict: bars, chunks, final qty, balance and portfolio_value, total_return and max_drawdown of the run.
+    """
+    if warmup < 0:
+        raise ValueError(f'warmup must not be negative, got {warmup}')
+    if profiler is not None:
+        profiler.start()
+
+    state = BacktestState(starting_balance)
+    summary = {'bars': 0, 'chunks': 0, 'qty': np.nan, 'balance': np.nan, 'portfolio_value': np.nan}
+    first_value = np.nan
+    peak = -np.inf
+    max_drawdown = 0.0
+    tail = None
+
+    chunks = (chunk for chunk in chunks if len(chunk))
+    chunk = next(chunks, None)
+    while chunk is not None:
+        # the last chunk is only known once the next one does not come
+        next_chunk = next(chunks, None)
+
+        frame = chunk.copy(deep=False) if tail is None else pd.concat([tail, chunk])
+        with profile_phase(profiler, 'calc_signal'):
+            signals = strategy.calc_signal_array(frame)[len(frame) - len(chunk):]
+
+        open_prices = chunk['Open'].to_numpy(dtype=np.float64)
+        high_prices = chunk['High'].to_numpy(dtype=np.float64)
+        low_prices = chunk['Low'].to_numpy(dtype=np.float64)
+        close_prices = chunk['Close'].to_numpy(dtype=np.float64)
+        with profile_phase(profiler, 'calc_realistic_price'):
+            buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, slippage_factor)
+
+        with profile_phase(profiler, 'bar_loop'):
+            qty, balance = run_position_state_machine(strategy, signals, buy_prices, sell_prices, open_prices, high_prices,
+                                                      low_prices, close_prices, starting_balance, commission, profiler,
+                                                      ledger, state=state, final=next_chunk is None)
+
+        with profile_phase(profiler, 'portfolio_value'):
+            portfolio_value = close_prices * qty + balance
+            equity = pd.DataFrame({'qty': qty, 'balance': balance, 'portfolio_value': portfolio_value}, index=chunk.index)
+            equity.to_csv(output_path, mode='w' if summary['chunks'] == 0 else 'a', header=summary['chunks'] == 0)
+
+        if summary['chunks'] == 0:
+            first_value = portfolio_value[0]
+        running_peak = np.maximum(np.maximum.accumulate(portfolio_value), peak)
+        max_drawdown = max(max_drawdown, ((running_peak - portfolio_value) / running_peak).max())
+        peak = running_peak[-1]
+
+        summary['bars'] += len(chunk)
+        summary['chunks'] += 1
+        summary['qty'] = qty[-1]
+        summary['balance'] = balance[-1]
+        summary['portfolio_value'] = portfolio_value[-1]
+
+        # the raw candles only, without the columns the strategy added
+        tail = frame.iloc[-warmup:][chunk.columns] if warmup else None
+        chunk = next_chunk
+
+    if profiler is not None:
+        profiler.finish()
+    summary['total_return'] = summary['portfolio_value'] / first_value - 1.0
+    summary['max_drawdown'] = max_drawdown if summary['chunks'] else np.nan
+    return summary
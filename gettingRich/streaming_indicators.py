@@ -0,0 +1,230 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+import pandas as pd
+
+
+class StreamingIndicator(ABC):
+    """
+    Base class of the incremental indicators, fed one candle at a time.
+
+    Subclasses keep only the state their window needs and implement update, so the cost of a new candle
+    does not depend on how much history came before it.
+    """
+    value: float = math.nan
+
+    @abstractmethod
+    def update(self, high: float, low: float, close: float) -> float:
+        pass
+
+    def update_kline(self, kline: list) -> float:
+        # one row in the /fapi/v1/klines layout: [open_time, open, high, low, close, ...]
+        return self.update(float(kline[2]), float(kline[3]), float(kline[4]))
+
+    def warm_start(self, df: pd.DataFrame) -> 'StreamingIndicator':
+        """Feeds a historical DataFrame with high, low and close columns, oldest candle first."""
+        for high, low, close in zip(df['high'].tolist(), df['low'].tolist(), df['close'].tolist()):
+            self.update(high, low, close)
+        return self
+
+
+class RollingMean:
+    """Rolling mean over the last window values, NaN until the window is full or while it holds a NaN, like pandas."""
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.compensation = 0.0
+        self.nan_count = 0
+
+    def _add(self, x: float) -> None:
+        # Kahan summation keeps the running sum from drifting over long streams
+        y = x - self.compensation
+        t = self.total + y
+        self.compensation = (t - self.total) - y
+        self.total = t
+
+    def update(self, x: float) -> float:
+        self.values.append(x)
+        if math.isnan(x):
+            self.nan_count += 1
+        else:
+            self._add(x)
+
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self._add(-old)
+
+        if len(self.values) < self.window or self.nan_count > 0:
+            return math.nan
+        return self.total / self.window
+
+
+class RollingExtremes:
+    """Rolling min and max over the last window values with monotonic deques, O(1) amortized per update."""
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.min_deque = deque()
+        self.max_deque = deque()
+
+    def update(self, x: float):
+        index = self.count
+        self.count += 1
+
+        while self.min_deque and self.min_deque[-1][1] >= x:
+            self.min_deque.pop()
+        self.min_deque.append((index, x))
+        while self.max_deque and self.max_deque[-1][1] <= x:
+            self.max_deque.pop()
+        self.max_deque.append((index, x))
+
+        oldest = index - self.window + 1
+        if self.min_deque[0][0] < oldest:
+            self.min_deque.popleft()
+        if self.max_deque[0][0] < oldest:
+            self.max_deque.popleft()
+
+        if self.count < self.window:
+            return math.nan, math.nan
+        return self.min_deque[0][1], self.max_deque[0][1]
+
+
+class TrueRange(StreamingIndicator):
+    """Streaming binanceData.TR, NaN on the first candle."""
+    def __init__(self):
+        self.prev_close = math.nan
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev_close = self.prev_close
+        self.prev_close = close
+        self.value = (high if high > prev_close else prev_close) - (low if low < prev_close else prev_close)
+        return self.value
+
+
+class AverageTrueRange(StreamingIndicator):
+    """Streaming binanceData.ATR(TR(close, high, low), atr_length)."""
+    def __init__(self, atr_length: int):
+        self.true_range = TrueRange()
+        self.mean = RollingMean(atr_length)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.value = self.mean.update(self.true_range.update(high, low, close))
+        return self.value
+
+
+class EMA(StreamingIndicator):
+    """
+    Streaming close.ewm(span=span, adjust=adjust, min_periods=min_periods).mean().
+
+    adjust=True is the EMA STCosi uses, adjust=False with min_periods=length the one of EMACalc.
+    """
+    def __init__(self, span: int, adjust: bool = True, min_periods: int = 0):
+        self.alpha = 2 / (span + 1)
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self.count = 0
+        self.weighted_sum = 0.0
+        self.weight = 0.0
+        self.ema = math.nan
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.count += 1
+        decay = 1 - self.alpha
+        if self.adjust:
+            self.weighted_sum = close + decay * self.weighted_sum
+            self.weight = 1 + decay * self.weight
+            self.ema = self.weighted_sum / self.weight
+        elif self.count == 1:
+            self.ema = close
+        else:
+            self.ema = decay * self.ema + self.alpha * close
+
+        self.value = self.ema if self.count >= self.min_periods else math.nan
+        return self.value
+
+
+class NormalizeSmooth:
+    """Streaming binanceData.normNsmooth for one series."""
+    def __init__(self, stc_length: int, smoothing_factor: float):
+        self.extremes = RollingExtremes(stc_length)
+        self.smoothing_factor = smoothing_factor
+        self.last_normalized = math.nan
+        self.smoothed = math.nan
+
+    def update(self, x: float) -> float:
+        lowest, highest = self.extremes.update(x)
+        highest_range = highest - lowest
+
+        # bars without a full window keep their raw value, a flat window repeats the last normalized value
+        if highest_range > 0:
+            self.last_normalized = (x - lowest) / highest_range * 100
+        elif not highest_range <= 0:
+            self.last_normalized = x
+        normalized = self.last_normalized
+
+        if math.isnan(self.smoothed):
+            self.smoothed = normalized
+        else:
+            self.smoothed = self.smoothed + self.smoothing_factor * (normalized - self.smoothed)
+        return self.smoothed
+
+
+class STC(StreamingIndicator):
+    """Streaming binanceData.STCosi over the close prices."""
+    def __init__(self, fast_length: int, slow_length: int, stc_length: int, smoothing_factor: float = 0.5):
+        self.fast_ema = EMA(fast_length)
+        self.slow_ema = EMA(slow_length)
+        self.first_pass = NormalizeSmooth(stc_length, smoothing_factor)
+        self.second_pass = NormalizeSmooth(stc_length, smoothing_factor)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        macd = self.fast_ema.update(high, low, close) - self.slow_ema.update(high, low, close)
+        self.value = self.second_pass.update(self.first_pass.update(macd))
+        return self.value
+
+
+class UTBot(StreamingIndicator):
+    """
+    Streaming UTBot trailing stop, same recursion as indicators.utbot_trailing_stop over key_value * ATR.
+
+    After every update buy and sell tell whether the close crossed above or below the trailing stop on that candle.
+    """
+    def __init__(self, key_value: float, atr_length: int, initial_stop: float = math.nan, pine_downtrend: bool = False):
+        self.key_value = key_value
+        self.atr = AverageTrueRange(atr_length)
+        self.initial_stop = initial_stop
+        self.pine_downtrend = pine_downtrend
+        self.prev_close = math.nan
+        self.buy = False
+        self.sell = False
+        self.count = 0
+
+    def update(self, high: float, low: float, close: float) -> float:
+        loss_threshold = self.key_value * self.atr.update(high, low, close)
+        prev_stop = self.value
+        prev_close = self.prev_close
+
+        if self.count == 0:
+            stop = self.initial_stop
+        elif close > prev_stop and prev_close > prev_stop:
+            new_stop = close - loss_threshold
+            stop = new_stop if new_stop > prev_stop else prev_stop
+        elif close < prev_stop and prev_close < prev_stop:
+            new_stop = close + loss_threshold if self.pine_downtrend else close - loss_threshold
+            stop = new_stop if new_stop < prev_stop else prev_stop
+        elif close > prev_stop:
+            stop = close - loss_threshold
+        else:
+            stop = close + loss_threshold
+
+        self.buy = close > stop and prev_close < prev_stop
+        self.sell = stop > close and prev_stop < prev_close
+        self.count += 1
+        self.prev_close = close
+        self.value = stop
+        return stop
@@ -0,0 +1,162 @@
+import csv
+import itertools
+import os
+from multiprocessing import Pool, shared_memory
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from backtesting import backtest_arrays
+from evaluation import METRIC_NAMES, calc_metrics
+from strategies import BaseStrategy
+
+METRIC_COLUMNS = METRIC_NAMES
+
+
+def param_combinations(param_grid: Dict[str, Iterable]) -> List[dict]:
+    """Every combination of the values in param_grid, in the order itertools.product yields them."""
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+
+
+class SharedCandles:
+    """
+    The numeric columns of a candles DataFrame copied once into a shared memory block.
+
+    Workers attach to the block by name and rebuild the DataFrame on top of it without copying,
+    so the candles are not pickled for every parameter combination.
+    """
+    def __init__(self, data: pd.DataFrame):
+        numeric = data.select_dtypes(include=[np.number])
+        self.columns = list(numeric.columns)
+        self.length = numeric.shape[0]
+        self.index_name = data.index.name
+        self.index_tz = None
+        self.index_unit = None
+        self.has_datetime_index = isinstance(data.index, pd.DatetimeIndex)
+
+        num_arrays = len(self.columns) + int(self.has_datetime_index)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(num_arrays * self.length * 8, 1))
+        block = np.ndarray((num_arrays, self.length), dtype=np.float64, buffer=self.shm.buf)
+        for i, column in enumerate(self.columns):
+            block[i] = numeric[column].to_numpy(dtype=np.float64)
+        if self.has_datetime_index:
+            self.index_tz = data.index.tz
+            self.index_unit = data.index.unit
+            block[-1].view(np.int64)[:] = data.index.asi8
+        self.name = self.shm.name
+
+    def __getstate__(self):
+        # only the description of the block travels to the workers, never the data
+        state = self.__dict__.copy()
+        state['shm'] = None
+        return state
+
+    def attach(self) -> None:
+        if self.shm is None:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+
+    def to_frame(self) -> pd.DataFrame:
+        num_arrays = len(self.columns) + int(self.has_datetime_index)
+        block = np.ndarray((num_arrays, self.length), dtype=np.float64, buffer=self.shm.buf)
+        block.flags.writeable = False
+        index = None
+        if self.has_datetime_index:
+            index = pd.DatetimeIndex(block[-1].view(f'datetime64[{self.index_unit}]'), name=self.index_name)
+            if self.index_tz is not None:
+                index = index.tz_localize('UTC').tz_convert(self.index_tz)
+        return pd.DataFrame({column: block[i] for i, column in enumerate(self.columns)}, index=index, copy=False)
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+_worker_candles: SharedCandles = None
+_worker_settings: dict = None
+
+
+def _init_worker(candles: SharedCandles, settings: dict) -> None:
+    global _worker_candles, _worker_settings
+    candles.attach()
+    _worker_candles = candles
+    _worker_settings = settings
+
+
+def _run_combination(params: dict) -> dict:
+    settings = _worker_settings
+    strategy: BaseStrategy = settings['make_strategy'](**params)
+    b_df = backtest_arrays(_worker_candles.to_frame(), strategy, settings['starting_balance'],
+                           slippage_factor=settings['slippage_factor'], commission=settings['commission'])
+    metrics = calc_metrics(b_df['portfolio_value'])[0]
+    return {**{name: float(metrics[name]) for name in METRIC_COLUMNS}, **params}
+
+
+def _combination_key(params: dict, names: List[str]) -> tuple:
+    # params are compared the way they are stored in the csv
+    return tuple(str(params[name]) for name in names)
+
+
+def _read_completed(output_path: str, names: List[str]) -> set:
+    if not os.path.exists(output_path):
+        return set()
+
+    # a sweep killed mid-write can leave a partial last line behind, drop it
+    with open(output_path, 'rb+') as f:
+        content = f.read()
+        if content and not content.endswith(b'\n'):
+            f.truncate(content.rfind(b'\n') + 1)
+
+    with open(output_path, newline='') as f:
+        reader = csv.DictReader(f)
+        return {tuple(row[name] for name in names) for row in reader}
+
+
+def run_sweep(data: pd.DataFrame, make_strategy: Callable[..., BaseStrategy], param_grid, output_path: str,
+              starting_balance: float, slippage_factor: float=5.0, commission: float=0.0,
+              workers: int=None, chunksize: int=1) -> pd.DataFrame:
+    """
+    Runs a backtest and its evaluation for every parameter combination across a pool of worker processes.
+
+    The candles are handed to the workers through shared memory. Every finished combination is appended to
+    output_path right away, and combinations already in output_path are skipped, so a killed sweep resumes
+    where it stopped when it is run again with the same arguments.
+
+    Parameters:
+    - make_strategy (Callable): picklable callable (e.g. a strategy class) building a strategy from one combination.
+    - param_grid (dict or list): {name: values} grid, or an explicit list of {name: value} combinations.
+    - workers (int): number of worker processes, defaults to os.cpu_count().
+
+    Returns:
+        pd.DataFrame: every row of output_path, with the metrics columns of train_results.csv.
+    """
+    combinations = param_combinations(param_grid) if isinstance(param_grid, dict) else list(param_grid)
+    if not combinations:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    names = list(combinations[0])
+
+    completed = _read_completed(output_path, names)
+    pending = [params for params in combinations if _combination_key(params, names) not in completed]
+
+    if pending:
+        settings = {'make_strategy': make_strategy, 'starting_balance': starting_balance,
+                    'slippage_factor': slippage_factor, 'commission': commission}
+        candles = SharedCandles(data)
+        try:
+            write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+            with open(output_path, 'a', newline='') as f, \
+                    Pool(workers, initializer=_init_worker, initargs=(candles, settings)) as pool:
+                writer = csv.DictWriter(f, fieldnames=METRIC_COLUMNS + names)
+                if write_header:
+                    writer.writeheader()
+                for row in pool.imap_unordered(_run_combination, pending, chunksize=chunksize):
+                    writer.writerow(row)
+                    f.flush()
+        finally:
+            candles.unlink()
+
+    return pd.read_csv(output_path)
@@ -1,9 +1,33 @@
 import unittest
 import pandas as pd
-from strategies import BuyAndHoldStrategy, SellAndHoldStrategy
-from backtesting import backtest, calc_realistic_price
+from strategies import BaseStrategy, BuyAndHoldStrategy, SellAndHoldStrategy
+from backtesting import backtest, backtest_arrays, calc_realistic_price, calc_realistic_prices
 import numpy as np
-from models import ActionType
+from models import ActionType, StrategySignal
+
+class FixedSignalStrategy(BaseStrategy):
+    def __init__(self, signals, sl_rate: float = None, tp_rate: float = None):
+        super().__init__(sl_rate, tp_rate)
+        self.signals = signals
+
+    def calc_signal(self, data: pd.DataFrame):
+        data['strategy_signal'] = list(self.signals)
+
+def random_ohlc(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = np.r_[100, close[:-1]]
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n)),
+        'Low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n)),
+        'Close': close,
+        'Volume': rng.uniform(1000, 2000, n),
+    })
+
+def random_signals(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return list(rng.choice(list(StrategySignal), size=n, p=[0.1, 0.1, 0.6, 0.1, 0.1]))
 
 class Test_Backtesting(unittest.TestCase):
     def test_backtesting_long_bh(self):
@@ -84,5 +108,43 @@ class Test_Backtesting(unittest.TestCase):
         result = calc_realistic_price(row, action_type, slippage_factor=5.0)
         self.assertEqual(result, 100)
         
+    def test_calculate_realistic_prices(self):
+        open_prices = np.array([100.0, 100.0])
+        close_prices = np.array([90.0, 110.0])
+        buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, slippage_factor=5.0)
+        self.assertEqual([100.0, 102.0], list(buy_prices))
+        self.assertEqual([98.0, 100.0], list(sell_prices))
+
+class Test_BacktestArrays(unittest.TestCase):
+    def assert_same_as_backtest(self, data, make_strategy, **kwargs):
+        expected = backtest(data.copy(deep=True), make_strategy(), **kwargs)
+        result = backtest_arrays(data.copy(deep=True), make_strategy(), **kwargs)
+        pd.testing.assert_frame_equal(expected, result)
+
+    def test_long_bh(self):
+        data = random_ohlc(6)
+        self.assert_same_as_backtest(data, BuyAndHoldStrategy, starting_balance=100, slippage_factor=np.inf)
+
+    def test_short_sh(self):
+        data = random_ohlc(6)
+        self.assert_same_as_backtest(data, SellAndHoldStrategy, starting_balance=100, slippage_factor=np.inf)
+
+    def test_random_signals_with_slippage_and_commission(self):
+        data = random_ohlc(300, seed=1)
+        signals = random_signals(300, seed=2)
+        self.assert_same_as_backtest(data, lambda: FixedSignalStrategy(signals), starting_balance=10000,
+                                     slippage_factor=5.0, commission=1.5)
+
+    def test_random_signals_with_sl_tp(self):
+        data = random_ohlc(300, seed=3)
+        signals = random_signals(300, seed=4)
+        self.assert_same_as_backtest(data, lambda: FixedSignalStrategy(signals, sl_rate=0.02, tp_rate=0.03),
+                                     starting_balance=10000, slippage_factor=5.0, commission=1.0)
+
+    def test_keeps_index_like_backtest(self):
+        data = random_ohlc(50, seed=5)
+        data.index = pd.date_range('2024-01-01', periods=50, freq='D', name='Date')
+        self.assert_same_as_backtest(data, BuyAndHoldStrategy, starting_balance=1000)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+import unittest
+import pandas as pd
+import numpy as np
+from backtesting import backtest_arrays
+from batch_backtesting import batch_backtest, build_signal_matrix
+from evaluation import calc_total_return, calc_annualized_return, calc_annualized_sharpe, calc_sortino, calc_max_drawdown, calc_calmar
+from strategies import BuyAndHoldStrategy, SellAndHoldStrategy
+from test_backtesting import FixedSignalStrategy, random_ohlc, random_signals
+
+class Test_BatchBacktest(unittest.TestCase):
+    def test_matches_single_backtests(self):
+        data = random_ohlc(400, seed=7)
+        strategies = [FixedSignalStrategy(random_signals(400, seed=seed)) for seed in range(20)]
+        strategies += [BuyAndHoldStrategy(), SellAndHoldStrategy()]
+        signals = build_signal_matrix(data, strategies)
+
+        portfolio_values, metrics = batch_backtest(data, signals, starting_balance=10000, slippage_factor=5.0, commission=2.0)
+
+        self.assertEqual((len(strategies), 400), portfolio_values.shape)
+        for i, strategy in enumerate(strategies):
+            b_df = backtest_arrays(data.copy(deep=True), strategy, 10000, slippage_factor=5.0, commission=2.0)
+            np.testing.assert_array_equal(b_df['portfolio_value'].to_numpy(), portfolio_values[i])
+
+            expected = [calc_total_return(b_df['portfolio_value']), calc_annualized_return(b_df['portfolio_value']),
+                        calc_annualized_sharpe(b_df['portfolio_value']), calc_sortino(b_df['portfolio_value']),
+                        calc_max_drawdown(b_df['portfolio_value']), calc_calmar(b_df['portfolio_value'])]
+            np.testing.assert_allclose(expected, metrics.iloc[i].to_numpy(dtype=float), rtol=1e-9)
+
+    def test_accepts_enum_signals_and_param_sets(self):
+        data = random_ohlc(30, seed=1)
+        signals = np.array([random_signals(30, seed=1), random_signals(30, seed=2)], dtype=object)
+        params = pd.DataFrame({'bb_window': [10, 20]})
+
+        portfolio_values, metrics = batch_backtest(data, signals, starting_balance=100, param_sets=params)
+
+        self.assertEqual([10, 20], list(metrics['bb_window']))
+        self.assertEqual(['bb_window', 'total_return', 'annualized_return', 'annualized_sharpe', 'sortino_ratio',
+                          'max_drawdown', 'calmar_ratio'], list(metrics.columns))
+        self.assertEqual((2, 30), portfolio_values.shape)
+
+    def test_rejects_mismatched_signal_shape(self):
+        data = random_ohlc(10)
+        with self.assertRaises(ValueError):
+            batch_backtest(data, np.zeros((3, 9), dtype=np.int8), starting_balance=100)
+
+if __name__ == '__main__':
+    unittest.main()
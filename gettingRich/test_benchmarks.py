@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+import unittest
+from benchmarks import compare_results, main, run_benchmarks, synthetic_ohlcv
+
+class Test_Benchmarks(unittest.TestCase):
+    def test_synthetic_ohlcv(self):
+        df = synthetic_ohlcv(500)
+        self.assertEqual(['Open', 'High', 'Low', 'Close', 'Volume'], list(df.columns))
+        self.assertTrue((df['High'] >= df[['Open', 'Close']].max(axis=1)).all())
+        self.assertTrue((df['Low'] <= df[['Open', 'Close']].min(axis=1)).all())
+
+    def test_run_benchmarks(self):
+        report = run_benchmarks([1000, 2000], ['backtest_arrays', 'STCosi', 'kline_parsing'], repeats=1)
+        self.assertEqual(6, len(report['results']))
+        for result in report['results']:
+            self.assertGreater(result['seconds'], 0)
+            self.assertAlmostEqual(result['bars'] / result['seconds'], result['bars_per_sec'])
+            self.assertGreater(result['peak_memory_mb'], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': [{'component': 'STCosi', 'bars': 1000, 'seconds': 1.0, 'peak_memory_mb': 10.0}]}
+        current = {'results': [{'component': 'STCosi', 'bars': 1000, 'seconds': 1.5, 'peak_memory_mb': 10.5},
+                               {'component': 'STCosi', 'bars': 2000, 'seconds': 9.0, 'peak_memory_mb': 90.0}]}
+        regressions = compare_results(current, baseline, time_threshold=0.2)
+        self.assertEqual([('STCosi', 1000, 'seconds')], [(r['component'], r['bars'], r['metric']) for r in regressions])
+
+    def test_main_saves_and_compares(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, 'bench.json')
+            self.assertEqual(0, main(['--sizes', '1000', '--components', 'STCosi', '--repeats', '1', '--output', output]))
+            with open(output) as f:
+                report = json.load(f)
+            report['results'][0]['seconds'] /= 100
+            baseline = os.path.join(tmp_dir, 'baseline.json')
+            with open(baseline, 'w') as f:
+                json.dump(report, f)
+            self.assertEqual(1, main(['--sizes', '1000', '--components', 'STCosi', '--repeats', '1', '--baseline', baseline]))
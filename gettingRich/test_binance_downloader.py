@@ -0,0 +1,158 @@
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from binanceData import KLINE_COLUMNS, KlineColumnsBuilder, decode_klines_page, get_binance_historical_data, klines_to_columns, klines_to_dataframe
+import binance_downloader
+from binance_downloader import INTERVAL_MS, WeightLimiter, download_klines, get_binance_historical_data_concurrent, page_ranges
+
+MINUTE = INTERVAL_MS['1m']
+
+def fake_kline(open_time):
+    price = 100 + (open_time // MINUTE) % 50
+    return [open_time, str(price), str(price + 1), str(price - 1), str(price + 0.5), '10.5', open_time + MINUTE - 1,
+            '1050.0', 7, '5.0', '500.0', '0']
+
+class FakeBinanceHandler(BaseHTTPRequestHandler):
+    # the server answers /fapi/v1/klines like Binance, rate limiting the first rate_limited_requests calls
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            rate_limited = server.requests <= server.rate_limited_requests
+
+        if rate_limited:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            self.wfile.write(b'{"code":-1003,"msg":"Too many requests"}')
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        start_time = int(query['startTime'][0])
+        end_time = int(query['endTime'][0])
+        limit = int(query['limit'][0])
+        first_open = -(-start_time // MINUTE) * MINUTE
+        klines = [fake_kline(t) for t in range(first_open, end_time + 1, MINUTE)][:limit]
+
+        body = json.dumps(klines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-MBX-USED-WEIGHT-1M', str(server.requests * 10))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Test_BinanceDownloader(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBinanceHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.rate_limited_requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_page_ranges_cover_range_without_overlap(self):
+        ranges = page_ranges('1m', 0, 4000 * MINUTE)
+        self.assertEqual([(0, 1500 * MINUTE - 1), (1500 * MINUTE, 3000 * MINUTE - 1), (3000 * MINUTE, 4000 * MINUTE)], ranges)
+        with self.assertRaises(ValueError):
+            page_ranges('1M', 0, 1)
+
+    def test_download_is_complete_sorted_and_unique(self):
+        start, end = 7 * MINUTE, 5000 * MINUTE
+        klines = download_klines('BTCUSDT', '1m', start, end, base_url=self.base_url, max_workers=4)
+
+        self.assertEqual(list(range(start, end + 1, MINUTE)), list(klines['open_time']))
+        self.assertEqual('int64', str(klines['number_of_trades'].dtype))
+        self.assertEqual(4, self.server.requests)
+
+    def test_closes_only_its_own_session(self):
+        session = binance_downloader.create_session(2)
+        with mock.patch.object(session, 'close') as close:
+            download_klines('BTCUSDT', '1m', 0, 10 * MINUTE, base_url=self.base_url, session=session)
+        close.assert_not_called()
+        session.close()
+
+        created = binance_downloader.create_session(2)
+        with mock.patch.object(binance_downloader, 'create_session', return_value=created), \
+                mock.patch.object(created, 'close') as close:
+            download_klines('BTCUSDT', '1m', 0, 10 * MINUTE, base_url=self.base_url)
+        close.assert_called_once()
+
+    def test_retries_after_rate_limit(self):
+        self.server.rate_limited_requests = 2
+        df = get_binance_historical_data_concurrent('BTCUSDT', '1m', 0, 3000 * MINUTE, base_url=self.base_url, max_workers=2)
+
+        self.assertEqual(3001, len(df))
+        self.assertEqual('float64', str(df['close'].dtype))
+        self.assertTrue(df['open_time'].is_monotonic_increasing)
+
+    def test_get_binance_historical_data_decodes_pages(self):
+        df = get_binance_historical_data('BTCUSDT', '1m', 0, 3200 * MINUTE, base_url=self.base_url)
+        expected = klines_to_dataframe([fake_kline(t) for t in range(0, 3200 * MINUTE + 1, MINUTE)])
+        pd.testing.assert_frame_equal(expected, df)
+
+    def test_cached_data_comes_from_base_url(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            df = get_binance_historical_data('BTCUSDT', '1m', 0, 3200 * MINUTE, cache_dir=cache_dir, base_url=self.base_url)
+            self.assertEqual(3, self.server.requests)
+            expected = klines_to_dataframe([fake_kline(t) for t in range(0, 3200 * MINUTE + 1, MINUTE)])
+            np.testing.assert_array_equal(expected['close'], df['close'])
+
+class Test_KlineDecoding(unittest.TestCase):
+    def test_decode_matches_json_parsing(self):
+        klines = [[1704067200000, "42283.58000000", "42554.57000000", "42261.02000000", "42475.23000000", "1271.68108000",
+                   1704070799999, "53957248.97378930", 47134, "682.57581000", "28957416.81963220", "0"],
+                  [1704070800000, "42475.23", "42775.00", "42431.65", "42613.56", "1196.37856", 1704074399999,
+                   "50968729.25", 44153, "580.08", "24720340.41", "0"]]
+        raw = json.dumps(klines, separators=(',', ':')).encode()
+
+        page = decode_klines_page(raw)
+        builder = KlineColumnsBuilder(capacity=1)
+        builder.append_page(page)
+        builder.append_page(decode_klines_page(b'[]'))
+
+        expected = klines_to_columns(json.loads(raw))
+        for column in KLINE_COLUMNS:
+            np.testing.assert_array_equal(expected[column], builder.to_columns()[column])
+            self.assertEqual(expected[column].dtype, builder.to_columns()[column].dtype)
+
+class Test_WeightLimiter(unittest.TestCase):
+    def test_waits_for_next_minute_when_over_limit(self):
+        now = [120.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = WeightLimiter(limit_per_minute=30, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire(10)
+
+        self.assertEqual([60.0], sleeps)
+
+    def test_block_for_pauses_all_requests(self):
+        now = [0.0]
+        sleeps = []
+        limiter = WeightLimiter(clock=lambda: now[0], sleep=lambda s: (sleeps.append(s), now.__setitem__(0, now[0] + s)))
+        limiter.block_for(5)
+        limiter.acquire(10)
+        self.assertEqual([5.0], sleeps)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from binanceData import klines_to_columns, klines_to_dataframe
+from candle_cache import CandleCache, merge_ranges, missing_ranges
+from test_binance_downloader import MINUTE, fake_kline
+
+class FakeFetch:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, interval, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        first_open = -(-start_date // MINUTE) * MINUTE
+        return klines_to_columns([fake_kline(t) for t in range(first_open, end_date + 1, MINUTE)])
+
+class Test_CandleCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fetch = FakeFetch()
+        self.cache = CandleCache(self.tmp_dir.name, fetch=self.fetch, clock=lambda: 10_000 * MINUTE / 1000)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ranges(self):
+        self.assertEqual([(0, 20), (30, 40)], merge_ranges([(10, 20), (0, 9), (30, 40)]))
+        self.assertEqual([(0, 9), (21, 29), (41, 50)], missing_ranges([(10, 20), (30, 40)], 0, 50))
+        self.assertEqual([], missing_ranges([(0, 100)], 10, 20))
+
+    def test_get_matches_dataframe_layout(self):
+        df = self.cache.get('BTCUSDT', '1m', 0, 100 * MINUTE)
+        expected = klines_to_dataframe([fake_kline(t) for t in range(0, 100 * MINUTE + 1, MINUTE)])
+        pd.testing.assert_frame_equal(expected, df)
+
+    def test_repeat_request_does_not_fetch(self):
+        self.cache.get('BTCUSDT', '1m', 0, 100 * MINUTE)
+        self.cache.get('BTCUSDT', '1m', 10 * MINUTE, 50 * MINUTE)
+        self.assertEqual([(0, 100 * MINUTE)], self.fetch.calls)
+
+    def test_fetches_only_leading_interior_and_trailing_gaps(self):
+        self.cache.get('BTCUSDT', '1m', 100 * MINUTE, 200 * MINUTE)
+        self.cache.get('BTCUSDT', '1m', 300 * MINUTE, 400 * MINUTE)
+        self.fetch.calls.clear()
+
+        df = self.cache.get('BTCUSDT', '1m', 50 * MINUTE, 450 * MINUTE)
+
+        self.assertEqual([(50 * MINUTE, 100 * MINUTE - 1), (200 * MINUTE + 1, 300 * MINUTE - 1), (400 * MINUTE + 1, 450 * MINUTE)],
+                         self.fetch.calls)
+        self.assertEqual(401, len(df))
+        self.assertTrue(df['open_time'].is_unique and df['open_time'].is_monotonic_increasing)
+
+    def test_view_is_read_only_and_zero_copy(self):
+        self.cache.update('ETHUSDT', '1m', 0, 100 * MINUTE)
+        view = self.cache.view('ETHUSDT', '1m', 10 * MINUTE, 20 * MINUTE)
+
+        self.assertEqual(11, len(view['close']))
+        self.assertIsInstance(view['close'].base, np.memmap)
+        with self.assertRaises(ValueError):
+            view['close'][0] = 1.0
+
+    def test_open_candle_is_not_cached(self):
+        df = self.cache.get('BTCUSDT', '1m', 9_990 * MINUTE, 10_000 * MINUTE)
+        self.assertEqual(10, len(df))
+        self.assertEqual([(9_990 * MINUTE, 10_000 * MINUTE - 1)], self.cache.coverage('BTCUSDT', '1m'))
+
+    def test_update_swaps_a_complete_version(self):
+        self.cache.update('BTCUSDT', '1m', 0, 100 * MINUTE)
+        old_view = self.cache.view('BTCUSDT', '1m', 0, 200 * MINUTE)
+        self.cache.update('BTCUSDT', '1m', 0, 200 * MINUTE)
+
+        directory = os.path.join(self.tmp_dir.name, 'BTCUSDT', '1m')
+        with open(os.path.join(directory, 'coverage.json')) as f:
+            manifest = json.load(f)
+        # one version directory with every column, the previous one removed
+        self.assertEqual(sorted([manifest['version'], 'coverage.json']), sorted(os.listdir(directory)))
+        self.assertEqual(12, len(os.listdir(os.path.join(directory, manifest['version']))))
+        new_view = self.cache.view('BTCUSDT', '1m', 0, 200 * MINUTE)
+        self.assertTrue(all(len(values) == 201 for values in new_view.values()))
+        # a reader holding the previous version keeps consistent columns
+        self.assertTrue(all(len(values) == 101 for values in old_view.values()))
+
+    def test_reads_unversioned_cache(self):
+        directory = os.path.join(self.tmp_dir.name, 'BTCUSDT', '1m')
+        os.makedirs(directory)
+        columns = klines_to_columns([fake_kline(t) for t in range(0, 11 * MINUTE, MINUTE)])
+        for column, values in columns.items():
+            np.save(os.path.join(directory, f'{column}.npy'), values)
+        with open(os.path.join(directory, 'coverage.json'), 'w') as f:
+            json.dump([[0, 10 * MINUTE]], f)
+
+        self.assertEqual(11, len(self.cache.view('BTCUSDT', '1m', 0, 10 * MINUTE)['close']))
+        df = self.cache.get('BTCUSDT', '1m', 0, 20 * MINUTE)
+        self.assertEqual(21, len(df))
+        self.assertEqual([(10 * MINUTE + 1, 20 * MINUTE)], self.fetch.calls)
+        self.assertFalse(os.path.exists(os.path.join(directory, 'open_time.npy')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import pandas as pd
+from evaluation import (METRIC_NAMES, calc_annualized_return, calc_annualized_sharpe, calc_calmar, calc_downside_deviation,
+                        calc_max_drawdown, calc_metrics, calc_metrics_table, calc_sortino, calc_total_return)
+
+def reference_metrics(portfolio_values: pd.Series, rf=0.0):
+    """
+    The pandas formulas the metric functions were originally written with.
+    """
+    yearly_trading_days = 252
+    annualized_return = (portfolio_values.iloc[-1] / portfolio_values.iloc[0])**(yearly_trading_days / len(portfolio_values)) - 1.0
+    returns = portfolio_values.pct_change()
+    annualized_std = returns.std() * np.sqrt(yearly_trading_days)
+    down_deviation = returns.dropna()[returns.dropna() < 0].std() * np.sqrt(yearly_trading_days)
+    cumulative_max = portfolio_values.cummax()
+    max_drawdown = ((cumulative_max - portfolio_values) / cumulative_max).max()
+    return {
+        'total_return': portfolio_values.iloc[-1] / portfolio_values.iloc[0] - 1.0,
+        'annualized_return': annualized_return,
+        'annualized_sharpe': 0 if annualized_std == 0 else (annualized_return - rf) / annualized_std,
+        'sortino_ratio': 0 if down_deviation == 0 else (annualized_return - rf) / down_deviation,
+        'max_drawdown': max_drawdown,
+        'calmar_ratio': annualized_return / max_drawdown,
+    }
+
+def random_curves(curves, bars, seed=0):
+    rng = np.random.default_rng(seed)
+    return 1000 * np.cumprod(1 + rng.normal(0.0005, 0.02, (curves, bars)), axis=1)
+
+class Test_Evaluation(unittest.TestCase):
+    def test_wrappers_match_reference(self):
+        portfolio_values = pd.Series(random_curves(1, 500)[0])
+        expected = reference_metrics(portfolio_values, rf=0.01)
+        self.assertAlmostEqual(expected['total_return'], calc_total_return(portfolio_values), places=12)
+        self.assertAlmostEqual(expected['annualized_return'], calc_annualized_return(portfolio_values), places=12)
+        self.assertAlmostEqual(expected['annualized_sharpe'], calc_annualized_sharpe(portfolio_values, rf=0.01), places=12)
+        self.assertAlmostEqual(expected['sortino_ratio'], calc_sortino(portfolio_values, rf=0.01), places=12)
+        self.assertAlmostEqual(expected['max_drawdown'], calc_max_drawdown(portfolio_values), places=12)
+        self.assertAlmostEqual(expected['calmar_ratio'], calc_calmar(portfolio_values), places=12)
+        self.assertAlmostEqual(portfolio_values.pct_change().dropna().clip(upper=0).replace(0, np.nan).std(),
+                               calc_downside_deviation(portfolio_values), places=12)
+
+    def test_wrappers_match_calc_metrics(self):
+        wrappers = {'total_return': calc_total_return, 'annualized_return': calc_annualized_return,
+                    'annualized_sharpe': calc_annualized_sharpe, 'sortino_ratio': calc_sortino,
+                    'max_drawdown': calc_max_drawdown, 'calmar_ratio': calc_calmar}
+        # a rising curve, a flat one and one without losing bars
+        for curve in (random_curves(1, 300, seed=2)[0], np.full(50, 1000.0), 1000 * 1.01**np.arange(50)):
+            expected = calc_metrics(curve)[0]
+            for name, wrapper in wrappers.items():
+                np.testing.assert_allclose(expected[name], wrapper(pd.Series(curve)), rtol=1e-12, err_msg=name)
+
+    def test_batch_matches_single_curves(self):
+        portfolio_values = random_curves(20, 300, seed=1)
+        portfolio_values[3] = 1000.0  # flat curve, no volatility and no drawdown
+        metrics = calc_metrics(portfolio_values)
+        self.assertEqual(METRIC_NAMES, list(metrics.dtype.names))
+        self.assertEqual((20,), metrics.shape)
+
+        for i, curve in enumerate(portfolio_values):
+            with np.errstate(invalid='ignore'):
+                expected = reference_metrics(pd.Series(curve))
+            for name in METRIC_NAMES:
+                np.testing.assert_allclose(expected[name], metrics[name][i], rtol=1e-12, err_msg=name)
+
+        pd.testing.assert_frame_equal(pd.DataFrame(metrics), calc_metrics_table(portfolio_values))
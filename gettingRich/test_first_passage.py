@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+from backtesting import backtest_arrays, find_first_passage
+from models import ExitReason, PositionType, StrategySignal
+from trade_ledger import TradeLedger
+from test_backtesting import FixedSignalStrategy, random_ohlc, random_signals
+
+def reference_first_passage(data, signals, sl_rate, tp_rate, starting_balance, slippage_factor=5.0):
+    """
+    Bar by bar version of the first_passage mode, checking the levels on every bar.
+    """
+    slippage = (data['Close'] - data['Open']) / data['Open'] / slippage_factor
+    realistic = data['Open'] * (1 + slippage)
+    buy_prices = np.maximum(realistic, data['Open']).to_numpy()
+    sell_prices = np.minimum(realistic, data['Open']).to_numpy()
+    o, h, l = data['Open'].to_numpy(), data['High'].to_numpy(), data['Low'].to_numpy()
+    last_bar = len(signals) - 1
+    qty, balance, position = 0.0, float(starting_balance), None
+    qtys, balances = [], []
+    for i, signal in enumerate(signals):
+        if position is not None and signal == StrategySignal.DO_NOTHING and i != last_bar:
+            side, pos_qty, price = position
+            sl = price * (1 - side * sl_rate)
+            tp = price * (1 + side * tp_rate)
+            sl_hit = l[i] <= sl if side == 1 else h[i] >= sl
+            tp_hit = h[i] >= tp if side == 1 else l[i] <= tp
+            if sl_hit or tp_hit:
+                fill = (min(o[i], sl) if side == 1 else max(o[i], sl)) if sl_hit else (max(o[i], tp) if side == 1 else min(o[i], tp))
+                qty, balance = qty - side * pos_qty, balance + side * pos_qty * fill
+                position = None
+        if i == last_bar and position is not None:
+            side, pos_qty, _ = position
+            fill = sell_prices[i] if side == 1 else buy_prices[i]
+            qty, balance = qty - side * pos_qty, balance + side * pos_qty * fill
+        elif signal == StrategySignal.ENTER_LONG:
+            position = (1, balance / buy_prices[i], buy_prices[i])
+            qty, balance = qty + position[1], balance - position[1] * buy_prices[i]
+        elif signal == StrategySignal.ENTER_SHORT:
+            position = (-1, balance / sell_prices[i], sell_prices[i])
+            qty, balance = qty - position[1], balance + position[1] * sell_prices[i]
+        elif signal in (StrategySignal.CLOSE_LONG, StrategySignal.CLOSE_SHORT) and position is not None:
+            side, pos_qty, _ = position
+            fill = sell_prices[i] if side == 1 else buy_prices[i]
+            qty, balance = qty - side * pos_qty, balance + side * pos_qty * fill
+            position = None
+        qtys.append(qty)
+        balances.append(balance)
+    return np.array(qtys), np.array(balances)
+
+class Test_FirstPassage(unittest.TestCase):
+    def test_find_first_passage(self):
+        o = np.array([100.0, 100.0, 100.0, 100.0])
+        h = np.array([101.0, 104.0, 111.0, 101.0])
+        l = np.array([99.0, 96.0, 94.0, 99.0])
+        self.assertEqual((2, 110.0, ExitReason.TAKE_PROFIT), find_first_passage(o, h, l, PositionType.LONG, None, 110.0))
+        self.assertEqual((2, 95.0, ExitReason.STOP_LOSS), find_first_passage(o, h, l, PositionType.LONG, 95.0, 110.0))
+        self.assertEqual((1, 104.0, ExitReason.STOP_LOSS), find_first_passage(o, h, l, PositionType.SHORT, 104.0, 90.0))
+        self.assertIsNone(find_first_passage(o, h, l, PositionType.LONG, 90.0, 120.0))
+        # a gap through the stop fills at the open
+        self.assertEqual((0, 100.0, ExitReason.STOP_LOSS), find_first_passage(o, h, l, PositionType.SHORT, 99.5, None))
+
+    def test_matches_bar_by_bar_reference(self):
+        for seed in range(5):
+            data = random_ohlc(500, seed=seed)
+            signals = random_signals(500, seed=seed)
+            ledger = TradeLedger()
+            b_df = backtest_arrays(data.copy(), FixedSignalStrategy(signals, sl_rate=0.02, tp_rate=0.03), 10000,
+                                   ledger=ledger, sl_tp_mode='first_passage')
+            qty, balance = reference_first_passage(data, signals, 0.02, 0.03, 10000)
+            np.testing.assert_allclose(qty, b_df['qty'].to_numpy())
+            np.testing.assert_allclose(balance, b_df['balance'].to_numpy())
+            self.assertGreater(ledger.stats()['stop_loss_exits'], 0)
+            self.assertGreater(ledger.stats()['take_profit_exits'], 0)
+
+    def test_without_levels_matches_legacy_on_clean_signals(self):
+        data = random_ohlc(300, seed=4)
+        signals = [StrategySignal.DO_NOTHING] * 300
+        for start in range(10, 280, 40):
+            signals[start] = StrategySignal.ENTER_LONG if start % 80 == 10 else StrategySignal.ENTER_SHORT
+            signals[start + 20] = StrategySignal.CLOSE_LONG
+        legacy = backtest_arrays(data.copy(), FixedSignalStrategy(signals), 10000, commission=1.0)
+        first_passage = backtest_arrays(data.copy(), FixedSignalStrategy(signals), 10000, commission=1.0, sl_tp_mode='first_passage')
+        # legacy keeps the last closed position around and closes it once more on the final bar
+        np.testing.assert_allclose(legacy['portfolio_value'].to_numpy()[:-1], first_passage['portfolio_value'].to_numpy()[:-1])
+        self.assertAlmostEqual(first_passage['portfolio_value'].iloc[-2], first_passage['portfolio_value'].iloc[-1])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            backtest_arrays(random_ohlc(10), FixedSignalStrategy(random_signals(10)), 10000, sl_tp_mode='intrabar')
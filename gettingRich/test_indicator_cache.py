@@ -0,0 +1,95 @@
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from indicator_cache import CachedIndicators, IndicatorCache, fingerprint
+from indicators import average_true_range, stc, utbot_trailing_stop
+from strategies import best_crypto_strat
+from test_backtesting import random_ohlc
+
+class Test_IndicatorCache(unittest.TestCase):
+    def setUp(self):
+        data = random_ohlc(600, seed=3)
+        self.close, self.high, self.low = (data[c].to_numpy() for c in ('Close', 'High', 'Low'))
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint(self.close), fingerprint(self.close.copy()))
+        self.assertNotEqual(fingerprint(self.close), fingerprint(self.close.astype(np.float32)))
+        self.assertNotEqual(fingerprint(self.close, self.high), fingerprint(self.high, self.close))
+
+    def test_matches_indicators(self):
+        indicators = CachedIndicators(self.close, self.high, self.low)
+        np.testing.assert_array_equal(average_true_range(self.close, self.high, self.low, 14), indicators.atr(14))
+        np.testing.assert_array_equal(
+            utbot_trailing_stop(self.close, 2 * average_true_range(self.close, self.high, self.low, 30), pine_downtrend=True),
+            indicators.utbot_trailing_stop(2, 30, pine_downtrend=True))
+        np.testing.assert_allclose(stc(self.close, 27, 50, 80, 0.5), indicators.stc(27, 50, 80, 0.5))
+        self.assertFalse(indicators.atr(14).flags.writeable)
+
+    def test_grid_shares_intermediates(self):
+        cache = IndicatorCache()
+        for key_value in (1, 2, 3):
+            for atr_length in (10, 20):
+                CachedIndicators(self.close, self.high, self.low, cache).utbot_trailing_stop(key_value, atr_length)
+        for stc_length in (10, 20, 30):
+            CachedIndicators(self.close, cache=cache).stc(12, 26, stc_length)
+        self.assertEqual(1, cache.computed['true_range'])
+        self.assertEqual(2, cache.computed['atr'])
+        self.assertEqual(6, cache.computed['utbot_trailing_stop'])
+        self.assertEqual(2, cache.computed['ema'])
+        self.assertEqual(1, cache.computed['macd_diff'])
+        self.assertEqual(3, cache.computed['stc'])
+
+        # the same candles again is all hits
+        before = sum(cache.computed.values())
+        CachedIndicators(self.close.copy(), self.high, self.low, cache).utbot_trailing_stop(2.0, 20)
+        self.assertEqual(before, sum(cache.computed.values()))
+
+    def test_lru_eviction(self):
+        cache = IndicatorCache(max_bytes=3 * self.close.nbytes)
+        indicators = CachedIndicators(self.close, cache=cache)
+        for span in (5, 10, 15):
+            indicators.ema(span)
+        indicators.ema(5)
+        indicators.ema(20)
+        self.assertEqual(3, len(cache))
+        self.assertEqual(1, cache.evictions)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        # span 10 was the least recently used, span 5 is still cached
+        indicators.ema(5)
+        indicators.ema(10)
+        self.assertEqual(5, cache.computed['ema'])
+
+    def test_disk_tier_and_pickling(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = IndicatorCache(cache_dir=cache_dir)
+            expected = CachedIndicators(self.close, self.high, self.low, cache).atr(14)
+
+            copy = pickle.loads(pickle.dumps(cache))
+            self.assertEqual(0, len(copy))
+            self.assertEqual(0, copy.nbytes)
+            np.testing.assert_array_equal(expected, CachedIndicators(self.close, self.high, self.low, copy).atr(14))
+            self.assertEqual(1, copy.disk_hits)
+
+            # evicted from memory, read back from disk
+            small = IndicatorCache(max_bytes=self.close.nbytes, cache_dir=cache_dir)
+            indicators = CachedIndicators(self.close, self.high, self.low, small)
+            indicators.atr(14)
+            indicators.true_range()
+            np.testing.assert_array_equal(expected, indicators.atr(14))
+            self.assertEqual(3, small.disk_hits)
+            self.assertEqual(0, sum(small.computed.values()))
+
+    def test_strategy_with_cache(self):
+        data = random_ohlc(600, seed=5)
+        cache = IndicatorCache()
+        expected = best_crypto_strat(buy_atr_length=50).calc_signal_array(data)
+        for sell_key_value in (1, 2, 3):
+            best_crypto_strat(buy_atr_length=50, sell_key_value=sell_key_value, indicator_cache=cache).calc_signal_array(data)
+        np.testing.assert_array_equal(expected, best_crypto_strat(buy_atr_length=50, indicator_cache=cache).calc_signal_array(data))
+        self.assertEqual(1, cache.computed['stc'])
+        self.assertEqual(2, cache.computed['atr'])
+        self.assertEqual(4, cache.computed['utbot_trailing_stop'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import pandas as pd
+import numpy as np
+from binanceData import TR, ATR, calc_TR, calc_ATR, calc_UTBot, STCosi
+from indicators import true_range, average_true_range, utbot_trailing_stop, utbot_trailing_stops, \
+    smooth_series, rolling_max, rolling_min, normalize_smooth, stc, stc_grid
+
+def random_klines(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.005, n)))
+    open_ = np.r_[30000, close[:-1]]
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, n)),
+        'close': close,
+    })
+
+def reference_trailing_stop(close, loss_threshold, initial_stop=np.nan, pine_downtrend=False):
+    # the original calc_UTBot loop
+    trailing_stop = [initial_stop] + [np.nan] * (len(close) - 1)
+    for i in range(1, len(close)):
+        if (close[i] > trailing_stop[i - 1]) & (close[i - 1] > trailing_stop[i - 1]):
+            trailing_stop[i] = max(trailing_stop[i - 1], close[i] - loss_threshold[i])
+        elif (close[i] < trailing_stop[i - 1]) & (close[i - 1] < trailing_stop[i - 1]):
+            down_stop = close[i] + loss_threshold[i] if pine_downtrend else close[i] - loss_threshold[i]
+            trailing_stop[i] = min(trailing_stop[i - 1], down_stop)
+        elif (close[i] > trailing_stop[i - 1]):
+            trailing_stop[i] = close[i] - loss_threshold[i]
+        else:
+            trailing_stop[i] = close[i] + loss_threshold[i]
+    return np.array(trailing_stop)
+
+def reference_smooth(srs, smoothing_f):
+    # the original SmoothSrs loop
+    smoothed_srs = srs.copy()
+    for i in range(1, len(smoothed_srs)):
+        if np.isnan(smoothed_srs[i-1]):
+            smoothed_srs[i] = srs[i]
+        else:
+            smoothed_srs[i] = smoothed_srs[i-1] + smoothing_f * (srs[i] - smoothed_srs[i-1])
+    return smoothed_srs
+
+def reference_norm_smooth(srs, stc_length, smoothing_factor):
+    # the original normNsmooth
+    lowest = srs.rolling(stc_length).min()
+    highestRange = srs.rolling(stc_length).max() - lowest
+    normalizedsrs = srs.copy()
+    normalizedsrs[highestRange > 0] = ((srs - lowest) / highestRange * 100)*(highestRange > 0)
+    normalizedsrs[highestRange <= 0] = np.nan
+    normalizedsrs = normalizedsrs.ffill()
+    return reference_smooth(normalizedsrs, smoothing_factor)
+
+def reference_stc(srs, fast_length, slow_length, stc_length, smoothing_factor=0.5):
+    macd = srs.ewm(span=fast_length).mean() - srs.ewm(span=slow_length).mean()
+    return reference_norm_smooth(reference_norm_smooth(macd, stc_length, smoothing_factor), stc_length, smoothing_factor)
+
+class Test_UTBotKernel(unittest.TestCase):
+    def setUp(self):
+        self.df = random_klines(2000, seed=3)
+        self.close = self.df['close'].to_numpy()
+        self.high = self.df['high'].to_numpy()
+        self.low = self.df['low'].to_numpy()
+
+    def test_true_range_and_atr_match_pandas_versions(self):
+        expected_tr = TR(self.df['close'], self.df['high'], self.df['low'])
+        np.testing.assert_array_equal(expected_tr.to_numpy(), true_range(self.close, self.high, self.low))
+        np.testing.assert_array_equal(ATR(expected_tr, 14).to_numpy(), average_true_range(self.close, self.high, self.low, 14))
+
+    def test_trailing_stop_matches_reference_loop(self):
+        loss_threshold = 2 * average_true_range(self.close, self.high, self.low, 10)
+        for pine_downtrend in (False, True):
+            np.testing.assert_array_equal(reference_trailing_stop(list(self.close), list(loss_threshold), pine_downtrend=pine_downtrend),
+                                          utbot_trailing_stop(self.close, loss_threshold, pine_downtrend=pine_downtrend))
+
+    def test_batch_matches_single(self):
+        key_values = [1.0, 2.0, 2.0, 3.5]
+        atr_lengths = [1, 10, 300, 10]
+        trailing_stops = utbot_trailing_stops(self.close, self.high, self.low, key_values, atr_lengths, pine_downtrend=True)
+
+        self.assertEqual((4, 2000), trailing_stops.shape)
+        for k, (key_value, atr_length) in enumerate(zip(key_values, atr_lengths)):
+            loss_threshold = key_value * average_true_range(self.close, self.high, self.low, atr_length)
+            np.testing.assert_array_equal(utbot_trailing_stop(self.close, loss_threshold, pine_downtrend=True), trailing_stops[k])
+
+    def test_calc_UTBot_uses_kernel(self):
+        df = calc_ATR(calc_TR(self.df.copy()), 15)
+        df = calc_UTBot(df, key_value=1, atr_length=15)
+        expected = reference_trailing_stop(list(df['close']), list(df['loss_threshold']))
+        np.testing.assert_array_equal(expected, df['trailing_stop'].to_numpy())
+        self.assertTrue(df['buy'].sum() > 0)
+
+class Test_STC(unittest.TestCase):
+    def setUp(self):
+        self.close = random_klines(1500, seed=5)['close']
+
+    def test_smooth_series_matches_reference_with_nan_runs(self):
+        srs = pd.Series(np.random.default_rng(1).normal(size=300))
+        srs[[0, 1, 50, 51, 52, 200]] = np.nan
+        np.testing.assert_allclose(reference_smooth(srs.copy(), 0.3).to_numpy(), smooth_series(srs.to_numpy(), 0.3), rtol=1e-12)
+
+    def test_rolling_min_max_match_pandas(self):
+        srs = pd.Series(np.random.default_rng(2).normal(size=503))
+        srs[[10, 300]] = np.nan
+        for window in (1, 2, 7, 80, 503, 600):
+            np.testing.assert_array_equal(srs.rolling(window).max().to_numpy(), rolling_max(srs.to_numpy(), window))
+            np.testing.assert_array_equal(srs.rolling(window).min().to_numpy(), rolling_min(srs.to_numpy(), window))
+
+    def test_normalize_smooth_with_flat_windows(self):
+        srs = pd.Series(np.r_[np.full(30, 5.0), np.random.default_rng(3).normal(size=200), np.full(30, 1.0)])
+        np.testing.assert_allclose(reference_norm_smooth(srs, 10, 0.5).to_numpy(), normalize_smooth(srs.to_numpy(), 10, 0.5), rtol=1e-9)
+
+    def test_stc_matches_reference(self):
+        expected = reference_stc(self.close, 23, 50, 10, 0.5).to_numpy()
+        np.testing.assert_allclose(expected, stc(self.close.to_numpy(), 23, 50, 10, 0.5), rtol=1e-9)
+        np.testing.assert_allclose(expected, STCosi(self.close, 23, 50, 10, 0.5).to_numpy(), rtol=1e-9)
+
+    def test_stc_grid_matches_single_stc(self):
+        results = stc_grid(self.close.to_numpy(), [12, 27], [50], [10, 80], [0.5, 0.25])
+        self.assertEqual(8, len(results))
+        for (fast_length, slow_length, stc_length, smoothing_factor), values in results.items():
+            np.testing.assert_array_equal(stc(self.close.to_numpy(), fast_length, slow_length, stc_length, smoothing_factor), values)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from backtesting import backtest_trades
+from evaluation import METRIC_NAMES, calc_metrics
+from monte_carlo import block_bootstrap_indices, equity_paths, metric_intervals, monte_carlo, resample_paths, trade_returns
+from test_backtesting import FixedSignalStrategy, random_ohlc, random_signals
+
+class Test_MonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.returns = np.random.default_rng(0).normal(0.001, 0.02, 300)
+
+    def test_block_bootstrap_indices_are_circular_blocks(self):
+        indices = block_bootstrap_indices(10, 50, 4, np.random.default_rng(1))
+        self.assertEqual((50, 10), indices.shape)
+        # inside every block the index steps by one, wrapping from 9 to 0
+        steps = (np.diff(indices, axis=1) % 10)[:, [0, 1, 2, 4, 5, 6, 8]]
+        self.assertTrue((steps == 1).all())
+
+        whole = block_bootstrap_indices(10, 5, 10, np.random.default_rng(2))
+        self.assertTrue(all(sorted(row) == list(range(10)) for row in whole))
+
+    def test_equity_paths(self):
+        paths = equity_paths(np.array([[0.1, -0.5], [0.0, 1.0]]), starting_value=100)
+        np.testing.assert_allclose([[100, 110, 55], [100, 100, 200]], paths)
+
+    def test_trade_reshuffle_keeps_the_trades(self):
+        paths = resample_paths(self.returns, 'trade_reshuffle', 20, np.random.default_rng(3))
+        self.assertEqual((20, 301), paths.shape)
+        np.testing.assert_allclose(np.prod(1 + self.returns), paths[:, -1])
+        path_returns = paths[:, 1:] / paths[:, :-1] - 1
+        np.testing.assert_allclose(np.sort(np.broadcast_to(self.returns, (20, 300)), axis=1), np.sort(path_returns, axis=1))
+        self.assertGreater(np.unique(calc_metrics(paths)['max_drawdown']).size, 1)
+
+    def test_matches_metrics_of_the_generated_paths(self):
+        metrics = monte_carlo(self.returns, num_paths=250, block_size=5, batch_size=100, seed=7)
+        seeds = np.random.SeedSequence(7).spawn(3)
+        paths = np.vstack([resample_paths(self.returns, 'block_bootstrap', size, np.random.default_rng(seed), 5)
+                           for size, seed in zip((100, 100, 50), seeds)])
+        expected = calc_metrics(paths)
+        for name in METRIC_NAMES:
+            np.testing.assert_allclose(expected[name], metrics[name])
+
+    def test_workers_do_not_change_the_result(self):
+        serial = monte_carlo(self.returns, num_paths=300, batch_size=64, seed=5)
+        parallel = monte_carlo(self.returns, num_paths=300, batch_size=64, seed=5, workers=2)
+        np.testing.assert_array_equal(serial, parallel)
+
+    def test_ledger_input(self):
+        data = random_ohlc(400, seed=4)
+        _, ledger = backtest_trades(data, FixedSignalStrategy(random_signals(400, seed=4)), 1000, commission=1.0)
+        returns = trade_returns(ledger)
+        trades = ledger.trades
+        np.testing.assert_allclose(ledger.pnl()[0], returns[0] * trades['qty'][0] * trades['entry_price'][0])
+
+        metrics = monte_carlo(ledger, method='trade_bootstrap', num_paths=50, seed=1)
+        np.testing.assert_array_equal(monte_carlo(returns, method='trade_bootstrap', num_paths=50, seed=1), metrics)
+
+    def test_metric_intervals(self):
+        intervals = metric_intervals(monte_carlo(self.returns, num_paths=2000, seed=3), confidence=0.9)
+        self.assertEqual(METRIC_NAMES, list(intervals.index))
+        self.assertTrue((intervals['lower'] <= intervals['median']).all() and (intervals['median'] <= intervals['upper']).all())
+
+        # a constant return has no spread
+        constant = metric_intervals(monte_carlo(np.full(100, 0.01), num_paths=20, seed=0))
+        self.assertAlmostEqual(0.0, constant.loc['total_return', 'std'])
+        self.assertAlmostEqual(1.01**100 - 1, constant.loc['total_return', 'lower'])
+        self.assertTrue(np.isnan(constant.loc['calmar_ratio', 'mean']))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            monte_carlo(self.returns, method='jackknife')
+        with self.assertRaises(ValueError):
+            monte_carlo(np.array([]))
+        with self.assertRaises(ValueError):
+            metric_intervals(monte_carlo(self.returns, num_paths=10), confidence=1.5)
+
+if __name__ == '__main__':
+    unittest.main()
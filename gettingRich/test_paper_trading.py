@@ -0,0 +1,167 @@
+import math
+import unittest
+from unittest import mock
+import numpy as np
+import requests
+from backtesting import backtest_arrays
+from binanceData import klines_to_columns
+from strategies import best_crypto_strat
+from paper_trading import KlineReplayServer, LatencyHistogram, PaperTrader, poll_klines
+from trade_ledger import TradeLedger
+from test_backtesting import random_ohlc
+from test_binance_downloader import MINUTE
+from test_sweep import MovingAverageCrossStrategy
+
+def ohlc_klines(data, first_open=0):
+    # the candles of a backtest DataFrame as kline columns, one minute apart
+    open_times = first_open + MINUTE * np.arange(len(data))
+    return klines_to_columns([[t, o, h, l, c, v, t + MINUTE - 1, c * v, 10, v / 2, c * v / 2, 0]
+                              for t, o, h, l, c, v in zip(open_times.tolist(), *(data[col].tolist() for col in
+                                                                                  ('Open', 'High', 'Low', 'Close', 'Volume')))])
+
+class Test_LatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram(min_seconds=1e-4, max_seconds=10, buckets_per_decade=10)
+        for seconds in np.linspace(0.001, 0.1, 100):
+            histogram.record(seconds)
+        summary = histogram.summary()
+        self.assertEqual(100, summary['count'])
+        self.assertAlmostEqual(0.0505, summary['mean'])
+        # accurate to one bucket, a factor of 10 ** 0.1
+        self.assertTrue(0.05 <= summary['p50'] <= 0.05 * 10**0.1)
+        self.assertEqual(0.1, summary['max'])
+        self.assertEqual(100, histogram.to_frame()['count'].sum())
+
+        histogram.record(100.0)
+        self.assertEqual(100.0, histogram.percentile(100))
+        self.assertTrue(math.isnan(LatencyHistogram().percentile(50)))
+
+class Test_KlineReplayServer(unittest.TestCase):
+    def setUp(self):
+        self.data = random_ohlc(300, seed=2)
+        self.candles = {('BTCUSDT', '1m'): ohlc_klines(self.data)}
+
+    def test_serves_candles_up_to_the_replay_clock(self):
+        now = [0.0]
+        replay = KlineReplayServer(self.candles, speed=60, clock=lambda: now[0])
+        with replay:
+            # 10 seconds at 60x is 10 minutes, candle 10 is forming
+            now[0] = 10.0
+            klines = requests.get(f'{replay.base_url}/fapi/v1/klines', params={'symbol': 'BTCUSDT', 'interval': '1m', 'startTime': 0}).json()
+            self.assertEqual(11, len(klines))
+            self.assertEqual([9 * MINUTE, str(self.data['Open'][9])], klines[9][:2])
+            self.assertEqual(10 * MINUTE, requests.get(f'{replay.base_url}/fapi/v1/time').json()['serverTime'])
+
+            latest = replay.klines('BTCUSDT', '1m', limit=3)
+            self.assertEqual([8 * MINUTE, 9 * MINUTE, 10 * MINUTE], [kline[0] for kline in latest])
+            self.assertEqual(400, requests.get(f'{replay.base_url}/fapi/v1/klines', params={'symbol': 'ETHUSDT', 'interval': '1m'}).status_code)
+            self.assertAlmostEqual(10.0, replay.wall_time(10 * MINUTE))
+
+    def test_poll_holds_back_the_forming_candle(self):
+        now = [0.0]
+        replay = KlineReplayServer(self.candles, speed=60, clock=lambda: now[0])
+
+        def advance(seconds):
+            now[0] += 5.0
+
+        with replay:
+            feed = poll_klines(replay.base_url, 'BTCUSDT', '1m', 0, end_time=20 * MINUTE, clock=replay, sleep=advance)
+            klines = [(int(kline[0]), closed_at) for kline, closed_at in feed]
+        self.assertEqual([i * MINUTE for i in range(21)], [open_time for open_time, _ in klines])
+        self.assertEqual([i + 1.0 for i in range(21)], [closed_at for _, closed_at in klines])
+
+    def test_poll_stops_at_an_unaligned_end_time(self):
+        now = [0.0]
+        replay = KlineReplayServer(self.candles, speed=60, clock=lambda: now[0])
+
+        def advance(seconds):
+            now[0] += 5.0
+
+        with replay:
+            # ends with the candle opening at 10 minutes, once it closed
+            feed = poll_klines(replay.base_url, 'BTCUSDT', '1m', 0, end_time=10 * MINUTE + 30_000, clock=replay, sleep=advance)
+            open_times = [int(kline[0]) for kline, _ in feed]
+        self.assertEqual([i * MINUTE for i in range(11)], open_times)
+
+    def test_poll_stops_past_the_last_candle(self):
+        for speed in (60, math.inf):
+            with self.subTest(speed=speed):
+                now = [0.0]
+                replay = KlineReplayServer(self.candles, speed=speed, clock=lambda: now[0])
+
+                def advance(seconds):
+                    now[0] += 5.0
+
+                with replay:
+                    feed = poll_klines(replay.base_url, 'BTCUSDT', '1m', 250 * MINUTE, end_time=1000 * MINUTE, clock=replay, sleep=advance)
+                    open_times = [int(kline[0]) for kline, _ in feed]
+                self.assertEqual([i * MINUTE for i in range(250, 300)], open_times)
+
+    def test_poll_closes_only_its_own_session(self):
+        with KlineReplayServer(self.candles, speed=math.inf) as replay:
+            session = requests.Session()
+            with mock.patch('paper_trading.requests.Session', return_value=session), mock.patch.object(session, 'close') as close:
+                feed = poll_klines(replay.base_url, 'BTCUSDT', '1m', 0, clock=replay)
+                next(feed)
+                # abandoned mid-stream
+                feed.close()
+            close.assert_called_once()
+
+            with mock.patch.object(session, 'close') as close:
+                feed = poll_klines(replay.base_url, 'BTCUSDT', '1m', 0, clock=replay, session=session)
+                next(feed)
+                feed.close()
+            close.assert_not_called()
+            session.close()
+
+class Test_PaperTrader(unittest.TestCase):
+    def test_matches_backtest_arrays(self):
+        data = random_ohlc(400, seed=6)
+        strategy = MovingAverageCrossStrategy(5, 20, sl_rate=0.03, tp_rate=0.05)
+        expected_ledger = TradeLedger()
+        expected = backtest_arrays(data.copy(), strategy, 1000, commission=1.0, ledger=expected_ledger)
+
+        ledger = TradeLedger()
+        trader = PaperTrader(strategy, 1000, lookback=25, commission=1.0, ledger=ledger)
+        with KlineReplayServer({('BTCUSDT', '1m'): ohlc_klines(data)}, speed=math.inf) as replay:
+            report = trader.run(poll_klines(replay.base_url, 'BTCUSDT', '1m', 0, end_time=399 * MINUTE, clock=replay))
+
+        curve = trader.equity_curve()
+        self.assertEqual(400, report['bars'])
+        self.assertEqual(400, report['latency']['count'])
+        # the backtest closes the position on its last bar, the paper trader keeps it
+        for column in ('strategy_signal', 'qty', 'balance', 'portfolio_value'):
+            np.testing.assert_allclose(expected[column].to_numpy()[:-1], curve[column].to_numpy()[:-1])
+        np.testing.assert_array_equal(expected_ledger.trades[:-1], ledger.trades[:len(expected_ledger) - 1])
+
+    def test_signal_stream_matches_backtest_arrays(self):
+        data = random_ohlc(1500, seed=8)
+        strategy = best_crypto_strat(buy_atr_length=20, stc_length=30, sl_rate=0.05)
+        expected = backtest_arrays(data.copy(), strategy, 1000, commission=1.0)
+
+        # no window, so the EMAs and trailing stops see the whole history
+        trader = PaperTrader(strategy, 1000, lookback=10, commission=1.0)
+        columns = ohlc_klines(data)
+        for kline in zip(*(columns[column].tolist() for column in columns)):
+            trader.on_kline(kline)
+        self.assertEqual(0, len(trader.window))
+
+        curve = trader.equity_curve()
+        self.assertGreater(np.count_nonzero(curve['strategy_signal']), 2)
+        for column in ('strategy_signal', 'qty', 'balance', 'portfolio_value'):
+            np.testing.assert_allclose(expected[column].to_numpy()[:-1], curve[column].to_numpy()[:-1])
+
+    def test_accelerated_replay_latency(self):
+        data = random_ohlc(60, seed=1)
+        trader = PaperTrader(MovingAverageCrossStrategy(3, 10), 1000, lookback=20)
+        # a one minute candle closes every 20ms
+        with KlineReplayServer({('BTCUSDT', '1m'): ohlc_klines(data)}, speed=3000) as replay:
+            report = trader.run(poll_klines(replay.base_url, 'BTCUSDT', '1m', 0, clock=replay, poll_interval=0.005), max_bars=30)
+
+        self.assertEqual(30, report['bars'])
+        self.assertGreater(report['latency']['p50'], 0)
+        self.assertLess(report['latency']['p50'], 1.0)
+        self.assertLessEqual(report['decision_time']['max'], report['latency']['max'] + 1e-3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+import pandas as pd
+from backtesting import backtest_arrays
+from models import StrategySignal
+from portfolio_backtesting import align_assets, build_portfolio_signals, portfolio_backtest
+from test_backtesting import FixedSignalStrategy, random_ohlc
+from test_sweep import MovingAverageCrossStrategy
+
+def clean_signals(n, seed):
+    # alternating entries and closes, never entering on top of a position
+    rng = np.random.default_rng(seed)
+    signals = [StrategySignal.DO_NOTHING] * n
+    bar = int(rng.integers(0, 10))
+    while bar + 2 < n - 1:
+        signals[bar] = StrategySignal.ENTER_LONG if rng.random() < 0.5 else StrategySignal.ENTER_SHORT
+        bar += int(rng.integers(1, 15))
+        if bar >= n - 1:
+            break
+        signals[bar] = StrategySignal.CLOSE_LONG
+        bar += int(rng.integers(1, 15))
+    return signals
+
+class Test_PortfolioBacktest(unittest.TestCase):
+    def test_single_asset_matches_backtest(self):
+        data = random_ohlc(300, seed=1)
+        signals = clean_signals(300, seed=1)
+        # without commission, backtest pays it on top of a position sized on the whole balance
+        expected = backtest_arrays(data.copy(), FixedSignalStrategy(signals), 10000)
+        result = portfolio_backtest(data[['Open']].T.to_numpy(), data[['Close']].T.to_numpy(), [signals], 10000)
+        # backtest closes its last, already closed, position once more on the final bar
+        np.testing.assert_allclose(expected['portfolio_value'].to_numpy()[:-1], result.portfolio_value.to_numpy()[:-1])
+
+    def test_entries_split_the_free_cash(self):
+        open_prices = np.array([[10.0, 10.0, 10.0, 10.0], [20.0, 20.0, 20.0, 20.0], [5.0, 5.0, 5.0, 5.0]])
+        close_prices = np.array([[10.0, 12.0, 12.0, 12.0], [20.0, 20.0, 25.0, 25.0], [5.0, 5.0, 4.0, 4.0]])
+        signals = np.array([[2, 0, -2, 0], [2, 0, 0, 0], [0, 1, 0, 0]])
+        result = portfolio_backtest(open_prices, close_prices, signals, 900, slippage_factor=np.inf, assets=['A', 'B', 'C'])
+
+        # bar 0: A and B get 900 / 3 each, bar 1: C shorts with 300 / 1, bars 2 and 3 close at the unchanged opens
+        self.assertEqual([300.0, 0.0, 300.0, 900.0], list(result.cash))
+        np.testing.assert_allclose([300.0, 360.0, 0.0, 0.0], result.holdings['A'])
+        np.testing.assert_allclose([300.0, 300.0, 375.0, 0.0], result.holdings['B'])
+        # C is short 60 coins from 5, worth 300 + 60 * (5 - 4) at a close of 4
+        np.testing.assert_allclose([0.0, 300.0, 360.0, 0.0], result.holdings['C'])
+        np.testing.assert_allclose([900.0, 960.0, 1035.0, 900.0], result.portfolio_value)
+        np.testing.assert_allclose([0.0, 75.0, 60.0], result.pnl.iloc[2])
+
+    def test_twelve_assets_account_for_every_coin(self):
+        frames = {f'asset_{i}': random_ohlc(1000, seed=i).set_axis(pd.date_range('2021-01-01', periods=1000, freq='D')) for i in range(12)}
+        frames['asset_3'] = frames['asset_3'].iloc[5:]
+        index, prices = align_assets(frames)
+        self.assertEqual(995, len(index))
+
+        signals = build_portfolio_signals(frames, {asset: MovingAverageCrossStrategy(5, 20) for asset in frames}, index)
+        result = portfolio_backtest(prices['Open'], prices['Close'], signals, 12000, commission=1.0, assets=list(frames), index=index)
+        np.testing.assert_allclose(result.portfolio_value, result.cash + result.holdings.sum(axis=1))
+        np.testing.assert_allclose(result.portfolio_value - 12000, result.pnl.sum(axis=1), atol=1e-6)
+        self.assertTrue((result.holdings.iloc[-1] == 0).all())
+        self.assertTrue((result.cash >= 0).all())
+
+    def test_commission_comes_out_of_the_allocation(self):
+        open_prices = np.array([[10.0, 10.0, 10.0], [20.0, 20.0, 20.0], [5.0, 5.0, 5.0]])
+        # every asset enters on the same bar and takes the whole pool
+        signals = np.array([[2, 0, 0], [1, 0, 0], [2, 0, 0]])
+        result = portfolio_backtest(open_prices, open_prices, signals, 900, slippage_factor=np.inf, commission=3.0,
+                                    assets=['A', 'B', 'C'])
+        self.assertEqual([0.0, 0.0, 882.0], list(result.cash))
+        # each position is sized on 300 - 3, worth 297 at unchanged prices
+        np.testing.assert_allclose([297.0, 297.0, 0.0], result.holdings['B'])
+        np.testing.assert_allclose([-3.0, -3.0, -6.0], result.pnl['A'])
+        np.testing.assert_allclose([891.0, 891.0, 882.0], result.portfolio_value)
+
+    def test_final_bar_opens_nothing(self):
+        open_prices = np.array([[10.0, 10.0, 11.0], [20.0, 20.0, 21.0]])
+        close_prices = np.array([[10.0, 11.0, 12.0], [20.0, 21.0, 22.0]])
+        # A closes and B tries to enter on the final bar
+        signals = np.array([[2, 0, 0], [0, 0, 2]])
+        result = portfolio_backtest(open_prices, close_prices, signals, 1000, slippage_factor=np.inf, assets=['A', 'B'])
+        self.assertTrue((result.holdings.iloc[-1] == 0).all())
+        self.assertEqual(0.0, result.pnl['B'].abs().max())
+        # A bought 50 coins at 10 with half the cash and sold them at 11
+        self.assertEqual(1050.0, result.cash.iloc[-1])
+
+    def test_shape_mismatch(self):
+        with self.assertRaises(ValueError):
+            portfolio_backtest(np.ones((2, 5)), np.ones((2, 5)), np.zeros((2, 4)), 100)
@@ -0,0 +1,61 @@
+import tracemalloc
+import unittest
+import pandas as pd
+from backtesting import backtest, backtest_arrays
+from models import StrategySignal
+from profiling import BacktestProfiler
+from strategies import BaseStrategy
+from test_backtesting import FixedSignalStrategy, random_ohlc, random_signals
+
+class FailingStrategy(BaseStrategy):
+    def calc_signal(self, data):
+        raise ValueError('bad data')
+
+class Test_Profiling(unittest.TestCase):
+    def setUp(self):
+        self.data = random_ohlc(300, seed=3)
+        self.signals = random_signals(300, seed=3)
+
+    def test_counters_match_between_engines(self):
+        reports = []
+        for engine in (backtest, backtest_arrays):
+            profiler = BacktestProfiler(callback=reports.append)
+            engine(self.data.copy(), FixedSignalStrategy(self.signals, sl_rate=0.05, tp_rate=0.05), 10000, profiler=profiler)
+
+        slow, fast = reports
+        self.assertEqual(slow['counters'], fast['counters'])
+        counters = slow['counters']
+        self.assertEqual(1, counters['runs'])
+        self.assertEqual(300, counters['bars'])
+        self.assertEqual(self.signals.count(StrategySignal.ENTER_LONG), counters['long_entries'])
+        self.assertGreater(counters['stop_losses'] + counters['take_profits'], 0)
+        for phase in ('total', 'calc_signal', 'bar_loop', 'check_sl_tp', 'calc_realistic_price', 'portfolio_value'):
+            self.assertIn(phase, fast['timings'])
+        self.assertLessEqual(fast['timings']['bar_loop'], fast['timings']['total'])
+
+    def test_profiling_does_not_change_results(self):
+        strategy = FixedSignalStrategy(self.signals, sl_rate=0.05)
+        expected = backtest_arrays(self.data.copy(), strategy, 10000)
+        profiled = backtest_arrays(self.data.copy(), strategy, 10000, profiler=BacktestProfiler(trace_memory=True))
+        pd.testing.assert_frame_equal(expected, profiled)
+
+    def test_totals_across_runs(self):
+        profiler = BacktestProfiler(trace_memory=True)
+        for _ in range(3):
+            backtest_arrays(self.data.copy(), FixedSignalStrategy(self.signals), 10000, profiler=profiler)
+        report = profiler.report()
+        self.assertEqual(3, report['counters']['runs'])
+        self.assertEqual(900, report['counters']['bars'])
+        self.assertEqual(3, report['calls']['calc_signal'])
+        self.assertGreater(report['peak_memory_mb'], 0)
+        self.assertIn('bar_loop', str(profiler))
+
+    def test_failed_run_stops_tracing(self):
+        for engine in (backtest, backtest_arrays):
+            with self.subTest(engine=engine.__name__):
+                reports = []
+                profiler = BacktestProfiler(trace_memory=True, callback=reports.append)
+                with self.assertRaises(ValueError):
+                    engine(self.data.copy(), FailingStrategy(), 10000, profiler=profiler)
+                self.assertFalse(tracemalloc.is_tracing())
+                self.assertEqual(1, len(reports))
\ No newline at end of file
@@ -0,0 +1,81 @@
+import math
+import tempfile
+import time
+import unittest
+import numpy as np
+from candle_cache import CandleCache
+from paper_trading import PaperTrader
+from replay_simulator import TraderHandler, load_replay_candles, merge_events, replay_simulation
+from test_backtesting import random_ohlc
+from test_binance_downloader import MINUTE
+from test_candle_cache import FakeFetch
+from test_paper_trading import ohlc_klines
+from test_sweep import MovingAverageCrossStrategy
+
+class Test_ReplaySimulator(unittest.TestCase):
+    def setUp(self):
+        # three symbols of different lengths, starting at different minutes
+        self.candles = {symbol: ohlc_klines(random_ohlc(n, seed), first_open=offset * MINUTE)
+                        for symbol, n, seed, offset in (('ETHUSDT', 50, 1, 0), ('BTCUSDT', 80, 2, 10), ('SOLUSDT', 30, 3, 5))}
+
+    def test_merge_is_time_ordered(self):
+        events = list(merge_events(self.candles, chunk_size=7))
+        self.assertEqual(160, len(events))
+        keys = [(close_time, symbol) for close_time, symbol, _ in events]
+        self.assertEqual(sorted(keys), keys)
+        for close_time, symbol, kline in events:
+            self.assertEqual(close_time, kline[6])
+        btc = [kline for _, symbol, kline in events if symbol == 'BTCUSDT']
+        self.assertEqual(self.candles['BTCUSDT']['close'].tolist(), [kline[4] for kline in btc])
+
+    def test_max_speed_with_bounded_queue(self):
+        received = []
+        report = replay_simulation(self.candles, lambda symbol, kline, released_at: received.append((kline[6], symbol)), max_queue=5)
+        self.assertEqual(160, report['events'])
+        self.assertEqual(sorted(received), received)
+        self.assertLessEqual(report['backlog_max'], 5)
+        self.assertEqual((89 * MINUTE) / 1000, report['market_seconds'])
+        self.assertEqual(160, report['lag']['count'])
+
+    def test_paced_replay(self):
+        # 1 minute candles at 6000x close every 10ms, the first 21 events span eleven minutes, about 0.11s
+        start = time.time()
+        report = replay_simulation(self.candles, lambda *event: None, speed=6000, max_events=21)
+        self.assertEqual(21, report['events'])
+        self.assertGreaterEqual(time.time() - start, 600 / 6000 * 0.9)
+        self.assertLess(report['achieved_speed'], 6000 * 1.5)
+
+        # stopping early does not wait for the rest of a real time replay
+        start = time.time()
+        replay_simulation(self.candles, lambda *event: None, speed=1, max_events=1)
+        self.assertLess(time.time() - start, 5)
+
+    def test_trader_handler_matches_paper_trader(self):
+        handler = TraderHandler(lambda symbol: MovingAverageCrossStrategy(3, 10), 1000, lookback=15, commission=1.0)
+        replay_simulation(self.candles, handler)
+        self.assertEqual(set(self.candles), set(handler.traders))
+
+        trader = PaperTrader(MovingAverageCrossStrategy(3, 10), 1000, lookback=15, commission=1.0)
+        columns = self.candles['BTCUSDT']
+        for kline in zip(*(columns[column].tolist() for column in columns)):
+            trader.on_kline(kline)
+        np.testing.assert_array_equal(trader.equity_curve().to_numpy(), handler.traders['BTCUSDT'].equity_curve().to_numpy())
+
+    def test_cached_candles(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = CandleCache(cache_dir, fetch=FakeFetch(), clock=lambda: 10_000 * MINUTE / 1000)
+            for symbol in ('BTCUSDT', 'ETHUSDT'):
+                cache.update(symbol, '1m', 0, 99 * MINUTE)
+            candles = load_replay_candles(cache, ['BTCUSDT', 'ETHUSDT'], '1m', 0, 99 * MINUTE)
+            report = replay_simulation(candles, lambda *event: None, speed=math.inf)
+        self.assertEqual(200, report['events'])
+        self.assertEqual(2, report['symbols'])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            replay_simulation(self.candles, lambda *event: None, speed=0)
+        with self.assertRaises(ValueError):
+            replay_simulation({}, lambda *event: None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+import numpy as np
+import pandas as pd
+from backtesting import backtest, backtest_arrays
+from binanceData import ATR, TR, STCosi
+from models import StrategySignal
+from strategies import (BestCryptoSignalStream, BuyAndHoldStrategy, SellAndHoldStrategy, SIGNAL_ARRAY_REGISTRY, best_crypto_strat,
+                        signal_codes)
+from test_backtesting import FixedSignalStrategy, random_ohlc, random_signals
+
+BUY, SELL, NOTHING = 1, -1, 0
+
+def notebook_best_crypto_signals(df, buyKeyVal=2, buyATRlen=300, sellKeyVal=2, sellATRlen=1, stcLen=80):
+    """
+    The notebook's UTBot, stcOsilator and final signal cells, with ActionType replaced by 1/-1/0.
+    """
+    close, high, low = df['Close'], df['High'], df['Low']
+    crossOver = lambda a, b: (a > b) & (a.shift(1) < b.shift(1))
+
+    lossThrshBuy = buyKeyVal * ATR(TR(close, high, low), buyATRlen)
+    lossThrshSell = sellKeyVal * ATR(TR(close, high, low), sellATRlen)
+    trailStopBuy = 0 * lossThrshBuy
+    trailStopSell = 0 * lossThrshSell
+    for i in range(1, len(trailStopBuy)):
+        if (close[i] > trailStopBuy[i - 1]) & (close[i - 1] > trailStopBuy[i - 1]):
+            trailStopBuy[i] = max(trailStopBuy[i - 1], close[i] - lossThrshBuy[i])
+        elif (close[i] < trailStopBuy[i - 1]) & (close[i - 1] < trailStopBuy[i - 1]):
+            trailStopBuy[i] = min(trailStopBuy[i - 1], close[i] + lossThrshBuy[i])
+        elif (close[i] > trailStopBuy[i - 1]):
+            trailStopBuy[i] = close[i] - lossThrshBuy[i]
+        else:
+            trailStopBuy[i] = close[i] + lossThrshBuy[i]
+
+        if (close[i] > trailStopSell[i - 1]) & (close[i - 1] > trailStopSell[i - 1]):
+            trailStopSell[i] = max(trailStopSell[i - 1], close[i] - lossThrshSell[i])
+        elif (close[i] < trailStopSell[i - 1]) & (close[i - 1] < trailStopSell[i - 1]):
+            trailStopSell[i] = min(trailStopSell[i - 1], close[i] - lossThrshSell[i])
+        elif (close[i] > trailStopSell[i - 1]):
+            trailStopSell[i] = close[i] - lossThrshSell[i]
+        else:
+            trailStopSell[i] = close[i] + lossThrshSell[i]
+    utbot = np.select([crossOver(close, trailStopBuy), crossOver(trailStopSell, close)], [BUY, SELL], default=NOTHING)
+
+    stc_values = STCosi(close, 27, 50, stcLen, 0.5)
+    stc_action = np.select([(stc_values > 75) & (stc_values < stc_values.shift(1)), (stc_values < 25) & (stc_values > stc_values.shift(1))],
+                           [SELL, BUY], default=NOTHING)
+
+    cumulative = np.where(utbot != stc_action, NOTHING, utbot)
+    curr_last = cumulative.copy()
+    curr_last[0] = NOTHING
+    for i in range(1, len(curr_last)):
+        if cumulative[i] == BUY:
+            curr_last[i] = BUY
+        elif cumulative[i] == SELL and curr_last[i - 1] != NOTHING:
+            curr_last[i] = SELL
+        else:
+            curr_last[i] = curr_last[i - 1]
+    final = np.where(curr_last != np.r_[np.nan, curr_last[:-1]], curr_last, NOTHING)
+    if curr_last[-1] == BUY and final[-1] == NOTHING:
+        final[-1] = SELL
+    elif final[-1] == BUY:
+        final[-1] = NOTHING
+    return np.select([final == BUY, final == SELL], [StrategySignal.ENTER_LONG.value, StrategySignal.CLOSE_LONG.value], 0)
+
+class Test_Strategies(unittest.TestCase):
+    def test_legacy_strategies_go_through_calc_signal(self):
+        data = random_ohlc(50)
+        signals = random_signals(50, seed=4)
+        codes = FixedSignalStrategy(signals).calc_signal_array(data)
+        self.assertEqual(np.int8, codes.dtype)
+        np.testing.assert_array_equal([signal.value for signal in signals], codes)
+        self.assertIn('strategy_signal', data.columns)
+
+    def test_registered_strategies_match_calc_signal(self):
+        data = random_ohlc(30)
+        for strategy in (BuyAndHoldStrategy(), SellAndHoldStrategy()):
+            with self.subTest(strategy=type(strategy).__name__):
+                self.assertIn(type(strategy), SIGNAL_ARRAY_REGISTRY)
+                legacy = data.copy()
+                strategy.calc_signal(legacy)
+                np.testing.assert_array_equal(signal_codes(legacy['strategy_signal']), strategy.calc_signal_array(data))
+                self.assertNotIn('strategy_signal', data.columns)
+
+    def test_subclasses_keep_their_own_calc_signal(self):
+        class DelayedBuyAndHold(BuyAndHoldStrategy):
+            def calc_signal(self, data):
+                super().calc_signal(data)
+                data.iloc[:2, data.columns.get_loc('strategy_signal')] = [StrategySignal.DO_NOTHING, StrategySignal.ENTER_LONG]
+
+        codes = DelayedBuyAndHold().calc_signal_array(random_ohlc(10))
+        self.assertEqual([0, 2, 0, 0, 0, 0, 0, 0, 0, -2], codes.tolist())
+
+    def test_signal_codes_is_int8_and_8x_smaller(self):
+        objects = pd.Series(random_signals(10_000, seed=1))
+        codes = signal_codes(objects)
+        self.assertEqual(np.int8, codes.dtype)
+        self.assertEqual(objects.to_numpy().nbytes, 8 * codes.nbytes)
+        self.assertIs(codes, signal_codes(codes))
+
+        matrix = np.array([random_signals(50, seed=2), random_signals(50, seed=3)], dtype=object)
+        np.testing.assert_array_equal([signal_codes(row) for row in matrix], signal_codes(matrix))
+
+    def test_best_crypto_matches_notebook(self):
+        for seed, kwargs in ((3, {}), (8, {'buy_atr_length': 20, 'stc_length': 30})):
+            with self.subTest(seed=seed, **kwargs):
+                data = random_ohlc(1500, seed=seed)
+                strategy = best_crypto_strat(**kwargs)
+                expected = notebook_best_crypto_signals(data, buyATRlen=strategy.buy_atr_length, stcLen=strategy.stc_length)
+                codes = strategy.calc_signal_array(data)
+                self.assertGreater(np.count_nonzero(codes == StrategySignal.ENTER_LONG.value), 0)
+                np.testing.assert_array_equal(expected, codes)
+
+    def test_best_crypto_reads_lowercase_klines(self):
+        data = random_ohlc(400, seed=2)
+        klines = data.rename(columns=str.lower)
+        strategy = best_crypto_strat(buy_atr_length=20, stc_length=30)
+        np.testing.assert_array_equal(strategy.calc_signal_array(data), strategy.calc_signal_array(klines))
+
+    def test_best_crypto_engines_agree(self):
+        data = random_ohlc(600, seed=6)
+        strategy = best_crypto_strat(buy_atr_length=20, stc_length=30)
+        b_df = backtest(data.copy(deep=True), strategy, 1000)
+        b_df_arrays = backtest_arrays(data.copy(deep=True), strategy, 1000)
+        self.assertEqual(np.int8, b_df_arrays['strategy_signal'].dtype)
+        np.testing.assert_allclose(b_df['portfolio_value'], b_df_arrays['portfolio_value'])
+
+    def test_best_crypto_stream_matches_signal_array(self):
+        for seed, kwargs in ((4, {}), (4, {'buy_atr_length': 14, 'sell_atr_length': 3, 'stc_length': 12, 'sell_threshold': 60,
+                                          'buy_threshold': 40}), (8, {'buy_atr_length': 20, 'stc_length': 30})):
+            with self.subTest(seed=seed, **kwargs):
+                data = random_ohlc(3000, seed=seed)
+                strategy = best_crypto_strat(**kwargs)
+                stream = strategy.signal_stream()
+                self.assertIsInstance(stream, BestCryptoSignalStream)
+                streamed = [stream.update(*bar) for bar in zip(*(data[column].tolist() for column in ('Open', 'High', 'Low', 'Close')))]
+                codes = strategy.calc_signal_array(data)
+                self.assertGreater(np.count_nonzero(codes), 2)
+                # only the array version knows the last bar
+                np.testing.assert_array_equal(codes[:-1], streamed[:-1])
+
+    def test_signal_stream_is_registered_per_class(self):
+        class TunedBestCrypto(best_crypto_strat):
+            pass
+        self.assertIsNone(TunedBestCrypto().signal_stream())
+        self.assertIsNone(FixedSignalStrategy([]).signal_stream())
+
+    def test_best_crypto_subclasses_fall_back_to_calc_signal(self):
+        class TunedBestCrypto(best_crypto_strat):
+            pass
+        data = random_ohlc(400, seed=2)
+        np.testing.assert_array_equal(best_crypto_strat(stc_length=30).calc_signal_array(data),
+                                      TunedBestCrypto(stc_length=30).calc_signal_array(data.copy()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backtesting import backtest_arrays
+from candle_cache import CandleCache
+from evaluation import calc_max_drawdown
+from models import StrategySignal
+from strategies import BaseStrategy
+from streaming_backtest import candle_cache_chunks, csv_chunks, frame_chunks, streaming_backtest
+from trade_ledger import TradeLedger
+from test_backtesting import random_ohlc, random_signals
+from test_candle_cache import FakeFetch
+from test_binance_downloader import MINUTE
+from test_sweep import MovingAverageCrossStrategy
+
+class ColumnSignalStrategy(BaseStrategy):
+    # reads the signal from a column of the candles, so every chunk carries its own signals
+    def calc_signal(self, data: pd.DataFrame):
+        data['strategy_signal'] = [StrategySignal(code) for code in data['signal']]
+
+class Test_StreamingBacktest(unittest.TestCase):
+    def setUp(self):
+        self.data = random_ohlc(500, seed=5)
+        self.data.index = pd.date_range('2020-01-01', periods=500, freq='D', name='Date')
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, 'equity.csv')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_same_as_backtest_arrays(self, data, strategy, chunk_size, warmup=0, commission=0.0):
+        expected = backtest_arrays(data.copy(deep=True), strategy, 10000, commission=commission)
+        summary = streaming_backtest(frame_chunks(data, chunk_size), strategy, 10000, self.output_path,
+                                     warmup=warmup, commission=commission)
+
+        equity = pd.read_csv(self.output_path, index_col='Date', parse_dates=True)
+        pd.testing.assert_index_equal(data.index, equity.index)
+        for column in ('qty', 'balance', 'portfolio_value'):
+            np.testing.assert_allclose(expected[column].to_numpy(), equity[column].to_numpy(), rtol=1e-12)
+
+        self.assertEqual(len(data), summary['bars'])
+        self.assertEqual(-(-len(data) // chunk_size), summary['chunks'])
+        self.assertAlmostEqual(expected['portfolio_value'].iloc[-1], summary['portfolio_value'])
+        self.assertAlmostEqual(calc_max_drawdown(expected['portfolio_value']), summary['max_drawdown'])
+
+    def test_moving_average_cross_matches_in_memory(self):
+        for chunk_size in (1, 7, 64, 500, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assert_same_as_backtest_arrays(self.data, MovingAverageCrossStrategy(5, 20), chunk_size, warmup=20)
+
+    def test_random_signals_with_sl_tp_match_in_memory(self):
+        data = self.data.assign(signal=[signal.value for signal in random_signals(len(self.data), seed=9)])
+        for chunk_size in (1, 3, 50, 499):
+            with self.subTest(chunk_size=chunk_size):
+                self.assert_same_as_backtest_arrays(data, ColumnSignalStrategy(sl_rate=0.02, tp_rate=0.03), chunk_size,
+                                                    commission=1.0)
+
+    def test_short_warmup_changes_the_signals(self):
+        expected = backtest_arrays(self.data.copy(deep=True), MovingAverageCrossStrategy(5, 20), 10000)
+        streaming_backtest(frame_chunks(self.data, 30), MovingAverageCrossStrategy(5, 20), 10000, self.output_path, warmup=5)
+        equity = pd.read_csv(self.output_path, index_col='Date', parse_dates=True)
+        self.assertFalse(np.allclose(expected['portfolio_value'].to_numpy(), equity['portfolio_value'].to_numpy()))
+
+    def test_ledger_counts_bars_from_stream_start(self):
+        data = self.data.assign(signal=[signal.value for signal in random_signals(len(self.data), seed=2)])
+        in_memory = TradeLedger()
+        backtest_arrays(data.copy(deep=True), ColumnSignalStrategy(sl_rate=0.02), 10000, ledger=in_memory)
+        streamed = TradeLedger()
+        streaming_backtest(frame_chunks(data, 33), ColumnSignalStrategy(sl_rate=0.02), 10000, self.output_path, ledger=streamed)
+        np.testing.assert_array_equal(in_memory.trades, streamed.trades)
+
+    def test_csv_chunks(self):
+        candles_path = os.path.join(self.tmp_dir.name, 'candles.csv')
+        self.data.to_csv(candles_path)
+        chunks = list(csv_chunks(candles_path, 120))
+        self.assertEqual([120, 120, 120, 120, 20], [len(chunk) for chunk in chunks])
+        pd.testing.assert_frame_equal(self.data, pd.concat(chunks), check_freq=False)
+
+        summary = streaming_backtest(csv_chunks(candles_path, 120), MovingAverageCrossStrategy(3, 10), 10000,
+                                     self.output_path, warmup=10)
+        expected = backtest_arrays(self.data.copy(deep=True), MovingAverageCrossStrategy(3, 10), 10000)
+        self.assertAlmostEqual(expected['portfolio_value'].iloc[-1], summary['portfolio_value'])
+
+    def test_candle_cache_chunks(self):
+        cache = CandleCache(self.tmp_dir.name, fetch=FakeFetch(), clock=lambda: 10_000 * MINUTE / 1000)
+        cache.update('BTCUSDT', '1m', 0, 999 * MINUTE)
+        chunks = list(candle_cache_chunks(cache, 'BTCUSDT', '1m', 0, 999 * MINUTE, 256))
+
+        self.assertEqual([256, 256, 256, 232], [len(chunk) for chunk in chunks])
+        self.assertEqual(['Open', 'High', 'Low', 'Close', 'Volume'], list(chunks[0].columns))
+        self.assertEqual(pd.Timestamp(256 * MINUTE, unit='ms', tz='UTC'), chunks[1].index[0])
+        self.assertEqual(100.5, chunks[0]['Close'].iloc[0])
+
+    def test_empty_stream(self):
+        summary = streaming_backtest(iter([]), MovingAverageCrossStrategy(3, 10), 10000, self.output_path)
+        self.assertEqual(0, summary['bars'])
+        self.assertTrue(np.isnan(summary['portfolio_value']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from binanceData import TR, ATR, STCosi
+from indicators import average_true_range, utbot_trailing_stop
+from streaming_indicators import StreamingIndicator, TrueRange, AverageTrueRange, EMA, STC, UTBot
+from test_indicators import random_klines
+
+def stream(indicator, df):
+    return np.array([indicator.update(h, l, c) for h, l, c in zip(df['high'], df['low'], df['close'])])
+
+class Test_StreamingIndicators(unittest.TestCase):
+    def setUp(self):
+        self.df = random_klines(1200, seed=9)
+
+    def test_update_is_required(self):
+        class NoUpdate(StreamingIndicator):
+            pass
+        with self.assertRaises(TypeError):
+            NoUpdate()
+
+    def test_true_range_and_atr(self):
+        expected_tr = TR(self.df['close'], self.df['high'], self.df['low'])
+        np.testing.assert_array_equal(expected_tr.to_numpy(), stream(TrueRange(), self.df))
+        np.testing.assert_allclose(ATR(expected_tr, 14).to_numpy(), stream(AverageTrueRange(14), self.df), rtol=1e-9)
+
+    def test_ema(self):
+        close = self.df['close']
+        np.testing.assert_allclose(close.ewm(span=27).mean().to_numpy(), stream(EMA(27), self.df), rtol=1e-12)
+        np.testing.assert_allclose(close.ewm(span=10, min_periods=10, adjust=False).mean().to_numpy(),
+                                   stream(EMA(10, adjust=False, min_periods=10), self.df), rtol=1e-12)
+
+    def test_stc(self):
+        expected = STCosi(self.df['close'], 23, 50, 10, 0.5).to_numpy()
+        np.testing.assert_allclose(expected, stream(STC(23, 50, 10, 0.5), self.df), rtol=1e-8)
+
+    def test_utbot(self):
+        close = self.df['close'].to_numpy()
+        loss_threshold = 2 * average_true_range(close, self.df['high'].to_numpy(), self.df['low'].to_numpy(), 10)
+        expected = utbot_trailing_stop(close, loss_threshold)
+
+        utbot = UTBot(2, 10)
+        buys = []
+        stops = []
+        for h, l, c in zip(self.df['high'], self.df['low'], self.df['close']):
+            stops.append(utbot.update(h, l, c))
+            buys.append(utbot.buy)
+
+        np.testing.assert_allclose(expected, stops, rtol=1e-9)
+        expected_buys = (close > expected) & (np.r_[np.nan, close[:-1]] < np.r_[np.nan, expected[:-1]])
+        self.assertEqual(list(expected_buys), buys)
+
+    def test_warm_start_then_klines(self):
+        history, live = self.df.iloc[:1000], self.df.iloc[1000:]
+        stc = STC(23, 50, 10).warm_start(history)
+        klines = [[0, '0', str(h), str(l), repr(c)] for h, l, c in zip(live['high'], live['low'], live['close'])]
+        values = [stc.update_kline(kline) for kline in klines]
+
+        expected = STCosi(self.df['close'], 23, 50, 10).to_numpy()[1000:]
+        np.testing.assert_allclose(expected, values, rtol=1e-8)
+
+if __name__ == '__main__':
+    unittest.main()
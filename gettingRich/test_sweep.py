@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+import numpy as np
+from backtesting import backtest_arrays
+from evaluation import calc_total_return, calc_max_drawdown
+from models import StrategySignal
+from strategies import BaseStrategy
+from sweep import SharedCandles, param_combinations, run_sweep
+from test_backtesting import random_ohlc
+
+class MovingAverageCrossStrategy(BaseStrategy):
+    def __init__(self, fast: int, slow: int, sl_rate: float = None, tp_rate: float = None):
+        super().__init__(sl_rate, tp_rate)
+        self.fast = fast
+        self.slow = slow
+
+    def calc_signal(self, data: pd.DataFrame):
+        fast_ma = data['Close'].rolling(self.fast).mean()
+        slow_ma = data['Close'].rolling(self.slow).mean()
+        above = (fast_ma > slow_ma).to_numpy()
+        crossed = np.r_[False, above[1:] != above[:-1]]
+        data['strategy_signal'] = np.select([crossed & above, crossed & ~above],
+                                            [StrategySignal.ENTER_LONG, StrategySignal.CLOSE_LONG],
+                                            default=StrategySignal.DO_NOTHING)
+
+class Test_Sweep(unittest.TestCase):
+    def setUp(self):
+        self.data = random_ohlc(300, seed=11)
+        self.data.index = pd.date_range('2023-01-01', periods=300, freq='D', name='Date')
+        self.grid = {'fast': [3, 5, 8], 'slow': [20, 30]}
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, 'train_results.csv')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def expected_row(self, fast, slow):
+        b_df = backtest_arrays(self.data.copy(deep=True), MovingAverageCrossStrategy(fast, slow), 10000)
+        return calc_total_return(b_df['portfolio_value']), calc_max_drawdown(b_df['portfolio_value'])
+
+    def test_shared_candles_round_trip(self):
+        candles = SharedCandles(self.data)
+        try:
+            pd.testing.assert_frame_equal(self.data, candles.to_frame(), check_freq=False)
+        finally:
+            candles.unlink()
+
+    def test_sweep_matches_serial_backtests(self):
+        results = run_sweep(self.data, MovingAverageCrossStrategy, self.grid, self.output_path, 10000, workers=2)
+
+        self.assertEqual(6, len(results))
+        for _, row in results.iterrows():
+            total_return, max_drawdown = self.expected_row(int(row['fast']), int(row['slow']))
+            self.assertAlmostEqual(total_return, row['total_return'])
+            self.assertAlmostEqual(max_drawdown, row['max_drawdown'])
+
+    def test_sweep_resumes_without_redoing_combinations(self):
+        all_combinations = param_combinations(self.grid)
+        run_sweep(self.data, MovingAverageCrossStrategy, all_combinations[:4], self.output_path, 10000, workers=2)
+
+        # simulate a sweep killed in the middle of writing a row
+        with open(self.output_path, 'a') as f:
+            f.write('0.1,0.2,0.3')
+
+        results = run_sweep(self.data, MovingAverageCrossStrategy, self.grid, self.output_path, 10000, workers=2)
+
+        self.assertEqual(6, len(results))
+        self.assertEqual(6, len(results.drop_duplicates(subset=['fast', 'slow'])))
+        self.assertEqual(sorted((c['fast'], c['slow']) for c in all_combinations),
+                         sorted(zip(results['fast'], results['slow'])))
+
+if __name__ == '__main__':
+    unittest.main()
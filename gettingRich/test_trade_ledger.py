@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from backtesting import backtest, backtest_arrays, backtest_trades
+from models import ExitReason, Position, PositionType, StrategySignal
+from trade_ledger import TradeLedger
+from test_backtesting import FixedSignalStrategy, random_ohlc, random_signals
+
+class Test_TradeLedger(unittest.TestCase):
+    def test_position_has_slots(self):
+        position = Position(1.0, 100.0, PositionType.LONG)
+        self.assertFalse(hasattr(position, '__dict__'))
+        with self.assertRaises(AttributeError):
+            position.other = 1
+
+    def test_grows_and_keeps_trades(self):
+        ledger = TradeLedger(capacity=2)
+        for i in range(3000):
+            ledger.record(i, i + 5, 1, 1.0, 100.0, 100.0 + i % 7 - 3, 0.5, ExitReason.SIGNAL)
+        self.assertEqual(3000, len(ledger))
+        self.assertGreaterEqual(ledger.capacity, 3000)
+        np.testing.assert_array_equal(np.arange(3000), ledger.trades['entry_bar'])
+
+        capacity = ledger.capacity
+        ledger.clear()
+        self.assertEqual(0, len(ledger))
+        self.assertEqual(capacity, ledger.capacity)
+
+    def test_stats(self):
+        ledger = TradeLedger()
+        ledger.record(0, 4, 1, 2.0, 100.0, 110.0, 1.0, ExitReason.SIGNAL)
+        ledger.record(5, 6, -1, 1.0, 100.0, 105.0, 1.0, ExitReason.STOP_LOSS)
+        stats = ledger.stats()
+        np.testing.assert_allclose([19.0, -6.0], ledger.pnl())
+        self.assertEqual(2, stats['num_trades'])
+        self.assertEqual(0.5, stats['win_rate'])
+        self.assertAlmostEqual(19 / 6, stats['profit_factor'])
+        self.assertEqual(2.5, stats['avg_bars_held'])
+        self.assertEqual(1, stats['stop_loss_exits'])
+        self.assertEqual([PositionType.LONG, PositionType.SHORT], list(ledger.to_frame()['side']))
+
+    def test_engines_fill_the_same_ledger(self):
+        data = random_ohlc(400, seed=8)
+        signals = random_signals(400, seed=8)
+        ledgers = []
+        for engine in (backtest, backtest_arrays):
+            ledger = TradeLedger()
+            engine(data.copy(), FixedSignalStrategy(signals, sl_rate=0.03, tp_rate=0.03), 10000, commission=1.0, ledger=ledger)
+            ledgers.append(ledger.trades)
+        np.testing.assert_array_equal(ledgers[0], ledgers[1])
+        self.assertGreater(len(ledgers[0]), 0)
+
+    def test_pnl_adds_up_to_portfolio_change(self):
+        data = random_ohlc(200, seed=9)
+        signals = [StrategySignal.DO_NOTHING] * 200
+        for start, enter, close in [(10, StrategySignal.ENTER_LONG, StrategySignal.CLOSE_LONG), (60, StrategySignal.ENTER_SHORT, StrategySignal.CLOSE_SHORT),
+                                    (120, StrategySignal.ENTER_LONG, StrategySignal.CLOSE_LONG), (180, StrategySignal.ENTER_SHORT, None)]:
+            signals[start] = enter
+            if close is not None:
+                signals[start + 30] = close
+
+        b_df, ledger = backtest_trades(data, FixedSignalStrategy(signals), 10000, commission=2.0)
+        self.assertEqual([ExitReason.SIGNAL] * 3 + [ExitReason.END_OF_DATA], list(ledger.to_frame()['exit_reason']))
+        self.assertEqual([10, 60, 120, 180], list(ledger.trades['entry_bar']))
+        self.assertAlmostEqual(b_df['portfolio_value'].iloc[-1] - 10000, ledger.pnl().sum(), places=6)
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import pandas as pd
+from backtesting import backtest_arrays
+from batch_backtesting import build_signal_matrix
+from evaluation import METRIC_NAMES, calc_metrics
+from models import StrategySignal
+from test_backtesting import FixedSignalStrategy, random_ohlc
+from test_sweep import MovingAverageCrossStrategy
+from walk_forward import MetricPrefixSums, walk_forward, walk_forward_folds
+
+class Test_WalkForward(unittest.TestCase):
+    def setUp(self):
+        self.data = random_ohlc(600, seed=5)
+        self.data.index = pd.date_range('2022-01-01', periods=600, freq='D', name='Date')
+        self.grid = {'fast': [3, 5, 8], 'slow': [20, 40]}
+
+    def test_folds(self):
+        folds = walk_forward_folds(100, 40, 20)
+        self.assertEqual([(slice(0, 40), slice(40, 60)), (slice(20, 60), slice(60, 80)), (slice(40, 80), slice(80, 100))], folds)
+        anchored = walk_forward_folds(100, 40, 20, step=30, anchored=True)
+        self.assertEqual([(slice(0, 40), slice(40, 60)), (slice(0, 70), slice(70, 90))], anchored)
+
+    def test_prefix_sums_match_calc_metrics(self):
+        rng = np.random.default_rng(0)
+        portfolio_values = 1000 * np.cumprod(1 + rng.normal(0, 0.02, (5, 400)), axis=1)
+        prefix_sums = MetricPrefixSums(portfolio_values)
+        for start, stop in [(0, 400), (37, 150), (200, 260)]:
+            window = prefix_sums.window(start, stop)
+            expected = calc_metrics(portfolio_values[:, start:stop])
+            for name in METRIC_NAMES:
+                np.testing.assert_allclose(expected[name], window[name], rtol=1e-9, err_msg=name)
+
+    def test_folds_pick_best_train_params_and_trade_them(self):
+        folds, portfolio_value = walk_forward(self.data, MovingAverageCrossStrategy, self.grid, train_size=200, test_size=100,
+                                              starting_balance=10000)
+        self.assertEqual(4, len(folds))
+        self.assertEqual(400, len(portfolio_value))
+
+        strategies = [MovingAverageCrossStrategy(fast, slow) for fast in self.grid['fast'] for slow in self.grid['slow']]
+        signals = [[StrategySignal(s) for s in row] for row in build_signal_matrix(self.data, strategies)]
+        full_curves = np.stack([backtest_arrays(self.data.copy(), FixedSignalStrategy(row), 10000)['portfolio_value'].to_numpy()
+                                for row in signals])
+
+        balance = 10000
+        for fold in folds.itertuples():
+            train = slice(self.data.index.get_loc(fold.train_start), self.data.index.get_loc(fold.train_end) + 1)
+            test = slice(self.data.index.get_loc(fold.test_start), self.data.index.get_loc(fold.test_end) + 1)
+            best = int(np.argmax(calc_metrics(full_curves[:, train])['annualized_sharpe']))
+            self.assertEqual((strategies[best].fast, strategies[best].slow), (fold.fast, fold.slow))
+
+            expected = backtest_arrays(self.data.iloc[test].copy(), FixedSignalStrategy(signals[best][test]), balance)
+            np.testing.assert_allclose(expected['portfolio_value'].to_numpy(), portfolio_value.iloc[fold.fold * 100:(fold.fold + 1) * 100].to_numpy())
+            self.assertAlmostEqual(calc_metrics(expected['portfolio_value'])[0]['total_return'], fold.total_return)
+            balance = expected['portfolio_value'].iloc[-1]
+
+    def test_overlapping_test_windows_raise(self):
+        with self.assertRaises(ValueError):
+            walk_forward(self.data, MovingAverageCrossStrategy, self.grid, 200, 100, 10000, step=50)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from models import ActionType, ExitReason, Position, PositionType
+
+TRADE_DTYPE = np.dtype([
+    ('entry_bar', np.int64),
+    ('exit_bar', np.int64),
+    ('side', np.int8),
+    ('qty', np.float64),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('fees', np.float64),
+    ('exit_reason', np.int8),
+])
+
+
+def sl_tp_exit_reason(position: Position, sl_tp_price: float, sl_tp_action: ActionType) -> ExitReason:
+    """
+    Tells a stop loss from a take profit exit: a stop loss exits on the losing side of the entry price.
+    """
+    if position.type == PositionType.LONG:
+        losing = sl_tp_action == ActionType.SELL and sl_tp_price < position.price
+    else:
+        losing = sl_tp_action == ActionType.BUY and sl_tp_price > position.price
+    return ExitReason.STOP_LOSS if losing else ExitReason.TAKE_PROFIT
+
+
+class TradeLedger:
+    """
+    Record of the trades of a backtest, one row per exit fill, kept in a single preallocated structured
+    array of TRADE_DTYPE that doubles its capacity when full. clear() keeps the capacity, so a sweep can
+    reuse one ledger for every run without allocating again.
+    """
+    def __init__(self, capacity: int = 1024) -> None:
+        self._trades = np.empty(max(capacity, 1), dtype=TRADE_DTYPE)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._trades.shape[0]
+
+    @property
+    def trades(self) -> np.ndarray:
+        # view of the filled part, valid until the next record
+        return self._trades[:self._size]
+
+    def clear(self) -> None:
+        self._size = 0
+
+    def record(self, entry_bar: int, exit_bar: int, side: int, qty: float, entry_price: float, exit_price: float,
+               fees: float, exit_reason: ExitReason) -> None:
+        if self._size == self._trades.shape[0]:
+            grown = np.empty(2 * self._trades.shape[0], dtype=TRADE_DTYPE)
+            grown[:self._size] = self._trades
+            self._trades = grown
+        self._trades[self._size] = (entry_bar, exit_bar, side, qty, entry_price, exit_price, fees, exit_reason.value)
+        self._size += 1
+
+    def record_exit(self, position: Position, exit_bar: int, qty: float, exit_price: float, commission: float,
+                    exit_reason: ExitReason) -> None:
+        """
+        Records an exit fill of position. The entry commission is booked on the first exit of the position.
+        """
+        self.record(position.entry_bar, exit_bar, position.type.value, qty, position.price, exit_price,
+                    position.fees + commission, exit_reason)
+        position.fees = 0.0
+
+    def pnl(self) -> np.ndarray:
+        trades = self.trades
+        return trades['side'] * trades['qty'] * (trades['exit_price'] - trades['entry_price']) - trades['fees']
+
+    def returns(self) -> np.ndarray:
+        trades = self.trades
+        return trades['side'] * (trades['exit_price'] / trades['entry_price'] - 1.0)
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.trades.copy())
+        df['side'] = [PositionType(side) for side in df['side']]
+        df['exit_reason'] = [ExitReason(reason) for reason in df['exit_reason']]
+        df['pnl'] = self.pnl()
+        return df
+
+    def stats(self) -> dict:
+        """
+        Summary statistics over all recorded trades.
+
+        Returns:
+            dict: num_trades, win_rate, total_pnl, avg_pnl, avg_win, avg_loss, profit_factor, avg_return,
+            avg_bars_held and the number of exits per ExitReason.
+        """
+        trades = self.trades
+        pnl = self.pnl()
+        wins = pnl[pnl > 0]
+        losses = pnl[pnl < 0]
+        gross_loss = -losses.sum()
+        reasons = np.bincount(trades['exit_reason'], minlength=len(ExitReason))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {
+                'num_trades': self._size,
+                'win_rate': wins.size / self._size if self._size else np.nan,
+                'total_pnl': pnl.sum(),
+                'avg_pnl': pnl.mean() if self._size else np.nan,
+                'avg_win': wins.mean() if wins.size else np.nan,
+                'avg_loss': losses.mean() if losses.size else np.nan,
+                'profit_factor': wins.sum() / gross_loss if gross_loss > 0 else np.inf if wins.size else np.nan,
+                'avg_return': self.returns().mean() if self._size else np.nan,
+                'avg_bars_held': (trades['exit_bar'] - trades['entry_bar']).mean() if self._size else np.nan,
+                **{f'{reason.name.lower()}_exits': int(reasons[reason.value]) for reason in ExitReason},
+            }
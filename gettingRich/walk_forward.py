@@ -0,0 +1,169 @@
+import pandas as pd
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from strategies import BaseStrategy
+from backtesting import calc_realistic_prices, run_position_state_machine
+from batch_backtesting import build_signal_matrix
+from evaluation import METRIC_NAMES, METRICS_DTYPE, YEARLY_TRADING_DAYS, calc_metrics
+from sweep import param_combinations
+
+
+def walk_forward_folds(num_bars: int, train_size: int, test_size: int, step: int=None, anchored: bool=False) -> List[Tuple[slice, slice]]:
+    """
+    Splits the bars into consecutive train/test folds, every test window right after its train window.
+
+    Parameters:
+    - num_bars (int): Number of bars in the full history.
+    - train_size (int): Bars in every train window (the first one when anchored).
+    - test_size (int): Bars in every test window.
+    - step (int): Bars between the starts of consecutive folds, test_size by default.
+    - anchored (bool): Keep every train window starting at the first bar instead of rolling it.
+
+    Returns:
+        List[Tuple[slice, slice]]: The train and test slices of every fold.
+    """
+    step = test_size if step is None else step
+    if min(train_size, test_size, step) <= 0:
+        raise ValueError('train_size, test_size and step must be positive')
+
+    folds = []
+    train_start, train_stop = 0, train_size
+    while train_stop + test_size <= num_bars:
+        folds.append((slice(train_start, train_stop), slice(train_stop, train_stop + test_size)))
+        train_stop += step
+        if not anchored:
+            train_start += step
+    return folds
+
+
+class MetricPrefixSums:
+    """
+    Prefix sums over the returns of many portfolio value curves, so the metrics of any window of bars
+    cost O(1) per curve instead of a pass over the window. Only the drawdown needs the window itself.
+    """
+    def __init__(self, portfolio_values: np.ndarray):
+        self.portfolio_values = np.atleast_2d(np.asarray(portfolio_values, dtype=np.float64))
+        returns = self.portfolio_values[:, 1:] / self.portfolio_values[:, :-1] - 1.0
+        negative = np.where(returns < 0, returns, 0.0)
+        zeros = np.zeros((returns.shape[0], 1))
+        # column k holds the sum over the first k returns
+        self.returns_sum = np.concatenate([zeros, np.cumsum(returns, axis=1)], axis=1)
+        self.returns_sq_sum = np.concatenate([zeros, np.cumsum(returns**2, axis=1)], axis=1)
+        self.negative_sum = np.concatenate([zeros, np.cumsum(negative, axis=1)], axis=1)
+        self.negative_sq_sum = np.concatenate([zeros, np.cumsum(negative**2, axis=1)], axis=1)
+        self.negative_count = np.concatenate([zeros, np.cumsum(returns < 0, axis=1)], axis=1)
+
+    def window(self, start: int, stop: int, rf: float=0.0) -> np.ndarray:
+        """
+        Metrics of every curve over bars start..stop-1, the same as calc_metrics(portfolio_values[:, start:stop]).
+
+        Returns:
+            np.ndarray: Structured array of METRICS_DTYPE with one record per curve.
+        """
+        values = self.portfolio_values[:, start:stop]
+        portfolio_trading_years = values.shape[1] / YEARLY_TRADING_DAYS
+        metrics = np.empty(values.shape[0], dtype=METRICS_DTYPE)
+
+        # returns start+1..stop-1 sit at prefix columns start..stop-1
+        first, last = start, stop - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = values[:, -1] / values[:, 0]
+            annualized_return = growth**(1 / portfolio_trading_years) - 1.0
+            metrics['total_return'] = growth - 1.0
+            metrics['annualized_return'] = annualized_return
+
+            annualized_std = _std_from_sums(self.returns_sum[:, last] - self.returns_sum[:, first],
+                                            self.returns_sq_sum[:, last] - self.returns_sq_sum[:, first],
+                                            last - first) * np.sqrt(YEARLY_TRADING_DAYS)
+            metrics['annualized_sharpe'] = np.where(annualized_std == 0, 0.0, (annualized_return - rf) / annualized_std)
+
+            down_deviation = _std_from_sums(self.negative_sum[:, last] - self.negative_sum[:, first],
+                                            self.negative_sq_sum[:, last] - self.negative_sq_sum[:, first],
+                                            self.negative_count[:, last] - self.negative_count[:, first]) * np.sqrt(YEARLY_TRADING_DAYS)
+            metrics['sortino_ratio'] = np.where(down_deviation == 0, 0.0, (annualized_return - rf) / down_deviation)
+
+            cumulative_max = np.maximum.accumulate(values, axis=1)
+            max_drawdown = ((cumulative_max - values) / cumulative_max).max(axis=1)
+            metrics['max_drawdown'] = max_drawdown
+            metrics['calmar_ratio'] = annualized_return / max_drawdown
+
+        return metrics
+
+
+def _std_from_sums(total: np.ndarray, total_sq: np.ndarray, count) -> np.ndarray:
+    count = np.asarray(count, dtype=np.float64)
+    variance = np.maximum(total_sq - total**2 / count, 0.0) / (count - 1)
+    return np.where(count > 1, np.sqrt(variance), np.nan)
+
+
+def walk_forward(data: pd.DataFrame, make_strategy: Callable[..., BaseStrategy], param_grid: Dict[str, Iterable], train_size: int,
+                 test_size: int, starting_balance: float, step: int=None, anchored: bool=False, slippage_factor: float=5.0,
+                 commission: float=0.0, score: str='annualized_sharpe') -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Rolls train and test windows across the data, picks the best parameters on every train window and
+    trades them on the following test window.
+
+    Every parameter set computes its signals once over the full history, so indicators are warmed up
+    and shared by all folds, and is backtested once over the full history. Train windows are scored from
+    prefix sums over those equity curves (positions carry in from before the window). Every test window
+    is a fresh backtest of the chosen set on zero-copy slices of the price and signal arrays, starting
+    from the balance the previous test window ended with. Strategies must only look at past bars.
+
+    Parameters:
+    - data (pd.DataFrame): Candles with Open, High, Low and Close columns.
+    - make_strategy (Callable[..., BaseStrategy]): Builds a strategy from one parameter combination.
+    - param_grid (Dict[str, Iterable]): Values to try for every parameter.
+    - train_size, test_size, step, anchored: Fold layout, see walk_forward_folds.
+    - score (str): Metric maximized on the train windows.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.Series]: One row per fold with the chosen parameters, their train score and
+        their test metrics, and the out of sample portfolio value over all test windows.
+    """
+    if score not in METRIC_NAMES:
+        raise ValueError(f'score must be one of {METRIC_NAMES}, got {score}')
+    if step is not None and step < test_size:
+        raise ValueError('step must not be smaller than test_size, test windows would overlap')
+    folds = walk_forward_folds(data.shape[0], train_size, test_size, step, anchored)
+    if not folds:
+        raise ValueError(f'{data.shape[0]} bars are not enough for one fold of {train_size} + {test_size} bars')
+
+    combinations = param_combinations(param_grid)
+    strategies = [make_strategy(**params) for params in combinations]
+    signals = build_signal_matrix(data, strategies)
+
+    open_prices = data['Open'].to_numpy(dtype=np.float64)
+    high_prices = data['High'].to_numpy(dtype=np.float64)
+    low_prices = data['Low'].to_numpy(dtype=np.float64)
+    close_prices = data['Close'].to_numpy(dtype=np.float64)
+    buy_prices, sell_prices = calc_realistic_prices(open_prices, close_prices, slippage_factor)
+    arrays = (buy_prices, sell_prices, open_prices, high_prices, low_prices, close_prices)
+
+    def run(index: int, bars: slice, balance: float) -> np.ndarray:
+        qty, cash = run_position_state_machine(strategies[index], signals[index, bars], *(a[bars] for a in arrays),
+                                               balance, commission)
+        return close_prices[bars] * qty + cash
+
+    prefix_sums = MetricPrefixSums(np.stack([run(i, slice(None), starting_balance) for i in range(len(strategies))]))
+
+    rows = []
+    out_of_sample = []
+    balance = starting_balance
+    for fold, (train, test) in enumerate(folds):
+        train_scores = prefix_sums.window(train.start, train.stop)[score]
+        best = int(np.argmax(np.where(np.isnan(train_scores), -np.inf, train_scores)))
+
+        portfolio_values = run(best, test, balance)
+        balance = portfolio_values[-1]
+        out_of_sample.append(portfolio_values)
+
+        test_metrics = calc_metrics(portfolio_values)[0]
+        rows.append({'fold': fold, 'train_start': data.index[train.start], 'train_end': data.index[train.stop - 1],
+                     'test_start': data.index[test.start], 'test_end': data.index[test.stop - 1],
+                     **combinations[best], f'train_{score}': train_scores[best],
+                     **{name: test_metrics[name] for name in METRIC_NAMES}})
+
+    test_index = np.concatenate([np.arange(test.start, test.stop) for _, test in folds])
+    portfolio_value = pd.Series(np.concatenate(out_of_sample), index=data.index[test_index], name='portfolio_value')
+    return pd.DataFrame(rows), portfolio_value
@@ -1,6 +1,8 @@
+import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from lag_correlation import lag_correlations, merge_prices_and_trends
 
 # Define the categories and their respective colors
 general_stocks = ['KO', 'PFE', 'WMT', 'PG', 'JNJ', 'DIS']
@@ -16,35 +18,24 @@ color_map = {
     'crypto': 'red'
 }
 
-def trend_corr(stock, days=60):
-    t = pd.read_csv(f"C:\\Users\\guygl\\OneDrive\\שולחן העבודה\\Algotrade\\semester 2\\{stock}_trends.csv")
-    p = pd.read_csv(f"C:\\Users\\guygl\\OneDrive\\שולחן העבודה\\Algotrade\\semester 2\\{stock}_Prices.csv")
+DATA_PATH = "C:\\Users\\guygl\\OneDrive\\שולחן העבודה\\Algotrade\\semester 2"
 
-    t['Date'] = pd.to_datetime(t['Date'])
-    p['Date'] = pd.to_datetime(p['Date'])
 
-    full_data = pd.merge(p, t, on='Date')
+def load_stock(stock):
+    t = pd.read_csv(os.path.join(DATA_PATH, f"{stock}_trends.csv"))
+    p = pd.read_csv(os.path.join(DATA_PATH, f"{stock}_Prices.csv"))
+    return merge_prices_and_trends(p, t)
 
-    full_data['log_returns'] = np.log(full_data.Close / full_data.Close.shift(1))
-    full_data['Volatility'] = full_data['log_returns'].rolling(window=days).std() * np.sqrt(days)
-
-    full_data['Delay_1'] = full_data.Trend.shift(1)
-    full_data['Delay_2'] = full_data.Trend.shift(2)
-    full_data['Delay_3'] = full_data.Trend.shift(3)
-    full_data['Delay_4'] = full_data.Trend.shift(4)
-    full_data['Delay_5'] = full_data.Trend.shift(5)
-    full_data['Delay_6'] = full_data.Trend.shift(6)
-    full_data['Delay_7'] = full_data.Trend.shift(7)
 
-    rho = full_data.corr()
-    rho_c = rho['Close']['Delay_7']
-    return rho_c, full_data
+# Load every asset once and correlate the close price with all trend delays in one pass
+stock_data = {stock: load_stock(stock) for stock in general_stocks + tech_stocks + finance_stocks + decentralized_currencies}
+rho = lag_correlations(stock_data, max_lag=7).set_index(['asset', 'lag'])['rho']
 
 # Calculate correlations for each category
-volt_del_corr_general = [trend_corr(stock)[0] for stock in general_stocks]
-volt_del_corr_tech = [trend_corr(stock)[0] for stock in tech_stocks]
-volt_del_corr_finance = [trend_corr(stock)[0] for stock in finance_stocks]
-volt_del_corr_crypto = [trend_corr(crypto)[0] for crypto in decentralized_currencies]
+volt_del_corr_general = [rho[stock, 7] for stock in general_stocks]
+volt_del_corr_tech = [rho[stock, 7] for stock in tech_stocks]
+volt_del_corr_finance = [rho[stock, 7] for stock in finance_stocks]
+volt_del_corr_crypto = [rho[crypto, 7] for crypto in decentralized_currencies]
 
 # Combine the results
 volt_del_corr = volt_del_corr_general + volt_del_corr_tech + volt_del_corr_finance + volt_del_corr_crypto
@@ -72,13 +63,7 @@ print(volt_del_corr, np.mean(volt_del_corr))
 
 # Function to plot Close price, 7-days delay trend
 def plot_stock_data(stock, days=60):
-    t = pd.read_csv(f"C:\\Users\\guygl\\OneDrive\\שולחן העבודה\\Algotrade\\semester 2\\{stock}_trends.csv")
-    p = pd.read_csv(f"C:\\Users\\guygl\\OneDrive\\שולחן העבודה\\Algotrade\\semester 2\\{stock}_Prices.csv")
-
-    t['Date'] = pd.to_datetime(t['Date'])
-    p['Date'] = pd.to_datetime(p['Date'])
-
-    full_data = pd.merge(p, t, on='Date')
+    full_data = stock_data[stock].copy()
 
     full_data['log_returns'] = np.log(full_data.Close / full_data.Close.shift(1))
     full_data['Volatility'] = full_data['log_returns'].rolling(window=days).std() * np.sqrt(days)
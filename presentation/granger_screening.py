@@ -0,0 +1,209 @@
+"""
+Granger-causality screening of Google Trends against asset returns.
+
+For every asset the lagged design matrix (the Delay_1..Delay_k columns of Corr_check.py, for both the
+returns and the trend) is built once, and the running sums of its cross products are kept. The Gram
+matrix of any window is then the difference of two running sums, so the restricted and unrestricted
+regressions of every lag order and every rolling window are solved from the same sums without
+refitting from the data.
+"""
+import math
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lag_correlation import load_data_dir
+
+# continued fraction terms of the incomplete beta, converges in far fewer for the F-test arguments
+BETA_ITERATIONS = 300
+
+
+def regularized_incomplete_beta(a: np.ndarray, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    I_x(a, b) evaluated element-wise with the Lentz continued fraction, for a, b > 0 and 0 <= x <= 1.
+
+    Returns:
+        np.ndarray: I_x(a, b), NaN where an argument is NaN.
+    """
+    a, b, x = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (a, b, x)))
+    result = np.full(a.shape, np.nan)
+    result[x <= 0] = 0.0
+    result[x >= 1] = 1.0
+    inside = (x > 0) & (x < 1) & (a > 0) & (b > 0)
+
+    # the fraction converges fast for x < (a + 1) / (a + b + 2), otherwise use I_x(a, b) = 1 - I_{1-x}(b, a)
+    swap = inside & (x >= (a + 1) / (a + b + 2))
+    a_, b_, x_ = np.where(swap, b, a)[inside], np.where(swap, a, b)[inside], np.where(swap, 1 - x, x)[inside]
+
+    log_beta = np.array([math.lgamma(p) + math.lgamma(q) - math.lgamma(p + q) for p, q in zip(a_.tolist(), b_.tolist())])
+    front = np.exp(a_ * np.log(x_) + b_ * np.log1p(-x_) - log_beta) / a_
+
+    tiny = 1e-300
+    c = np.ones_like(x_)
+    d = 1 - (a_ + b_) * x_ / (a_ + 1)
+    d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+    fraction = d.copy()
+    for m in range(1, BETA_ITERATIONS + 1):
+        # even then odd step of the fraction
+        for numerator in (m * (b_ - m) * x_ / ((a_ + 2 * m - 1) * (a_ + 2 * m)),
+                          -(a_ + m) * (a_ + b_ + m) * x_ / ((a_ + 2 * m) * (a_ + 2 * m + 1))):
+            d = 1 + numerator * d
+            d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1 + numerator / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            delta = c * d
+            fraction *= delta
+        if np.all(np.abs(delta - 1) < 1e-15):
+            break
+
+    value = front * fraction
+    result[inside] = np.where(swap[inside], 1 - value, value)
+    return result
+
+
+def f_test_p_values(f_stat: np.ndarray, df1: np.ndarray, df2: np.ndarray) -> np.ndarray:
+    """
+    P(F > f_stat) for an F(df1, df2) distribution, the p-value of an F-test.
+    """
+    f_stat, df1, df2 = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (f_stat, df1, df2)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = df2 / (df2 + df1 * np.maximum(f_stat, 0))
+    return regularized_incomplete_beta(df2 / 2, df1 / 2, x)
+
+
+def lagged_design(y: np.ndarray, x: np.ndarray, max_lag: int) -> np.ndarray:
+    """
+    The regression rows of one asset: [1, y[t-1..t-max_lag], x[t-1..t-max_lag], y[t]] for every day t.
+
+    Returns:
+        np.ndarray: (days x 2 * max_lag + 2) matrix, NaN where a lag reaches before the first day.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    design = np.full((y.shape[0], 2 * max_lag + 2), np.nan)
+    design[:, 0] = 1.0
+    for lag in range(1, max_lag + 1):
+        design[lag:, lag] = y[:-lag]
+        design[lag:, max_lag + lag] = x[:-lag]
+    design[:, -1] = y
+    return design
+
+
+def _solve_rss(gram: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    # residual sum of squares of regressing the last column on columns, from the Gram matrices of many windows
+    target = gram.shape[-1] - 1
+    xtx = gram[:, columns[:, None], columns]
+    xty = gram[:, columns, target]
+    beta = np.einsum('wij,wj->wi', np.linalg.pinv(xtx, hermitian=True), xty)
+    return gram[:, target, target] - np.einsum('wi,wi->w', beta, xty)
+
+
+def window_bounds(num_days: int, window: int, step: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and stop rows of the windows to test, window 0 is one window over the whole history.
+    Rolling windows of window rows end every step rows, the last one on the last day.
+    """
+    if window == 0 or window >= num_days:
+        return np.array([0]), np.array([num_days])
+    stops = np.arange(num_days, window - 1, -step)[::-1]
+    return stops - window, stops
+
+
+def granger_p_values(y: np.ndarray, x: np.ndarray, max_lag: int, starts: np.ndarray, stops: np.ndarray) -> dict:
+    """
+    Granger-causality F-tests of x on y for every lag order 1..max_lag and every window [start, stop).
+
+    Order p compares y[t] ~ 1 + y[t-1..t-p] (restricted) with y[t] ~ 1 + y[t-1..t-p] + x[t-1..t-p]
+    (unrestricted). All orders use the same rows, the days where all max_lag lags exist, so their
+    p-values are comparable.
+
+    Returns:
+        dict: n (windows), and f_stat and p_value as (windows x max_lag) matrices, NaN where a window has
+        too few rows.
+    """
+    if max_lag < 1:
+        raise ValueError('max_lag must be at least 1')
+    design = lagged_design(y, x, max_lag)
+    valid = ~np.isnan(design).any(axis=1)
+    design[~valid] = 0.0
+
+    # running sums of the cross products, the Gram matrix of rows [a, b) is sums[b] - sums[a]
+    sums = np.zeros((design.shape[0] + 1, design.shape[1], design.shape[1]))
+    np.cumsum(np.einsum('ti,tj->tij', design, design), axis=0, out=sums[1:])
+    gram = sums[stops] - sums[starts]
+    n = gram[:, 0, 0]
+
+    f_stat = np.full((len(starts), max_lag), np.nan)
+    p_value = np.full((len(starts), max_lag), np.nan)
+    for order in range(1, max_lag + 1):
+        restricted = np.arange(order + 1)
+        unrestricted = np.r_[restricted, np.arange(max_lag + 1, max_lag + 1 + order)]
+        df2 = n - 2 * order - 1
+        enough = df2 > 0
+        if not enough.any():
+            continue
+        rss_restricted = _solve_rss(gram[enough], restricted)
+        rss_unrestricted = _solve_rss(gram[enough], unrestricted)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            f = (rss_restricted - rss_unrestricted) / order / (rss_unrestricted / df2[enough])
+        f_stat[enough, order - 1] = f
+        p_value[enough, order - 1] = f_test_p_values(f, order, df2[enough])
+
+    return {'n': n.astype(np.int64), 'f_stat': f_stat, 'p_value': p_value}
+
+
+def granger_screening(frames: Dict[str, pd.DataFrame], max_lag: int = 7, windows: Sequence[int] = (0,), step: int = 1,
+                      price_column: str = 'Close', trend_column: str = 'Trend') -> pd.DataFrame:
+    """
+    Tests whether each asset's trend changes Granger-cause its log returns, for all lag orders and windows.
+
+    Parameters:
+    - frames (Dict[str, pd.DataFrame]): Merged prices and trends per asset, ordered by date, see lag_correlation.load_data_dir.
+    - max_lag (int): Largest lag order to test.
+    - windows (Sequence[int]): Rolling window lengths in days, 0 tests the whole history once.
+    - step (int): Days between the ends of consecutive rolling windows.
+
+    Returns:
+        pd.DataFrame: Tidy table with asset, window, end (date of the last day in the window), lag, n, f_stat
+        and p_value columns.
+    """
+    tables = []
+    for asset, df in frames.items():
+        y = np.log(df[price_column].to_numpy(dtype=float))
+        y = np.r_[np.nan, np.diff(y)]
+        x = np.r_[np.nan, np.diff(df[trend_column].to_numpy(dtype=float))]
+        dates = pd.to_datetime(df['Date']).to_numpy() if 'Date' in df else df.index.to_numpy()
+
+        for window in windows:
+            starts, stops = window_bounds(len(df), window, step)
+            result = granger_p_values(y, x, max_lag, starts, stops)
+            tables.append(pd.DataFrame({
+                'asset': asset,
+                'window': window,
+                'end': np.repeat(dates[stops - 1], max_lag),
+                'lag': np.tile(np.arange(1, max_lag + 1), len(stops)),
+                'n': np.repeat(result['n'], max_lag),
+                'f_stat': result['f_stat'].ravel(),
+                'p_value': result['p_value'].ravel(),
+            }))
+
+    if not tables:
+        return pd.DataFrame(columns=['asset', 'window', 'end', 'lag', 'n', 'f_stat', 'p_value'])
+    return pd.concat(tables, ignore_index=True)
+
+
+def passing_lags(table: pd.DataFrame, max_p_value: float) -> pd.DataFrame:
+    """
+    The lag order with the lowest p-value of every (asset, window, end), and whether it passes max_p_value,
+    the lag test a trend has to pass before it is traded. Windows where no lag order could be tested are left out.
+    """
+    # windows too short for every lag order have no p-value at all and no best lag
+    tested = table.dropna(subset=['p_value'])
+    best = tested.loc[tested.groupby(['asset', 'window', 'end'])['p_value'].idxmin()]
+    return best.assign(passes=best['p_value'] <= max_p_value).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    table = granger_screening(load_data_dir(), max_lag=7)
+    print(table.pivot(index='lag', columns='asset', values='p_value').round(3))
@@ -0,0 +1,125 @@
+"""
+Lead/lag correlation between asset prices and Google Trends interest.
+
+Correlations for every lag and every asset are computed in one pass over a stacked lag tensor, using
+pairwise-complete observations like DataFrame.corr(). Lag k pairs the price at day t with the trend
+at day t - k, which is the Delay_k column of Corr_check.py.
+"""
+import os
+import re
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from trends_stitching import DATA_DIR, stitch_all
+
+PRICES_PATTERN = re.compile(r'^(?P<asset>.+)_Prices\(.*\)\.csv$')
+
+
+def merge_prices_and_trends(prices: pd.DataFrame, trends: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins one asset's prices and trends on their common dates.
+
+    Parameters:
+    - prices (pd.DataFrame): Prices with a Date column.
+    - trends (pd.DataFrame): Trends with Date and Trend columns.
+
+    Returns:
+        pd.DataFrame: The merged rows ordered by date.
+    """
+    prices = prices.assign(Date=pd.to_datetime(prices['Date']))
+    trends = trends[['Date', 'Trend']].assign(Date=pd.to_datetime(trends['Date']))
+    return pd.merge(prices, trends, on='Date').sort_values('Date', ignore_index=True)
+
+
+def load_data_dir(data_dir: str = DATA_DIR, cache_dir: str = None) -> Dict[str, pd.DataFrame]:
+    """
+    Loads every asset in Data/ that has both a prices file and trends windows, reading each file once.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The merged prices and stitched trends of each asset.
+    """
+    prices = {}
+    for name in sorted(os.listdir(data_dir)):
+        match = PRICES_PATTERN.match(name)
+        if match is not None:
+            prices[match['asset']] = pd.read_csv(os.path.join(data_dir, name), index_col=0)
+
+    trends = stitch_all(data_dir, cache_dir)
+    frames = {}
+    for asset in prices:
+        if asset in trends:
+            trend = trends[asset].dropna().rename('Trend').rename_axis('Date').reset_index()
+            frames[asset] = merge_prices_and_trends(prices[asset], trend)
+
+    return frames
+
+
+def _stack(frames: Dict[str, pd.DataFrame], column: str) -> np.ndarray:
+    n = max(len(df) for df in frames.values())
+    stacked = np.full((len(frames), n), np.nan)
+    for k, df in enumerate(frames.values()):
+        stacked[k, :len(df)] = df[column].to_numpy(dtype=float)
+
+    return stacked
+
+
+def lag_correlation_matrix(x: np.ndarray, y: np.ndarray, max_lag: int) -> np.ndarray:
+    """
+    Pearson correlation between x[t] and y[t - lag] for every row and every lag from 0 to max_lag.
+
+    Parameters:
+    - x (np.ndarray): (assets x days) matrix, NaN marks a missing value.
+    - y (np.ndarray): (assets x days) matrix, NaN marks a missing value.
+    - max_lag (int): Largest lag to evaluate.
+
+    Returns:
+        np.ndarray: (assets x lags) matrix of correlations, NaN where fewer than two pairs exist.
+    """
+    if max_lag < 0:
+        raise ValueError('max_lag must be non-negative')
+
+    padded = np.concatenate([np.full((y.shape[0], max_lag), np.nan), y], axis=1)
+    # lagged[a, t, l] = y[a, t - l] as a view, no copy per lag
+    lagged = sliding_window_view(padded, max_lag + 1, axis=1)[:, :y.shape[1], ::-1]
+    x = x[:, :, None]
+
+    mask = ~np.isnan(lagged) & ~np.isnan(x)
+    count = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(mask, x, 0.0).sum(axis=1) / count
+        y_mean = np.where(mask, lagged, 0.0).sum(axis=1) / count
+        dx = np.where(mask, x - x_mean[:, None, :], 0.0)
+        dy = np.where(mask, lagged - y_mean[:, None, :], 0.0)
+        rho = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+
+    rho[count < 2] = np.nan
+    return np.clip(rho, -1.0, 1.0)
+
+
+def lag_correlations(frames: Dict[str, pd.DataFrame], max_lag: int = 60, price_column: str = 'Close', trend_column: str = 'Trend') -> pd.DataFrame:
+    """
+    Correlates each asset's prices with its lagged trends for all lags at once.
+
+    Parameters:
+    - frames (Dict[str, pd.DataFrame]): Merged prices and trends per asset, ordered by date.
+    - max_lag (int): Largest lag to evaluate.
+    - price_column (str): Price column to correlate.
+    - trend_column (str): Trend column to lag.
+
+    Returns:
+        pd.DataFrame: Tidy table with asset, lag and rho columns.
+    """
+    rho = lag_correlation_matrix(_stack(frames, price_column), _stack(frames, trend_column), max_lag)
+    return pd.DataFrame({
+        'asset': np.repeat(list(frames), max_lag + 1),
+        'lag': np.tile(np.arange(max_lag + 1), len(frames)),
+        'rho': rho.ravel(),
+    })
+
+
+if __name__ == '__main__':
+    table = lag_correlations(load_data_dir(), max_lag=60)
+    print(table.pivot(index='lag', columns='asset', values='rho').round(3))
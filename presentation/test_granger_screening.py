@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+from granger_screening import (f_test_p_values, granger_p_values, granger_screening, lagged_design, passing_lags,
+                               regularized_incomplete_beta, window_bounds)
+from lag_correlation import load_data_dir
+from test_lag_correlation import random_asset
+
+def lstsq_rss(design, columns):
+    beta, *_ = np.linalg.lstsq(design[:, columns], design[:, -1], rcond=None)
+    residuals = design[:, -1] - design[:, columns] @ beta
+    return residuals @ residuals
+
+class Test_GrangerScreening(unittest.TestCase):
+    def test_incomplete_beta_closed_forms(self):
+        x = np.linspace(0.01, 0.99, 25)
+        np.testing.assert_allclose(x**3.5, regularized_incomplete_beta(3.5, 1, x), rtol=1e-12)
+        np.testing.assert_allclose(1 - (1 - x)**2.5, regularized_incomplete_beta(1, 2.5, x), rtol=1e-12)
+        np.testing.assert_allclose(2 / np.pi * np.arcsin(np.sqrt(x)), regularized_incomplete_beta(0.5, 0.5, x), rtol=1e-10)
+        self.assertEqual([0.0, 1.0], regularized_incomplete_beta(2, 3, np.array([0.0, 1.0])).tolist())
+
+    def test_f_test_p_values(self):
+        # the survival function of F(2, d) is (1 + 2f / d) ** (-d / 2)
+        f = np.array([0.1, 1.0, 3.0, 10.0])
+        for d in (5, 40, 2000):
+            np.testing.assert_allclose((1 + 2 * f / d)**(-d / 2), f_test_p_values(f, 2, d), rtol=1e-10)
+        self.assertTrue(np.isnan(f_test_p_values(np.nan, 2, 10)))
+
+    def test_lagged_design_has_delay_columns(self):
+        y = np.arange(10.0)
+        x = 100 + np.arange(10.0)
+        design = lagged_design(y, x, 3)
+        self.assertEqual((10, 8), design.shape)
+        np.testing.assert_array_equal([1, 4, 3, 2, 104, 103, 102, 5], design[5])
+        self.assertTrue(np.isnan(design[2, 3]))
+
+    def test_matches_separate_regressions(self):
+        rng = np.random.default_rng(0)
+        x = rng.normal(size=400)
+        y = np.r_[0.0, 0.5 * x[:-1]] + rng.normal(size=400)
+        starts, stops = window_bounds(400, 120, step=40)
+        result = granger_p_values(y, x, 4, starts, stops)
+
+        design = lagged_design(y, x, 4)
+        for w, (start, stop) in enumerate(zip(starts, stops)):
+            rows = design[max(start, 4):stop]
+            self.assertEqual(len(rows), result['n'][w])
+            for order in range(1, 5):
+                restricted = list(range(order + 1))
+                rss_r = lstsq_rss(rows, restricted)
+                rss_u = lstsq_rss(rows, restricted + list(range(5, 5 + order)))
+                df2 = len(rows) - 2 * order - 1
+                self.assertAlmostEqual((rss_r - rss_u) / order / (rss_u / df2), result['f_stat'][w, order - 1], places=8)
+
+        # x drives y with one lag, so every window finds it
+        self.assertTrue((result['p_value'][:, 0] < 1e-3).all())
+
+    def test_window_bounds(self):
+        starts, stops = window_bounds(100, 30, step=25)
+        # anchored on the last day
+        self.assertEqual([20, 45, 70], starts.tolist())
+        self.assertEqual([50, 75, 100], stops.tolist())
+        self.assertEqual(([0], [100]), tuple(b.tolist() for b in window_bounds(100, 0)))
+
+    def test_screening_table(self):
+        frames = {'BTC': random_asset(300, 0).dropna(ignore_index=True), 'ETH': random_asset(200, 1).dropna(ignore_index=True)}
+        table = granger_screening(frames, max_lag=5, windows=(0, 60), step=20)
+        full = table[table['window'] == 0]
+        self.assertEqual(2 * 5, len(full))
+        self.assertEqual(frames['BTC']['Date'].iloc[-1], full.loc[full['asset'] == 'BTC', 'end'].iloc[0])
+        self.assertTrue(table['p_value'].between(0, 1).all())
+
+        rolling = table[(table['window'] == 60) & (table['asset'] == 'ETH')]
+        self.assertEqual(5 * len(window_bounds(len(frames['ETH']), 60, 20)[0]), len(rolling))
+
+        best = passing_lags(table, max_p_value=0.1)
+        self.assertEqual(len(table) // 5, len(best))
+        self.assertTrue((best['passes'] == (best['p_value'] <= 0.1)).all())
+
+    def test_short_windows(self):
+        frames = {'BTC': random_asset(300, 0).dropna(ignore_index=True)}
+        table = granger_screening(frames, max_lag=7, windows=(10,), step=5)
+        # the first window has 10 rows but only 2 with all 7 lags, too few for any lag order
+        tested = table.groupby('end')['p_value'].count()
+        self.assertEqual(0, tested.iloc[0])
+
+        best = passing_lags(table, max_p_value=0.1)
+        self.assertEqual((tested > 0).sum(), len(best))
+        self.assertNotIn(tested.index[0], set(best['end']))
+        self.assertEqual(0, len(passing_lags(table[table['end'] == tested.index[0]], max_p_value=0.1)))
+
+    def test_data_dir(self):
+        frames = load_data_dir()
+        table = granger_screening(frames, max_lag=7, windows=(0, 250), step=50)
+        self.assertEqual(set(frames), set(table['asset']))
+        self.assertTrue(table['p_value'].dropna().between(0, 1).all())
+
+if __name__ == '__main__':
+    unittest.main()
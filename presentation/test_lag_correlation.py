@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+import pandas as pd
+from lag_correlation import lag_correlations, load_data_dir, merge_prices_and_trends
+
+def random_asset(n, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-01', periods=n, freq='D')
+    prices = pd.DataFrame({'Date': dates.strftime('%Y-%m-%d'), 'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))})
+    trends = pd.DataFrame({'Date': dates.strftime('%Y-%m-%d'), 'Trend': rng.uniform(0, 100, n)})
+    trends.loc[rng.choice(n, n // 10, replace=False), 'Trend'] = np.nan
+    return merge_prices_and_trends(prices, trends)
+
+class Test_LagCorrelation(unittest.TestCase):
+    def test_matches_delay_columns_corr(self):
+        frames = {'BTC': random_asset(300, 0), 'ETH': random_asset(250, 1), 'XMR': random_asset(40, 2)}
+        table = lag_correlations(frames, max_lag=20).set_index(['asset', 'lag'])['rho']
+        self.assertEqual(3 * 21, len(table))
+
+        for asset, df in frames.items():
+            for lag in range(21):
+                expected = df['Close'].corr(df['Trend'].shift(lag))
+                self.assertAlmostEqual(expected, table[asset, lag], places=10)
+
+    def test_too_few_pairs(self):
+        frames = {'BTC': random_asset(5, 0)}
+        table = lag_correlations(frames, max_lag=6)
+        self.assertTrue(np.isnan(table['rho'].iloc[-1]))
+
+    def test_data_dir(self):
+        frames = load_data_dir()
+        table = lag_correlations(frames, max_lag=60)
+        self.assertEqual(len(frames) * 61, len(table))
+        self.assertTrue(table['rho'].between(-1, 1).all())
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from trends_stitching import discover_windows, read_window, stitch_all, stitch_asset, stitch_windows
+
+def write_window(data_dir, asset, interest, start, end):
+    """
+    Writes the part of a daily interest series between start and end the way Google Trends exports it.
+    """
+    window = interest[start:end]
+    df = pd.DataFrame({'Date': window.index.strftime('%Y-%m-%d'), 'Trend': 100 * window.to_numpy() / window.max()})
+    df.to_csv(os.path.join(data_dir, f'{asset}_trends({start} - {end}).csv'))
+
+def random_interest(seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-01', periods=200, freq='D')
+    return pd.Series(np.exp(np.cumsum(rng.normal(0, 0.1, len(dates)))), index=dates)
+
+WINDOWS = [('2020-01-01', '2020-03-31'), ('2020-03-01', '2020-05-31'), ('2020-05-01', '2020-06-30'), ('2020-06-01', '2020-07-18')]
+
+class Test_TrendsStitching(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp_dir.name, 'Data')
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'Stitched')
+        os.makedirs(self.data_dir)
+        self.interest = random_interest()
+        for start, end in WINDOWS:
+            write_window(self.data_dir, 'Bitcoin', self.interest, start, end)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_discover_windows(self):
+        write_window(self.data_dir, 'Shiba Inu', self.interest, *WINDOWS[0])
+        windows = discover_windows(self.data_dir)
+        self.assertEqual(['Bitcoin', 'Shiba Inu'], list(windows))
+        self.assertEqual(WINDOWS, [(w.start, w.end) for w in windows['Bitcoin']])
+
+    def test_recovers_underlying_interest(self):
+        series = [read_window(w.path) for w in discover_windows(self.data_dir)['Bitcoin']]
+        stitched, _ = stitch_windows(series)
+        expected = self.interest[:WINDOWS[-1][1]]
+        expected = 100 * expected / expected[:WINDOWS[0][1]].max()
+        np.testing.assert_allclose(expected.to_numpy(), stitched.to_numpy())
+
+    def test_disjoint_windows_raise(self):
+        series = [read_window(w.path) for w in discover_windows(self.data_dir)['Bitcoin']]
+        with self.assertRaises(ValueError):
+            stitch_windows([series[0], series[2]])
+
+    def test_new_window_restitches_tail(self):
+        stitch_asset(discover_windows(self.data_dir)['Bitcoin'], self.cache_dir)
+        write_window(self.data_dir, 'Bitcoin', self.interest, '2020-07-01', '2020-07-18')
+        windows = discover_windows(self.data_dir)['Bitcoin']
+
+        incremental = stitch_asset(windows, self.cache_dir)
+        full = stitch_asset(windows)
+        pd.testing.assert_series_equal(full, incremental, check_freq=False)
+
+    def test_stitch_all_parallel(self):
+        write_window(self.data_dir, 'Solana', random_interest(1), *WINDOWS[0])
+        trends = stitch_all(self.data_dir, self.cache_dir, workers=2)
+        self.assertEqual(['Bitcoin', 'Solana'], list(trends.columns))
+        pd.testing.assert_frame_equal(trends, stitch_all(self.data_dir, self.cache_dir, workers=1), check_freq=False)
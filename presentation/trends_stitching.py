@@ -0,0 +1,242 @@
+"""
+Stitches the overlapping Google Trends windows in Data/ into one continuous daily series per asset.
+
+Every Asset_trends(start - end).csv file is normalized to 0-100 on its own window, so adjacent windows
+are brought onto a common scale with the least-squares ratio over the days they share. The stitched
+series stays on the scale of the first window of the asset.
+"""
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data')
+WINDOW_PATTERN = re.compile(r'^(?P<asset>.+)_trends\((?P<start>\d{4}-\d{2}-\d{2}) - (?P<end>\d{4}-\d{2}-\d{2})\)\.csv$')
+
+
+class TrendWindow(NamedTuple):
+    asset: str
+    start: str
+    end: str
+    path: str
+
+
+def discover_windows(data_dir: str = DATA_DIR) -> Dict[str, List[TrendWindow]]:
+    """
+    Finds every trends window in a directory.
+
+    Parameters:
+    - data_dir (str): Directory holding the Asset_trends(start - end).csv files.
+
+    Returns:
+        Dict[str, List[TrendWindow]]: The windows of each asset, ordered by start and end date.
+    """
+    windows = {}
+    for name in os.listdir(data_dir):
+        match = WINDOW_PATTERN.match(name)
+        if match is None:
+            continue
+        window = TrendWindow(match['asset'], match['start'], match['end'], os.path.join(data_dir, name))
+        windows.setdefault(window.asset, []).append(window)
+
+    return {asset: sorted(asset_windows, key=lambda w: (w.start, w.end))
+            for asset, asset_windows in sorted(windows.items())}
+
+
+def read_window(path: str) -> pd.Series:
+    """
+    Reads one trends window as a float series indexed by date.
+    """
+    df = pd.read_csv(path, usecols=['Date', 'Trend'], parse_dates=['Date'])
+    trend = df['Trend']
+    if trend.dtype == object:
+        # google reports tiny interest as "<1"
+        trend = pd.to_numeric(trend.replace('<1', '0.5'))
+
+    return pd.Series(trend.to_numpy(dtype=float), index=pd.DatetimeIndex(df['Date']), name='Trend')
+
+
+def align_windows(windows: List[pd.Series]) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    Places the windows on their union of dates.
+
+    Returns:
+        Tuple[pd.DatetimeIndex, np.ndarray]: The dates and a (windows x dates) matrix, NaN where a window has no value.
+    """
+    dates = windows[0].index
+    for window in windows[1:]:
+        dates = dates.union(window.index)
+
+    matrix = np.full((len(windows), len(dates)), np.nan)
+    for k, window in enumerate(windows):
+        matrix[k, dates.get_indexer(window.index)] = window.to_numpy()
+
+    return dates, matrix
+
+
+def overlap_ratios(matrix: np.ndarray) -> np.ndarray:
+    """
+    Computes the factor that brings each window onto the scale of the window before it.
+
+    For every adjacent pair (a, b) the factor minimizes sum((a - r * b) ** 2) over the shared days,
+    which gives r = sum(a * b) / sum(b * b). All pairs are solved at once.
+
+    Parameters:
+    - matrix (np.ndarray): (windows x dates) matrix as returned by align_windows.
+
+    Returns:
+        np.ndarray: One ratio per window after the first.
+    """
+    prev, curr = matrix[:-1], matrix[1:]
+    shared = ~np.isnan(prev) & ~np.isnan(curr)
+    disjoint = ~shared.any(axis=1)
+    if disjoint.any():
+        raise ValueError(f'Window {int(np.argmax(disjoint)) + 1} does not overlap the window before it')
+
+    num = np.where(shared, prev * curr, 0.0).sum(axis=1)
+    den = np.where(shared, curr * curr, 0.0).sum(axis=1)
+    # a window that is all zeros on the overlap carries no scale information
+    return np.divide(num, den, out=np.ones_like(num), where=den > 0)
+
+
+def _contributions(windows: List[pd.Series], scales: np.ndarray) -> Tuple[pd.Series, pd.Series]:
+    dates, matrix = align_windows(windows)
+    scaled = matrix * scales[:, None]
+    present = ~np.isnan(scaled)
+    trend_sum = pd.Series(np.where(present, scaled, 0.0).sum(axis=0), index=dates)
+    window_count = pd.Series(present.sum(axis=0), index=dates)
+    return trend_sum, window_count
+
+
+def stitch_windows(windows: List[pd.Series]) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Stitches overlapping windows into one daily series.
+
+    Every window is rescaled onto the first one and days covered by several windows take their mean.
+
+    Parameters:
+    - windows (List[pd.Series]): Trends windows ordered by start date.
+
+    Returns:
+        Tuple[pd.Series, np.ndarray]: The stitched series and the scale applied to each window.
+    """
+    _, matrix = align_windows(windows)
+    scales = np.concatenate([[1.0], np.cumprod(overlap_ratios(matrix))])
+    trend_sum, window_count = _contributions(windows, scales)
+    return (trend_sum / window_count).rename('Trend'), scales
+
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _cache_paths(cache_dir: str, asset: str) -> Tuple[str, str]:
+    base = os.path.join(cache_dir, f'{asset}_trends')
+    return base + '.csv', base + '.json'
+
+
+def _load_cache(cache_dir: str, asset: str):
+    csv_path, manifest_path = _cache_paths(cache_dir, asset)
+    if not (os.path.exists(csv_path) and os.path.exists(manifest_path)):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    df = pd.read_csv(csv_path, parse_dates=['Date'], index_col='Date')
+    return manifest, df['trend_sum'], df['window_count']
+
+
+def _save_cache(cache_dir: str, asset: str, files: list, scales: np.ndarray, trend_sum: pd.Series, window_count: pd.Series):
+    os.makedirs(cache_dir, exist_ok=True)
+    csv_path, manifest_path = _cache_paths(cache_dir, asset)
+    df = pd.DataFrame({'Trend': trend_sum / window_count, 'trend_sum': trend_sum, 'window_count': window_count})
+    df.index.name = 'Date'
+    df.to_csv(csv_path)
+    with open(manifest_path, 'w') as f:
+        json.dump({'files': files, 'scales': scales.tolist()}, f)
+
+
+def stitch_asset(windows: List[TrendWindow], cache_dir: Optional[str] = None) -> pd.Series:
+    """
+    Stitches all windows of one asset, reusing the cached result when possible.
+
+    The cache is keyed on the names and contents of the input files. When the cached files are a
+    prefix of the current ones only the new tail windows are read and stitched onto the cached sums.
+
+    Parameters:
+    - windows (List[TrendWindow]): The asset windows as returned by discover_windows.
+    - cache_dir (str): Directory for the stitched output, or None to always stitch from scratch.
+
+    Returns:
+        pd.Series: The stitched daily series named after the asset.
+    """
+    asset = windows[0].asset
+    files = [[os.path.basename(w.path), _file_digest(w.path)] for w in windows]
+
+    cached = _load_cache(cache_dir, asset) if cache_dir is not None else None
+    if cached is not None and cached[0]['files'] == files:
+        _, trend_sum, window_count = cached
+        return (trend_sum / window_count).rename(asset)
+
+    done = len(cached[0]['files']) if cached is not None else 0
+    if 0 < done < len(files) and cached[0]['files'] == files[:done]:
+        manifest, trend_sum, window_count = cached
+        # restitch from the last cached window so the new ones land on the same scale
+        tail = [read_window(w.path) for w in windows[done - 1:]]
+        _, matrix = align_windows(tail)
+        tail_scales = manifest['scales'][-1] * np.cumprod(overlap_ratios(matrix))
+        tail_sum, tail_count = _contributions(tail[1:], tail_scales)
+        trend_sum = trend_sum.add(tail_sum, fill_value=0.0)
+        window_count = window_count.add(tail_count, fill_value=0).astype(int)
+        scales = np.concatenate([manifest['scales'], tail_scales])
+    else:
+        series = [read_window(w.path) for w in windows]
+        _, matrix = align_windows(series)
+        scales = np.concatenate([[1.0], np.cumprod(overlap_ratios(matrix))])
+        trend_sum, window_count = _contributions(series, scales)
+
+    if cache_dir is not None:
+        _save_cache(cache_dir, asset, files, scales, trend_sum, window_count)
+
+    return (trend_sum / window_count).rename(asset)
+
+
+def stitch_all(data_dir: str = DATA_DIR, cache_dir: Optional[str] = None, assets: List[str] = None, workers: int = None) -> pd.DataFrame:
+    """
+    Stitches the trends windows of every asset in parallel.
+
+    Parameters:
+    - data_dir (str): Directory holding the trends windows.
+    - cache_dir (str): Directory for the stitched output, or None to disable caching.
+    - assets (List[str]): Assets to stitch, all discovered assets by default.
+    - workers (int): Number of worker processes, 1 stitches in the current process.
+
+    Returns:
+        pd.DataFrame: One column of stitched daily trends per asset.
+    """
+    windows = discover_windows(data_dir)
+    if assets is not None:
+        missing = set(assets) - set(windows)
+        if missing:
+            raise ValueError(f'No trends windows found for {sorted(missing)}')
+        windows = {asset: windows[asset] for asset in assets}
+
+    if workers == 1:
+        stitched = [stitch_asset(w, cache_dir) for w in windows.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            stitched = list(pool.map(stitch_asset, windows.values(), repeat(cache_dir)))
+
+    return pd.concat(stitched, axis=1)
+
+
+if __name__ == '__main__':
+    trends = stitch_all(cache_dir=os.path.join(DATA_DIR, 'Stitched'))
+    print(trends.describe())